@@ -0,0 +1,130 @@
+import os
+import time
+import resource
+import tempfile
+import tracemalloc
+import multiprocessing
+import cv2
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from utilities.BoundingBox import draw_box_label
+from utilities.FrameBuffer import FrameBuffer
+from utilities.StreamingRunner import StreamingRunner, read_video_frames
+
+
+# Method: Used to write a synthetic video to stand in for a camera
+def make_video(path, n_frames=120, frame_size=(720, 1280), fps=30):
+    """
+    :param path: Path to video file (.avi)
+    :param n_frames: Number of frames
+    :param frame_size: Size (height, width) of the frames
+    :param fps: Frames per second
+    """
+    rng = np.random.RandomState(0)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (frame_size[1], frame_size[0]))
+
+    for n in range(n_frames):
+        frame = np.full((frame_size[0], frame_size[1], 3), 80, dtype=np.uint8)
+        for _ in range(10):
+            y, x = rng.randint(0, frame_size[0] - 100), rng.randint(0, frame_size[1] - 150)
+            frame[y:y + 100, x:x + 150] = rng.randint(0, 255, size=3)
+        writer.write(frame)
+
+    writer.release()
+
+
+# Method: Used to annotate a frame pair and compose the output like TwoCamerasFront.py, with or without a FrameBuffer
+def run_two_cameras(video_path, use_frame_buffer, batch_size=8, trace=False):
+    """
+    :param video_path: Path to the video (read twice, as the left and right camera)
+    :param use_frame_buffer: If True, decode into a FrameBuffer and compose in place, otherwise allocate new frames
+        and compose with np.hstack and cv2.resize
+    :param batch_size: Maximum number of frame pairs passed to the process stage in a single call
+    :param trace: If True, trace the memory allocated for each frame (slow, for a single-threaded pass)
+    :return: Dictionary with the frames/second, the memory allocated per frame and the peak RSS
+    """
+    videos = [cv2.VideoCapture(video_path), cv2.VideoCapture(video_path)]
+    frame_size = (int(videos[0].get(cv2.CAP_PROP_FRAME_HEIGHT)), int(videos[0].get(cv2.CAP_PROP_FRAME_WIDTH)))
+    boxes = [[100, 200, 300, 400], [250, 700, 420, 980]]
+
+    # The scripts before the frame buffer used the default queues
+    queue_size = 4 if use_frame_buffer else 16
+    frame_buffer = None
+    if use_frame_buffer:
+        frame_buffer = FrameBuffer(frame_size, n_cameras=2, scale=0.5)
+
+    # Method: Used to draw the boxes on each frame pair
+    def process(frame_sets):
+        for frames in frame_sets:
+            for frame in frames:
+                for box in boxes:
+                    draw_box_label(frame, box)
+
+        return frame_sets
+
+    # Method: Used to compose a frame pair into the output
+    def write(n, frames):
+        if frame_buffer is not None:
+            frame_buffer.compose(0, frames[0])
+            out = frame_buffer.compose(1, frames[1])
+        else:
+            out = cv2.resize(np.hstack(frames), (0, 0), fx=0.5, fy=0.5)
+
+        cv2.putText(out, 'SAFE', (out.shape[1] // 2 - 40, 25), cv2.FONT_HERSHEY_DUPLEX, 1.0, (0, 255, 0), 2,
+                    cv2.LINE_AA)
+
+        if frame_buffer is not None:
+            frame_buffer.release(frames)
+
+    if trace:
+        # Single-threaded pass, so that the peak between two frames only holds that frame's allocations
+        allocated = []
+        tracemalloc.start()
+        for n, frames in enumerate(read_video_frames(videos, frame_buffer=frame_buffer)):
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            write(n, process([frames])[0])
+            allocated.append(tracemalloc.get_traced_memory()[1] - current)
+        tracemalloc.stop()
+
+        return {'allocated_mb': float(np.mean(allocated)) / 2.0 ** 20}
+
+    start = time.perf_counter()
+    runner = StreamingRunner(read_video_frames(videos, frame_buffer=frame_buffer), process, write,
+                             batch_size=batch_size, queue_size=queue_size)
+    runner.run()
+    n_frames = runner.timings['write']['frames']
+
+    # ru_maxrss is in kilobytes on Linux
+    return {'fps': n_frames / (time.perf_counter() - start),
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0}
+
+
+# Method: Used to run each configuration in a fresh process so that the peak RSS of one does not hide the other
+def run_benchmark(video_path):
+    """
+    :param video_path: Path to the video
+    :return: List with the result for each configuration
+    """
+    results = []
+
+    for use_frame_buffer in (False, True):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            result = executor.submit(run_two_cameras, video_path, use_frame_buffer).result()
+            result.update(executor.submit(run_two_cameras, video_path, use_frame_buffer, trace=True).result())
+            result['frame_buffer'] = use_frame_buffer
+            results.append(result)
+
+    return results
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'camera.avi')
+        make_video(path)
+
+        print('{:>14} {:>9} {:>16} {:>14}'.format('frame buffer', 'fps', 'allocated MB/f', 'peak RSS MB'))
+        for r in run_benchmark(path):
+            print('{:>14} {:>9.1f} {:>16.2f} {:>14.1f}'.format(str(r['frame_buffer']), r['fps'], r['allocated_mb'],
+                                                               r['peak_rss_mb']))
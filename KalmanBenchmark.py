@@ -0,0 +1,217 @@
+import time
+import numpy as np
+from scipy.linalg import block_diag
+
+from utilities.TrackerBank import TrackerBank
+from utilities.VehicleTracker import VehicleTracker
+
+
+class DenseTrackerBank:
+    # Method: Constructor (reference stacked filter with general 8x8 matrices and integer state, as used before)
+    def __init__(self, dt=1.0, truncate=True):
+        """
+        :param dt: Time step between frames
+        :param truncate: If True, truncate the state to integers after every step
+        """
+        self.truncate = truncate
+        self.F = block_diag(*[np.array([[1.0, dt], [0.0, 1.0]])] * 4)
+        self.H = np.zeros((4, 8))
+        self.H[np.arange(4), np.arange(0, 8, 2)] = 1.0
+        self.Q = block_diag(*[np.array([[dt ** 4 / 2., dt ** 3 / 2.], [dt ** 3 / 2., dt ** 2]])] * 4)
+        self.R = np.eye(4) * 6.25
+        self.I = np.eye(8)
+        self.x = np.zeros((0, 8))
+        self.P = np.zeros((0, 8, 8))
+
+    # Method: Used to add new tracks
+    def add(self, boxes):
+        """
+        :param boxes: Array of shape (M, 4) with the boxes used to initialise the new tracks
+        """
+        x = np.zeros((len(boxes), 8))
+        x[:, ::2] = boxes
+        self.x = np.concatenate([self.x, x])
+        self.P = np.concatenate([self.P, np.broadcast_to(np.eye(8) * 100.0, (len(boxes), 8, 8))])
+
+    # Method: Used to predict the next state for every track
+    def predict(self):
+        self.x = self.x @ self.F.T
+        self.P = self.F @ self.P @ self.F.T + self.Q
+
+        if self.truncate:
+            self.x = np.trunc(self.x)
+
+    # Method: Used to predict and update the next state for the selected tracks
+    def predict_and_update(self, idx, z):
+        """
+        :param idx: Indices of the tracks to update
+        :param z: Array of shape (M, 4) with the matched boxes
+        """
+        x = self.x[idx] @ self.F.T
+        P = self.F @ self.P[idx] @ self.F.T + self.Q
+
+        y = z - x @ self.H.T
+        PHT = P @ self.H.T
+        K = PHT @ np.linalg.inv(self.H @ PHT + self.R)
+        x = x + (K @ y[:, :, np.newaxis])[:, :, 0]
+        I_KH = self.I - K @ self.H
+
+        self.x[idx] = np.trunc(x) if self.truncate else x
+        self.P[idx] = I_KH @ P @ I_KH.transpose(0, 2, 1) + K @ self.R @ K.transpose(0, 2, 1)
+
+
+# Method: Used to generate boxes moving at constant (sub-pixel) velocity with noisy measurements
+def make_tracks(n_tracks, n_frames, noise=2.5, seed=0):
+    """
+    :param n_tracks: Number of tracks
+    :param n_frames: Number of frames
+    :param noise: Standard deviation (pixels) of the measurement noise
+    :param seed: Random seed
+    :return: Array of shape (n_frames, n_tracks, 4) with the true boxes and one with the measured boxes
+    """
+    rng = np.random.RandomState(seed)
+    start = rng.uniform(0, 1000, size=(n_tracks, 1, 2))
+    start = np.concatenate([start, start + rng.uniform(40, 120, size=(n_tracks, 1, 2))], axis=2)
+    velocity = np.tile(rng.uniform(-2.0, 2.0, size=(n_tracks, 1, 2)), (1, 1, 2))
+    truth = (start + velocity * np.arange(n_frames)[np.newaxis, :, np.newaxis]).transpose(1, 0, 2)
+
+    return truth, truth + rng.normal(0, noise, size=truth.shape)
+
+
+# Method: Used to check that the bank follows the same state trajectories as the per-object trackers
+def check_against_vehicle_tracker(n_tracks=50, n_frames=60, miss_rate=0.3, seed=0):
+    """
+    :param n_tracks: Number of tracks
+    :param n_frames: Number of frames
+    :param miss_rate: Probability that a track has no measurement on a frame (it is only predicted)
+    :param seed: Random seed
+    :return: Largest absolute difference of the states and of the covariances
+    """
+    _, measured = make_tracks(n_tracks, n_frames, seed=seed)
+    missed = np.random.RandomState(seed + 1).uniform(size=(n_frames, n_tracks)) < miss_rate
+
+    # The Kalman filter of each VehicleTracker is stepped directly, since its predict methods cast the state to
+    # integers after every step (the bank keeps the float state)
+    trackers = []
+    for box in measured[0]:
+        tracker = VehicleTracker()
+        tracker.kf.x = np.array([[box[0], 0, box[1], 0, box[2], 0, box[3], 0]], dtype=float).T
+        trackers.append(tracker)
+
+    bank = TrackerBank()
+    bank.add(measured[0], np.arange(n_tracks))
+    max_dx, max_dp = 0.0, 0.0
+
+    for z, miss in zip(measured[1:], missed[1:]):
+        for tracker, box, skip in zip(trackers, z, miss):
+            tracker.kf.predict()
+            if not skip:
+                tracker.kf.update(box[:, np.newaxis])
+
+        bank.predict(np.flatnonzero(miss))
+        bank.predict_and_update(np.flatnonzero(~miss), z[~miss])
+
+        # The bank stores one 2x2 covariance per track, shared by the 4 (position, velocity) systems
+        x = np.array([tracker.kf.x[:, 0] for tracker in trackers])
+        P = np.array([tracker.kf.P for tracker in trackers])
+        pp, pv, vv = bank.P.T
+        P_bank = np.array([[pp, pv], [pv, vv]]).transpose(2, 0, 1)
+        P_bank = np.einsum('ij,nkl->nikjl', np.eye(4), P_bank).reshape(-1, 8, 8)
+        max_dx = max(max_dx, float(np.abs(bank.x - x).max()))
+        max_dp = max(max_dp, float(np.abs(P_bank - P).max()))
+
+    assert np.allclose(bank.x, x, rtol=1e-9, atol=1e-6), 'TrackerBank state differs from VehicleTracker'
+    assert np.allclose(P_bank, P, rtol=1e-9, atol=1e-6), 'TrackerBank covariance differs from VehicleTracker'
+
+    return max_dx, max_dp
+
+
+# Method: Used to time the per-track update cost of each filter implementation
+def time_filters(n_tracks, n_frames=50, seed=0):
+    """
+    :param n_tracks: Number of tracks updated on every frame
+    :param n_frames: Number of frames
+    :param seed: Random seed
+    :return: Dictionary with the time (microseconds) per track update of each implementation
+    """
+    _, measured = make_tracks(n_tracks, n_frames + 1, seed=seed)
+    idx = np.arange(n_tracks)
+    result = {'tracks': n_tracks}
+
+    # Per-object filterpy trackers (the original implementation)
+    if n_tracks <= 1000:
+        trackers = []
+        for box in measured[0]:
+            tracker = VehicleTracker()
+            tracker.x_state = np.array([[box[0], 0, box[1], 0, box[2], 0, box[3], 0]]).T
+            trackers.append(tracker)
+
+        start = time.perf_counter()
+        for z in measured[1:]:
+            for tracker, box in zip(trackers, z):
+                tracker.predict_and_update(box[:, np.newaxis])
+        result['filterpy_us'] = 1e6 * (time.perf_counter() - start) / (n_tracks * n_frames)
+
+    # Stacked general 8x8 filter with integer state
+    dense = DenseTrackerBank()
+    dense.add(measured[0])
+    start = time.perf_counter()
+    for z in measured[1:]:
+        dense.predict_and_update(idx, z)
+    result['dense_us'] = 1e6 * (time.perf_counter() - start) / (n_tracks * n_frames)
+
+    # Specialised float filter
+    bank = TrackerBank()
+    bank.add(measured[0], idx)
+    start = time.perf_counter()
+    for z in measured[1:]:
+        bank.predict_and_update(idx, z)
+    result['bank_us'] = 1e6 * (time.perf_counter() - start) / (n_tracks * n_frames)
+
+    return result
+
+
+# Method: Used to measure how far the tracks drift from the true boxes while coasting on their predictions
+def measure_drift(n_tracks=200, n_updates=20, n_coast=10, seed=0):
+    """
+    :param n_tracks: Number of tracks
+    :param n_updates: Number of frames with a measurement
+    :param n_coast: Number of frames predicted without a measurement afterwards
+    :param seed: Random seed
+    :return: Mean absolute error (pixels) at the end of the coasting frames for the integer and the float state
+    """
+    truth, measured = make_tracks(n_tracks, n_updates + n_coast, seed=seed)
+    idx = np.arange(n_tracks)
+    dense = DenseTrackerBank()
+    bank = TrackerBank()
+    dense.add(measured[0])
+    bank.add(measured[0], idx)
+
+    for z in measured[1:n_updates]:
+        dense.predict_and_update(idx, z)
+        bank.predict_and_update(idx, z)
+
+    for _ in range(n_coast):
+        dense.predict()
+        bank.predict()
+
+    return {'integer_px': float(np.abs(dense.x[:, ::2] - truth[-1]).mean()),
+            'float_px': float(np.abs(bank.boxes - truth[-1]).mean())}
+
+
+if __name__ == '__main__':
+    dx, dp = check_against_vehicle_tracker()
+    print('[INFO]: TrackerBank matches VehicleTracker (max difference {:.2e} in x, {:.2e} in P)'.format(dx, dp))
+
+    print('{:>8} {:>14} {:>14} {:>14} {:>10}'.format('tracks', 'filterpy (us)', 'dense 8x8 (us)', 'bank (us)',
+                                                     'speedup'))
+
+    for n in [1, 10, 100, 1000, 10000]:
+        r = time_filters(n)
+        print('{:>8} {:>14} {:>14.2f} {:>14.2f} {:>9.1f}x'.format(
+            n, '{:.2f}'.format(r['filterpy_us']) if 'filterpy_us' in r else '-', r['dense_us'], r['bank_us'],
+            r['dense_us'] / r['bank_us']))
+
+    drift = measure_drift()
+    print('[INFO]: Mean error after coasting: {:.2f} px with integer state, {:.2f} px with float state'.format(
+        drift['integer_px'], drift['float_px']))
@@ -0,0 +1,168 @@
+import time
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from utilities import Association
+from utilities.BoundingBox import box_iou_ratio, box_iou_matrix
+from utilities.SpatialGrid import SpatialGrid
+
+
+# Method: Used as the reference dense matcher (double loop IOU matrix and full Hungarian assignment)
+def dense_match_detections_to_trackers(trackers, detections, min_iou=0.25):
+    """
+    :param trackers: Tracker boxes
+    :param detections: Detection boxes
+    :param min_iou: Minimum IOU for a tracker and detection to be matched
+    :return: Matches, unmatched detections and unmatched trackers
+    """
+    iou_matrix = np.zeros((len(trackers), len(detections)), dtype=np.float32)
+
+    for t, tracker in enumerate(trackers):
+        for d, detection in enumerate(detections):
+            iou_matrix[t, d] = box_iou_ratio(tracker, detection)
+
+    rows, cols = linear_sum_assignment(-iou_matrix)
+    matched_index = np.stack([rows, cols], axis=1)
+
+    unmatched_trackers = [t for t in range(len(trackers)) if t not in matched_index[:, 0]]
+    unmatched_detections = [d for d in range(len(detections)) if d not in matched_index[:, 1]]
+
+    matches = []
+    for m in matched_index:
+        if iou_matrix[m[0], m[1]] > min_iou:
+            matches.append(m)
+        else:
+            unmatched_trackers.append(m[0])
+            unmatched_detections.append(m[1])
+
+    return np.array(matches).reshape(-1, 2), np.array(unmatched_detections), np.array(unmatched_trackers)
+
+
+# Method: Used as the reference gated matcher (full IOU matrix, then an assignment for each group of overlapping boxes)
+def matrix_match_detections_to_trackers(trackers, detections, min_iou=0.25):
+    """
+    :param trackers: Tracker boxes
+    :param detections: Detection boxes
+    :param min_iou: Minimum IOU for a tracker and detection to be matched
+    :return: Matches, unmatched detections and unmatched trackers
+    """
+    iou_matrix = box_iou_matrix(trackers, detections)
+    matched_index = Association.solve_gated_assignment(iou_matrix, iou_matrix > 0.0)
+    matches = matched_index[iou_matrix[matched_index[:, 0], matched_index[:, 1]] > min_iou]
+
+    return (matches, np.setdiff1d(np.arange(iou_matrix.shape[1]), matches[:, 1]),
+            np.setdiff1d(np.arange(iou_matrix.shape[0]), matches[:, 0]))
+
+
+# Method: Used to generate a synthetic frame of tracker and detection boxes
+def make_scene(n_boxes, dims=(1080, 1920), box_size=(60, 100), jitter=8, seed=0):
+    """
+    :param n_boxes: Number of vehicles in the scene
+    :param dims: Image dimensions
+    :param box_size: Height and width of each box
+    :param jitter: Maximum pixel offset between a tracker and its detection
+    :param seed: Random seed
+    :return: Tracker boxes and detection boxes
+    """
+    rng = np.random.RandomState(seed)
+    top_left = rng.randint(0, [dims[0] - box_size[0], dims[1] - box_size[1]], size=(n_boxes, 2))
+    trackers = np.hstack([top_left, top_left + box_size])
+    detections = trackers + rng.randint(-jitter, jitter + 1, size=trackers.shape)
+
+    return trackers, rng.permutation(detections)
+
+
+# Method: Used to time a matcher on a scene
+def time_matcher(matcher, trackers, detections, repeats):
+    """
+    :param matcher: Function with the same signature as 'match_detections_to_trackers'
+    :param trackers: Tracker boxes
+    :param detections: Detection boxes
+    :param repeats: Number of timed runs
+    :return: Median time per call in milliseconds and the number of matches
+    """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        matches, _, _ = matcher(trackers, detections)
+        timings.append(time.perf_counter() - start)
+
+    return 1000.0 * np.median(timings), len(matches)
+
+
+# Method: Used to check that the grid matcher agrees with the IOU matrix on inverted and very large boxes
+def check_grid_matcher(n_boxes=300, seed=0):
+    """
+    :param n_boxes: Number of vehicles in the scene
+    :param seed: Random seed
+    """
+    trk, det = make_scene(n_boxes, seed=seed)
+    trk = trk.astype(float)
+
+    # Coasting predictions can invert a box by several cells, or grow it over most of the frame
+    rng = np.random.RandomState(seed)
+    inverted = rng.choice(n_boxes, n_boxes // 10, replace=False)
+    trk[inverted] = trk[inverted][:, [2, 3, 0, 1]] + rng.uniform(-300, 300, size=(len(inverted), 4))
+    trk[:3] = [[-50, -50, 1100, 1900], [1000, 1800, 0, 0], [500, 0, 520, 1920]]
+    det[:2] = [[-20, -20, 1080, 1920], [700, 1500, 200, 300]]
+
+    # Every overlapping pair is a candidate
+    grid = SpatialGrid()
+    grid.update(trk)
+    candidates = set(zip(*grid.query(det)))
+    overlapping = set(zip(*np.nonzero(box_iou_matrix(trk, det) > 0.0)))
+    assert overlapping <= candidates, 'Spatial grid misses overlapping pairs'
+
+    matrix_matches = matrix_match_detections_to_trackers(trk, det)[0]
+    grid_matches = Association.match_detections_to_trackers(trk, det, grid=grid)[0]
+    assert set(map(tuple, matrix_matches.tolist())) == set(map(tuple, grid_matches.tolist())), \
+        'Grid matcher disagrees with the IOU matrix reference on inverted boxes'
+
+
+if __name__ == '__main__':
+    check_grid_matcher()
+
+    budget_ms = 5.0
+
+    print('{:>8} {:>12} {:>12} {:>10} {:>10}'.format('boxes', 'dense (ms)', 'gated (ms)', 'speedup', 'budget'))
+
+    for n in [10, 25, 50, 100, 200, 400]:
+        trk, det = make_scene(n, seed=n)
+        dense_ms, dense_matches = time_matcher(dense_match_detections_to_trackers, trk, det, repeats=5)
+        gated_ms, gated_matches = time_matcher(Association.match_detections_to_trackers, trk, det, repeats=20)
+
+        assert dense_matches == gated_matches, 'Gated matcher disagrees with the dense reference'
+
+        print('{:>8} {:>12.3f} {:>12.3f} {:>9.1f}x {:>10}'.format(n, dense_ms, gated_ms, dense_ms / gated_ms,
+                                                                 'OK' if gated_ms <= budget_ms else 'OVER'))
+
+    # Crowded scenes: the frame grows with the number of boxes (same density as 400 boxes in a 1080x1920 frame), so
+    # the IOU matrix grows as N^2 while the number of overlapping pairs grows as N
+    print()
+    print('{:>8} {:>12} {:>12} {:>10} {:>13}'.format('boxes', 'matrix (ms)', 'grid (ms)', 'speedup',
+                                                      'rebuild (ms)'))
+
+    for n in [100, 500, 2000]:
+        scale = np.sqrt(n / 400.0)
+        trk, det = make_scene(n, dims=(int(1080 * scale), int(1920 * scale)), seed=n)
+        grid = SpatialGrid()
+
+        # Method: Used to match with the spatial grid kept from frame to frame, as in the tracker
+        def grid_match(trackers, detections):
+            return Association.match_detections_to_trackers(trackers, detections, grid=grid)
+
+        matrix_ms, matrix_matches = time_matcher(matrix_match_detections_to_trackers, trk, det, repeats=10)
+        grid_ms, grid_matches = time_matcher(grid_match, trk, det, repeats=10)
+
+        # Part of the grid time spent rebuilding the index of the trackers (done on every call)
+        timings = []
+        for _ in range(10):
+            start = time.perf_counter()
+            grid.update(trk)
+            timings.append(time.perf_counter() - start)
+        rebuild_ms = 1000.0 * np.median(timings)
+
+        assert matrix_matches == grid_matches, 'Grid matcher disagrees with the IOU matrix reference'
+
+        print('{:>8} {:>12.3f} {:>12.3f} {:>9.1f}x {:>13.3f}'.format(n, matrix_ms, grid_ms, matrix_ms / grid_ms,
+                                                                     rebuild_ms))
@@ -0,0 +1,54 @@
+from utilities.VehicleDetector import VehicleDetector
+from VehicleDetectionAndTrackingProject import VehicleDetectionAndTrackingProject
+
+
+class MultiCameraDetectionAndTracking:
+    def __init__(self, cameras, min_conf=0.6, max_age=4, max_hits=10, max_batch_size=16):
+        """
+        :param cameras: List with the VehicleDetectionAndTrackingProject options for each camera,
+            e.g. [{'left': True}, {'left': False}] for a front stereo pair
+        :param min_conf: Minimum acceptable confidence level
+        :param max_age: No. of consecutive unmatched detection before a track is deleted
+        :param max_hits: No. of consecutive matches needed to establish a track
+        :param max_batch_size: Maximum number of frames (across all cameras) passed to the model in a single call
+        """
+        # Set up a single 'Vehicle Detector' shared by every camera
+        self.detector = VehicleDetector(kitti=False, min_conf=min_conf, max_batch_size=max_batch_size)
+
+        # Set up a separate set of trackers for each camera
+        self.cameras = [VehicleDetectionAndTrackingProject(min_conf=min_conf, max_age=max_age, max_hits=max_hits,
+                                                           detector=self.detector, **camera) for camera in cameras]
+
+    # Method: Used to get the warning issued by each camera for the last frame
+    @property
+    def warnings(self):
+        """
+        :return: List with the warning flag for each camera
+        """
+        return [camera.warning for camera in self.cameras]
+
+    # Method: Used as a 'pipeline' function for detection and tracking on one frame from each camera
+    def pipeline(self, frames):
+        """
+        :param frames: List with one image for each camera
+        :return: List with the processed image for each camera
+        """
+        return next(self.pipeline_batch([frames]))
+
+    # Method: Used as a 'pipeline' function for detection and tracking on consecutive frames from each camera
+    def pipeline_batch(self, frame_sets):
+        """
+        :param frame_sets: List of time steps, each a list with one image for each camera
+        :return: Generator with a list of the processed images for each camera, one per time step ('warnings' holds
+            the warnings for the time step that was last yielded)
+        """
+        n_cameras = len(self.cameras)
+
+        # Detect vehicles in every image of every camera with as few detector calls as possible
+        batch_boxes = self.detector.get_bounding_box_locations_batch([frame for frames in frame_sets
+                                                                      for frame in frames])
+
+        # Send each camera's detections to its own trackers, in frame order
+        for t, frames in enumerate(frame_sets):
+            det_boxes = batch_boxes[t * n_cameras:(t + 1) * n_cameras]
+            yield [camera.pipeline(frame, boxes) for camera, frame, boxes in zip(self.cameras, frames, det_boxes)]
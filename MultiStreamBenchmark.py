@@ -0,0 +1,196 @@
+import os
+import time
+import asyncio
+import tempfile
+import cv2
+import numpy as np
+
+from MultiStreamServer import MultiStreamServer
+from utilities.VehicleDetector import detection_dtype
+
+
+class StubDetector:
+    # Method: Constructor (stands in for the model: it reads the stream and frame number drawn on each frame)
+    def __init__(self, latency=0.005, min_conf=0.6):
+        """
+        :param latency: Time (seconds) each call to the model takes, whatever the number of frames
+        :param min_conf: Minimum acceptable confidence level
+        """
+        self.latency = latency
+        self.min_conf = min_conf
+
+        # (stream, frame) of every frame in each batch passed to the model
+        self.batches = []
+
+    # Method: Used to detect vehicles in a batch of frames
+    def get_detections_batch(self, images, low_conf=None):
+        """
+        :param images: List of images
+        :param low_conf: Minimum confidence of the weak detections kept (dropped if None)
+        :return: List with a structured array (detection_dtype) for each image, with a confident detection placed
+            according to the stream and frame number of the image and a weak one (score 0.3) next to it
+        """
+        time.sleep(self.latency)
+        tags = [read_tag(image) for image in images]
+        self.batches.append(tags)
+        results = []
+
+        for stream, frame in tags:
+            detections = np.empty(2, dtype=detection_dtype)
+            detections['box'] = [tag_box(stream, frame), tag_box(stream, frame + 30)]
+            detections['class'] = 3
+            detections['score'] = [0.9, 0.3]
+            results.append(detections[detections['score'] > (low_conf if low_conf is not None else self.min_conf)])
+
+        return results
+
+    # Method: Used to find the detections that are above the confidence level
+    def is_confident(self, detections):
+        """
+        :param detections: Structured array (detection_dtype) of detections
+        :return: Boolean array, True for the confident detections
+        """
+        return detections['score'] > self.min_conf
+
+
+# Method: Used to get the box the stub detector returns for a frame
+def tag_box(stream, frame):
+    """
+    :param stream: Stream number
+    :param frame: Frame number
+    :return: Box [ymin, xmin, ymax, xmax]
+    """
+    return [4 * frame, 100 * stream, 4 * frame + 60, 100 * stream + 80]
+
+
+# Method: Used to read the stream and frame number drawn on a frame by 'make_tagged_video'
+def read_tag(image):
+    """
+    :param image: Image
+    :return: Stream and frame number
+    """
+    half = image.shape[0] // 2
+    return int(round((image[half:].mean() - 40) / 60)), int(round((image[:half].mean() - 20) / 8))
+
+
+# Method: Used to write a small video whose frames show their stream and frame number as flat grey levels
+def make_tagged_video(path, stream, n_frames, frame_size=(96, 128), fps=30):
+    """
+    :param path: Path to video file (.avi)
+    :param stream: Stream number (0 to 3)
+    :param n_frames: Number of frames (at most 25)
+    :param frame_size: Size (height, width) of the frames
+    :param fps: Frames per second
+    """
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (frame_size[1], frame_size[0]))
+    half = frame_size[0] // 2
+
+    for n in range(n_frames):
+        frame = np.empty((frame_size[0], frame_size[1], 3), dtype=np.uint8)
+        frame[:half] = 20 + 8 * n
+        frame[half:] = 40 + 60 * stream
+        writer.write(frame)
+
+    writer.release()
+
+
+# Method: Used to check that the server sends frames of different streams to the detector together and gives each
+# stream the detections of its own frames, in frame order (the first stream uses the two-stage association, so it
+# also gets the weak detections)
+def check_multi_stream(n_frames=(20, 14, 8), latency=0.005):
+    """
+    :param n_frames: Number of frames of each stream (the streams end at different times)
+    :param latency: Time (seconds) each call to the stub detector takes
+    :return: List with the number of frames in each batch passed to the detector
+    """
+    detector = StubDetector(latency=latency)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        streams = {}
+        for stream, n in enumerate(n_frames):
+            path = os.path.join(tmp_dir, 'camera_{}.avi'.format(stream))
+            make_tagged_video(path, stream, n)
+            streams['camera_{}'.format(stream)] = {'source': path, 'render': False,
+                                                   'association': 'two_stage' if stream == 0 else 'hungarian'}
+
+        server = MultiStreamServer(streams, max_hits=1, detector=detector)
+
+        # Record the frame and detections each tracker is given
+        seen = {}
+        for name, stream in server.streams.items():
+            tracker = stream['tracker']
+            seen[name] = []
+
+            # Method: Used to record the input of the pipeline of one stream
+            def pipeline(image, det_boxes=None, seen=seen[name], run=tracker.pipeline):
+                seen.append((read_tag(image), det_boxes))
+                return run(image, det_boxes)
+
+            tracker.pipeline = pipeline
+
+        # Method: Used to read the frame numbers of the results of one stream
+        async def read_results(name):
+            return [result['frame'] async for result in server.results(name)]
+
+        # Method: Used to run the server and read every stream
+        async def main():
+            return await asyncio.gather(server.run(), *(read_results(name) for name in server.streams))
+
+        results = asyncio.run(main())[1:]
+
+    for stream, (name, frames) in enumerate(zip(server.streams, results)):
+        n = n_frames[stream]
+        assert frames == list(range(n)), '{} results are not in frame order: {}'.format(name, frames)
+        assert [tag for tag, _ in seen[name]] == [(stream, i) for i in range(n)], \
+            '{} frames were tracked out of order: {}'.format(name, [tag for tag, _ in seen[name]])
+        for (_, i), detections in seen[name]:
+            expected = [tag_box(stream, i)] + ([tag_box(stream, i + 30)] if stream == 0 else [])
+            assert detections['box'].tolist() == expected, '{} frame {} got detections {}'.format(name, i, detections)
+
+    expected = [(stream, i) for stream, n in enumerate(n_frames) for i in range(n)]
+    assert sorted(tag for batch in detector.batches for tag in batch) == expected, \
+        'Not every frame was detected exactly once'
+    assert any(len({stream for stream, _ in batch}) > 1 for batch in detector.batches), \
+        'No batch has frames of more than one stream'
+
+    return [len(batch) for batch in detector.batches]
+
+
+# Method: Used to check that the server shuts down when a reader stops reading and its result queue is full
+def check_abandoned_reader(n_frames=20, queue_size=2, timeout=5.0):
+    """
+    :param n_frames: Number of frames of the stream
+    :param queue_size: Maximum number of results waiting to be read
+    :param timeout: Time (seconds) after which the server is considered to hang
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'camera.avi')
+        make_tagged_video(path, 0, n_frames)
+        server = MultiStreamServer({'camera': {'source': path, 'render': False}}, queue_size=queue_size,
+                                   detector=StubDetector(latency=0.0))
+
+        # Method: Used to read one result and stop, then cancel the server once its queue is full
+        async def main():
+            task = asyncio.ensure_future(server.run())
+            async for _ in server.results('camera'):
+                break
+            while not server.streams['camera']['results'].full():
+                await asyncio.sleep(0.01)
+
+            task.cancel()
+            try:
+                await asyncio.wait_for(task, timeout)
+            except asyncio.CancelledError:
+                pass
+
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    check_abandoned_reader()
+    print('[INFO]: The server shuts down when a reader stops reading')
+
+    batch_sizes = check_multi_stream()
+    print('[INFO]: Every stream got the detections of its own frames, in order')
+    print('[INFO]: {} detector calls for {} frames, mean batch size {:.1f}'.format(
+        len(batch_sizes), sum(batch_sizes), sum(batch_sizes) / len(batch_sizes)))
@@ -0,0 +1,138 @@
+import time
+import asyncio
+import cv2
+
+from utilities.BatchingDetector import BatchingDetector
+from utilities.VehicleDetector import VehicleDetector
+from VehicleDetectionAndTrackingProject import VehicleDetectionAndTrackingProject
+
+
+class MultiStreamServer:
+    # Marker placed on a result queue at the end of a stream
+    end_of_stream = object()
+
+    # Method: Constructor
+    def __init__(self, streams, min_conf=0.6, max_age=4, max_hits=10, max_batch_size=16, max_latency=0.02,
+                 queue_size=16, detector=None):
+        """
+        :param streams: Dictionary with the options for each stream, e.g. {'front_left': {'source': 'videos/a.mp4',
+            'left': True}}. 'source' is a video file or stream URL, 'realtime' (default False) paces the frames at
+            the video's frame rate as a stand-in for a live camera, and the remaining options are passed to
+            VehicleDetectionAndTrackingProject
+        :param min_conf: Minimum acceptable confidence level
+        :param max_age: No. of consecutive unmatched detection before a track is deleted
+        :param max_hits: No. of consecutive matches needed to establish a track
+        :param max_batch_size: Maximum number of frames (across all streams) passed to the model in a single call
+        :param max_latency: Maximum time (seconds) a frame is held back to fill a batch
+        :param queue_size: Maximum number of results waiting to be read for each stream
+        :param detector: Detector shared by every stream (a VehicleDetector is loaded if None)
+        """
+        # Set up a single 'Vehicle Detector' shared by every stream
+        self.detector = detector if detector is not None else VehicleDetector(kitti=False, min_conf=min_conf,
+                                                                              max_batch_size=max_batch_size)
+        self.batcher = BatchingDetector(self.detector, max_batch_size=max_batch_size, max_latency=max_latency)
+
+        # Set up a separate set of trackers and a result queue for each stream
+        self.streams = {}
+        for name, options in streams.items():
+            options = dict(options)
+            source = options.pop('source')
+            realtime = options.pop('realtime', False)
+            tracker = VehicleDetectionAndTrackingProject(min_conf=min_conf, max_age=max_age, max_hits=max_hits,
+                                                         detector=self.detector, **options)
+            self.streams[name] = {'source': source, 'realtime': realtime, 'tracker': tracker,
+                                  'results': asyncio.Queue(maxsize=queue_size), 'finished': False}
+
+    # Method: Used to read, detect and track every frame of one stream
+    async def run_stream(self, name):
+        """
+        :param name: Stream name
+        """
+        loop = asyncio.get_running_loop()
+        stream = self.streams[name]
+        tracker = stream['tracker']
+        self.batcher.add_stream()
+
+        # Decoding runs on the default thread pool so that the streams are read in parallel
+        capture = await loop.run_in_executor(None, cv2.VideoCapture, stream['source'])
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        start = time.perf_counter()
+        index = 0
+
+        try:
+            while True:
+                ok, frame = await loop.run_in_executor(None, capture.read)
+                if not ok:
+                    break
+
+                # Hold back frames of a live stand-in until they would have arrived from the camera
+                if stream['realtime']:
+                    await asyncio.sleep(max(0.0, start + index / fps - time.perf_counter()))
+
+                # Detections come with their classes and scores, for per-class motion profiles and the two-stage
+                # association
+                detections = await self.batcher.detect(frame, tracker.low_conf)
+                image = await loop.run_in_executor(None, tracker.pipeline, frame, detections)
+
+                await stream['results'].put({'stream': name, 'frame': index, 'ids': tracker.good_ids,
+                                             'boxes': tracker.good_boxes, 'warning': tracker.warning, 'image': image})
+                index += 1
+        finally:
+            capture.release()
+            self.batcher.remove_stream()
+
+            # The end marker must not wait for room in the queue (the reader may have stopped), so a full queue is
+            # left to 'results', which stops once it is empty
+            stream['finished'] = True
+            if not stream['results'].full():
+                stream['results'].put_nowait(self.end_of_stream)
+
+    # Method: Used to run every stream until the end of its video
+    async def run(self):
+        worker = asyncio.ensure_future(self.batcher.run())
+
+        try:
+            await asyncio.gather(*(self.run_stream(name) for name in self.streams))
+        finally:
+            self.batcher.close()
+            await worker
+
+    # Method: Used to read the results of one stream as they become available
+    async def results(self, name):
+        """
+        :param name: Stream name
+        :return: Async iterator with a dictionary for each frame (stream, frame index, track IDs, boxes, warning
+            and the annotated image)
+        """
+        stream = self.streams[name]
+        queue = stream['results']
+
+        while not (stream['finished'] and queue.empty()):
+            result = await queue.get()
+            if result is self.end_of_stream:
+                return
+            yield result
+
+
+if __name__ == '__main__':
+    # Local files stand in for the camera feeds
+    server = MultiStreamServer({'front_left': {'source': 'videos/front_left_1.mp4', 'left': True},
+                                'front_right': {'source': 'videos/front_right_1.mp4', 'left': False},
+                                'rear': {'source': 'videos/rear_right_2.mp4', 'front': False}})
+
+    # Method: Used to print the warnings of one stream
+    async def report(name):
+        warnings = 0
+        async for result in server.results(name):
+            warnings += result['warning']
+        print('[INFO]: {:<12} {} warnings'.format(name, warnings))
+
+    # Method: Used to run the server and read every stream
+    async def main():
+        start = time.perf_counter()
+        await asyncio.gather(server.run(), *(report(name) for name in server.streams))
+        batch_sizes = server.batcher.batch_sizes
+        print('[INFO]: {} detector calls, mean batch size {:.1f}, {:.2f} s'.format(
+            len(batch_sizes), sum(batch_sizes) / max(1, len(batch_sizes)), time.perf_counter() - start))
+
+    asyncio.run(main())
@@ -1,8 +1,30 @@
 import cv2
-import numpy as np
 from tqdm import tqdm
 
 from VehicleDetectionAndTrackingProject import VehicleDetectionAndTrackingProject
+from utilities.FrameBuffer import FrameBuffer
+from utilities.Profiler import Profiler
+from utilities.VehicleDetector import VehicleDetector
+from utilities.StreamingRunner import StreamingRunner, read_video_frames
+from utilities.TrackWriter import TrackWriter
+from utilities.VideoConversion import VideoSink
+
+# Number of frames passed to the detector in a single call (1 processes the video frame by frame)
+batch_size = 8
+
+# Maximum number of frames waiting between two stages
+queue_size = 4
+
+# Region of interest [ymin, xmin, ymax, xmax] passed to the detector in normalized coordinates (whole frame if None),
+# e.g. [0.3, 0.0, 0.85, 1.0] drops the sky and the hood, and the factor by which it is resized before inference
+roi = None
+scale = 1.0
+
+# If True, record the time spent in each stage and save it as a Chrome trace (chrome://tracing)
+profile = False
+
+# If False, only the track records are written (no drawing and no video encoding)
+render = True
 
 # Set up video capture
 video = cv2.VideoCapture('videos/front_right_2.mp4')
@@ -10,25 +32,64 @@ video = cv2.VideoCapture('videos/front_right_2.mp4')
 # Get information about the videos
 n_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
 fps = int(video.get(cv2.CAP_PROP_FPS))
+frame_size = (int(video.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(video.get(cv2.CAP_PROP_FRAME_WIDTH)))
+
+# Frames are decoded into preallocated buffers and annotated in place
+frame_buffer = FrameBuffer(frame_size)
+
+# Write annotated frames straight into a video ('frames' dumps a PNG per frame into the output directory instead)
+sink = VideoSink('output/front_right_2_out.mp4', fps=fps, codec='mp4v', backend='opencv') if render else None
+
+# Write a record of every established track on every frame ('parquet' for a columnar file)
+writer = TrackWriter('output/front_right_2_tracks.jsonl', backend='jsonl', fps=fps)
 
 # Create instances for vehicle detection
-vdt = VehicleDetectionAndTrackingProject(front=True, left=False)
+profiler = Profiler() if profile else None
+detector = VehicleDetector(kitti=False, min_conf=0.6, roi=roi, scale=scale)
+vdt = VehicleDetectionAndTrackingProject(front=True, left=False, detector=detector, profiler=profiler, writer=writer,
+                                         render=render)
 
-for n in tqdm(range(n_frames)):
-    # Grab the frames from their respective video streams
-    ok, frame = video.read()
+# Run dummy inferences at the video size before the first frame and report the start up time
+vdt.detector.warmup(input_size=frame_size)
+print(vdt.detector.startup_report())
 
-    if ok:
-        # Process images
-        out = vdt.pipeline(frame)
 
-        # Get warnings
-        warning = vdt.warning
+# Method: Used to detect vehicles in a micro-batch of frames and update the trackers in frame order
+def process(frames):
+    outputs = []
+
+    for frame, det_boxes in zip(frames, vdt.detector.get_bounding_box_locations_batch(frames)):
+        # Process images
+        out = vdt.pipeline(frame, det_boxes)
 
         # Add 'SAFE' to image when no warnings were issued
-        if not warning:
+        if render and not vdt.warning:
             dims = out.shape[:2]
             cv2.putText(out, 'SAFE', (int(dims[1]/2)-80, 50), cv2.FONT_HERSHEY_DUPLEX, 2.0, (0, 255, 0), 2, cv2.LINE_AA)
 
-        # Save frame
-        cv2.imwrite('output/front_right_2_out/frame{}.png'.format(n+1), out)
+        outputs.append(out)
+
+    return outputs
+
+
+# Method: Used to save a processed frame and hand its buffer back for decoding
+def write(n, out):
+    if sink is not None:
+        sink.write(out)
+    frame_buffer.release(out)
+
+
+# Decode, detect and track, and write frames on separate threads
+runner = StreamingRunner(tqdm(read_video_frames(video, frame_buffer=frame_buffer), total=n_frames), process, write,
+                         batch_size=batch_size, queue_size=queue_size)
+try:
+    runner.run()
+finally:
+    writer.close()
+    if sink is not None:
+        sink.close()
+print(runner.summary())
+
+if profiler is not None:
+    print(profiler.summary())
+    profiler.to_chrome_trace('output/front_right_2_trace.json')
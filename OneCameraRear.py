@@ -1,6 +1,17 @@
 import cv2
 from tqdm import tqdm
+
 from VehicleDetectionAndTrackingProject import VehicleDetectionAndTrackingProject
+from utilities.FrameBuffer import FrameBuffer
+from utilities.StreamingRunner import StreamingRunner, read_video_frames
+from utilities.TrackWriter import TrackWriter
+from utilities.VideoConversion import VideoSink
+
+# Maximum number of frames waiting between two stages
+queue_size = 4
+
+# If False, only the track records are written (no drawing and no video encoding)
+render = True
 
 # Set up video capture
 video = cv2.VideoCapture('videos/rear_right_2.mp4')
@@ -8,26 +19,58 @@ video = cv2.VideoCapture('videos/rear_right_2.mp4')
 # Get information about the videos
 n_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
 fps = int(video.get(cv2.CAP_PROP_FPS))
+frame_size = (int(video.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(video.get(cv2.CAP_PROP_FRAME_WIDTH)))
+
+# Frames are decoded into preallocated buffers and annotated in place
+frame_buffer = FrameBuffer(frame_size)
+
+# Write annotated frames straight into a video ('frames' dumps a PNG per frame into the output directory instead)
+sink = VideoSink('output/rear_right_2_out_test.mp4', fps=fps, codec='mp4v', backend='opencv') if render else None
+
+# Write a record of every established track on every frame ('parquet' for a columnar file)
+writer = TrackWriter('output/rear_right_2_tracks.jsonl', backend='jsonl', fps=fps)
 
 # Create instances for vehicle detection
-vdt = VehicleDetectionAndTrackingProject(front=False)
+vdt = VehicleDetectionAndTrackingProject(front=False, writer=writer, render=render)
+
+# Run dummy inferences at the video size before the first frame and report the start up time
+vdt.detector.warmup(input_size=frame_size)
+print(vdt.detector.startup_report())
 
-for _ in tqdm(range(n_frames)):
-    # Grab the frames from their respective video streams
-    ok, frame_in = video.read()
 
-    if ok:
+# Method: Used to detect vehicles in a frame and update the trackers
+def process(frames):
+    outputs = []
+
+    for frame_in in frames:
         # Process images
         frame_out = vdt.pipeline(frame_in)
 
-        # Get warning
-        frame_warning = vdt.warning
-
         # Add 'SAFE' to image when no warnings were issued
-        if not frame_warning:
+        if render and not vdt.warning:
             dims = frame_out.shape[:2]
             cv2.putText(frame_out, 'SAFE', (int(dims[1]/2)-80, 50), cv2.FONT_HERSHEY_DUPLEX, 2.0, (0, 255, 0), 2,
                         cv2.LINE_AA)
 
-        # Save frame
-        cv2.imwrite('output/rear_right_2_out_test/frame{}.png'.format(vdt.count), frame_out)
+        outputs.append(frame_out)
+
+    return outputs
+
+
+# Method: Used to save a processed frame and hand its buffer back for decoding
+def write(n, frame_out):
+    if sink is not None:
+        sink.write(frame_out)
+    frame_buffer.release(frame_out)
+
+
+# Decode, detect and track, and write frames on separate threads
+runner = StreamingRunner(tqdm(read_video_frames(video, frame_buffer=frame_buffer), total=n_frames), process, write,
+                         queue_size=queue_size)
+try:
+    runner.run()
+finally:
+    writer.close()
+    if sink is not None:
+        sink.close()
+print(runner.summary())
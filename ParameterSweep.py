@@ -0,0 +1,190 @@
+import os
+import csv
+import time
+import random
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from VehicleDetectionAndTracking import VehicleDetectionAndTracking
+from utilities.BoundingBox import box_iou_matrix
+from utilities.DetectionCache import DetectionCache, CachedVehicleDetector
+
+# Detection cache opened once in each worker process (memory-mapped, so every worker shares the same pages)
+worker_cache = None
+
+
+# Method: Used to open the shared detection cache in a worker process
+def init_worker(cache_path):
+    """
+    :param cache_path: Path to the detection cache directory
+    """
+    global worker_cache
+    worker_cache = DetectionCache.from_path(cache_path)
+
+
+# Method: Used to create every combination of the parameter values
+def grid_search(param_grid):
+    """
+    :param param_grid: Dictionary with a list of values for each parameter
+    :return: List of configurations (dictionaries)
+    """
+    names = sorted(param_grid)
+
+    return [dict(zip(names, values)) for values in itertools.product(*[param_grid[name] for name in names])]
+
+
+# Method: Used to sample random parameter values
+def random_search(param_ranges, n_configs, seed=0):
+    """
+    :param param_ranges: Dictionary with a (low, high) range (sampled uniformly, integers if both are integers) or a
+        list of choices for each parameter
+    :param n_configs: Number of configurations
+    :param seed: Random seed
+    :return: List of configurations (dictionaries)
+    """
+    rng = random.Random(seed)
+    configs = []
+
+    for _ in range(n_configs):
+        config = {}
+        for name, values in sorted(param_ranges.items()):
+            if isinstance(values, list):
+                config[name] = rng.choice(values)
+            elif all(isinstance(v, int) for v in values):
+                config[name] = rng.randint(values[0], values[1])
+            else:
+                config[name] = rng.uniform(values[0], values[1])
+        configs.append(config)
+
+    return configs
+
+
+# Method: Used to check that a configuration can be run
+def check_configuration(config):
+    """
+    :param config: Dictionary with 'min_conf', 'max_age', 'max_hits' and 'min_iou'
+    :raises ValueError: If a parameter is missing or out of range
+    """
+    missing = [name for name in ('min_conf', 'max_age', 'max_hits', 'min_iou') if name not in config]
+    if missing:
+        raise ValueError('Configuration is missing {}'.format(', '.join(missing)))
+
+    if not 0.0 <= config['min_conf'] <= 1.0:
+        raise ValueError('min_conf must be in [0, 1], got {}'.format(config['min_conf']))
+    if not 0.0 <= config['min_iou'] <= 1.0:
+        raise ValueError('min_iou must be in [0, 1], got {}'.format(config['min_iou']))
+    if config['max_age'] < 0 or config['max_hits'] < 0:
+        raise ValueError('max_age and max_hits must not be negative, got {} and {}'.format(config['max_age'],
+                                                                                           config['max_hits']))
+
+
+# Method: Used to run the tracking pass for one configuration over the cached detections
+def evaluate_configuration(config):
+    """
+    :param config: Dictionary with 'min_conf', 'max_age', 'max_hits' and 'min_iou'
+    :return: Dictionary with the configuration and its metrics, or with an 'error' if the configuration is invalid
+        (any other exception is raised, since it is a bug rather than a bad configuration)
+    """
+    result = dict(config)
+
+    try:
+        check_configuration(config)
+        detector = CachedVehicleDetector(worker_cache, min_conf=config['min_conf'])
+        vdt = VehicleDetectionAndTracking(max_age=config['max_age'], max_hits=config['max_hits'],
+                                          min_iou=config['min_iou'], detector=detector)
+    except ValueError as e:
+        result['error'] = str(e)
+        return result
+
+    # Filter the cached detections with this configuration's confidence level (no TensorFlow graph is loaded)
+    all_det_boxes = detector.get_bounding_box_locations_batch([None] * len(worker_cache))
+
+    # A confirmed track that starts on top of a recently lost confirmed track is counted as an ID switch
+    window = config['max_age'] + config['max_hits'] + 1
+    previous, lost = {}, []
+    confirmed_tracks, id_switches = 0, 0
+    latencies = []
+
+    for n, det_boxes in enumerate(all_det_boxes):
+        start = time.perf_counter()
+        good_ids, good_boxes = vdt.track(det_boxes)
+        latencies.append(time.perf_counter() - start)
+
+        current = dict(zip(good_ids, good_boxes))
+        lost = [(frame, box) for frame, box in lost if n - frame <= window]
+        lost.extend((n, previous[i]) for i in previous if i not in current)
+
+        for i in current:
+            if i not in previous:
+                confirmed_tracks += 1
+
+                if lost:
+                    overlaps = box_iou_matrix(current[i], [box for _, box in lost])[0]
+                    if overlaps.max() > config['min_iou']:
+                        id_switches += 1
+                        del lost[int(overlaps.argmax())]
+
+        previous = current
+
+    latencies = 1000.0 * np.array(latencies) if latencies else np.zeros(1)
+    result.update({'frames': len(all_det_boxes),
+                   'confirmed_tracks': confirmed_tracks,
+                   'id_switches': id_switches,
+                   'mean_latency_ms': float(latencies.mean()),
+                   'p95_latency_ms': float(np.percentile(latencies, 95))})
+
+    return result
+
+
+# Method: Used to run every configuration on a pool of worker processes
+def run_sweep(cache_path, configs, max_workers=None):
+    """
+    :param cache_path: Path to a complete detection cache directory
+    :param configs: List of configurations
+    :param max_workers: Number of worker processes (all cores if None)
+    :return: List with the metrics for each configuration (invalid configurations have an 'error' instead)
+    """
+    if not DetectionCache.from_path(cache_path).complete:
+        raise ValueError('Detection cache {} is incomplete, run the detector over the video first'.format(cache_path))
+
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), initializer=init_worker,
+                             initargs=(cache_path,)) as pool:
+        results = list(pool.map(evaluate_configuration, configs))
+
+    for result in results:
+        if 'error' in result:
+            print('[WARNING]: Skipped configuration {}: {}'.format(
+                {name: value for name, value in result.items() if name != 'error'}, result['error']))
+
+    return results
+
+
+# Method: Used to save the results table as a CSV file
+def save_results(results, path):
+    """
+    :param results: List with the metrics for each configuration
+    :param path: Path to CSV file
+    """
+    fields = sorted(set(key for result in results for key in result))
+
+    with open(path, 'w', newline='') as fid:
+        writer = csv.DictWriter(fid, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+if __name__ == '__main__':
+    video_path = 'videos/video1_short.mp4'
+    param_grid = {'min_conf': [0.5, 0.6, 0.7, 0.8],
+                  'max_age': [1, 2, 4, 8],
+                  'max_hits': [2, 4, 8, 10],
+                  'min_iou': [0.1, 0.25, 0.4]}
+
+    # Detections must be cached once beforehand (e.g. by running VehicleDetectionAndTracking.py)
+    sweep_results = run_sweep(DetectionCache(video_path).path, grid_search(param_grid))
+    save_results(sweep_results, 'sweep_results.csv')
+
+    sweep_results = [sweep_result for sweep_result in sweep_results if 'error' not in sweep_result]
+    for sweep_result in sorted(sweep_results, key=lambda r: (r['id_switches'], -r['confirmed_tracks']))[:10]:
+        print(sweep_result)
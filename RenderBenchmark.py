@@ -0,0 +1,111 @@
+import time
+import numpy as np
+import PIL.Image as Image
+import PIL.ImageColor as ImageColor
+import PIL.ImageDraw as ImageDraw
+import PIL.ImageFont as ImageFont
+
+from utilities.Visualization import standard_colors, visualize_boxes_and_labels_on_image_array
+
+
+# Method: Used to draw boxes, labels and masks like the PIL based Visualization module did (the reference)
+def pil_visualize(image, boxes, classes, scores, category_index, instance_masks=None):
+    """
+    :param image: A numpy array with shape (img_height, img_width, 3)
+    :param boxes: A numpy array of shape [N, 4] with normalized coordinates
+    :param classes: A numpy array of shape [N]
+    :param scores: A numpy array of shape [N]
+    :param category_index: A dict containing category index `id` and category name `name`) keyed by category indices
+    :param instance_masks: A numpy array of shape [N, image_height, image_width]
+    :return: Image
+    """
+    for i in range(boxes.shape[0]):
+        color = standard_colors[classes[i] % len(standard_colors)]
+        display_str = '{}: {}%'.format(category_index.get(classes[i], {'name': 'N/A'})['name'], int(100 * scores[i]))
+
+        # A conversion to PIL and back for every mask and every box, and a font lookup for every box
+        if instance_masks is not None:
+            pil_image = Image.fromarray(image)
+            solid_color = Image.new('RGBA', pil_image.size, ImageColor.getrgb(color))
+            pil_mask = Image.fromarray(np.uint8(255.0 * 0.7 * instance_masks[i])).convert('L')
+            np.copyto(image, np.array(Image.composite(solid_color, pil_image, pil_mask).convert('RGB')))
+
+        pil_image = Image.fromarray(np.uint8(image)).convert('RGB')
+        draw = ImageDraw.Draw(pil_image)
+        im_width, im_height = pil_image.size
+        ymin, xmin, ymax, xmax = boxes[i]
+        (left, right, top, bottom) = (xmin * im_width, xmax * im_width, ymin * im_height, ymax * im_height)
+        draw.line([(left, top), (left, bottom), (right, bottom), (right, top), (left, top)], width=4, fill=color)
+
+        try:
+            font = ImageFont.truetype('arial.ttf', 24)
+        except IOError:
+            font = ImageFont.load_default()
+
+        text_left, text_top, text_right, text_bottom = font.getbbox(display_str)
+        draw.rectangle([(left, top - text_bottom - 4), (left + text_right, top)], fill=color)
+        draw.text((left + 2, top - text_bottom - 2), display_str, fill='black', font=font)
+        np.copyto(image, np.array(pil_image))
+
+    return image
+
+
+# Method: Used to generate the detections for a frame
+def make_detections(n_boxes, frame_size=(720, 1280), seed=0):
+    """
+    :param n_boxes: Number of boxes
+    :param frame_size: Size (height, width) of the frame
+    :param seed: Random seed
+    :return: Boxes (normalized), classes, scores and instance masks
+    """
+    rng = np.random.RandomState(seed)
+    corner = rng.uniform(0.05, 0.8, size=(n_boxes, 2))
+    boxes = np.concatenate([corner, corner + rng.uniform(0.05, 0.15, size=(n_boxes, 2))], axis=1)
+    classes = rng.choice([1, 3, 4, 6, 8], size=n_boxes)
+    scores = rng.uniform(0.6, 1.0, size=n_boxes)
+
+    masks = np.zeros((n_boxes, frame_size[0], frame_size[1]), dtype=np.uint8)
+    for mask, box in zip(masks, (boxes * np.tile(frame_size, 2)).astype(int)):
+        mask[box[0]:box[2], box[1]:box[3]] = 1
+
+    return boxes, classes, scores, masks
+
+
+# Method: Used to time the rendering of a frame with the PIL reference and the OpenCV renderer
+def time_renderers(n_boxes, with_masks, frame_size=(720, 1280), n_frames=20):
+    """
+    :param n_boxes: Number of boxes drawn on each frame
+    :param with_masks: If True, also blend an instance mask for every box
+    :param frame_size: Size (height, width) of the frame
+    :param n_frames: Number of frames
+    :return: Dictionary with the time (milliseconds) per frame of each renderer
+    """
+    boxes, classes, scores, masks = make_detections(n_boxes, frame_size)
+    masks = masks if with_masks else None
+    category_index = {1: {'name': 'person'}, 3: {'name': 'car'}, 4: {'name': 'motorcycle'}, 6: {'name': 'bus'},
+                      8: {'name': 'truck'}}
+    frame = np.full((frame_size[0], frame_size[1], 3), 80, dtype=np.uint8)
+    result = {'boxes': n_boxes, 'masks': with_masks}
+
+    start = time.perf_counter()
+    for _ in range(n_frames):
+        pil_visualize(frame.copy(), boxes, classes, scores, category_index, masks)
+    result['pil_ms'] = 1e3 * (time.perf_counter() - start) / n_frames
+
+    start = time.perf_counter()
+    for _ in range(n_frames):
+        visualize_boxes_and_labels_on_image_array(frame.copy(), boxes, classes, scores, category_index, masks,
+                                                  use_normalized_coordinates=True, max_boxes_to_draw=None)
+    result['opencv_ms'] = 1e3 * (time.perf_counter() - start) / n_frames
+
+    return result
+
+
+if __name__ == '__main__':
+    print('{:>6} {:>6} {:>10} {:>12} {:>10}'.format('boxes', 'masks', 'PIL (ms)', 'OpenCV (ms)', 'speedup'))
+
+    for with_masks in (False, True):
+        for n in [1, 10, 50]:
+            r = time_renderers(n, with_masks)
+            print('{:>6} {:>6} {:>10.2f} {:>12.2f} {:>9.1f}x'.format(n, str(with_masks), r['pil_ms'], r['opencv_ms'],
+                                                                      r['pil_ms'] / r['opencv_ms']))
@@ -0,0 +1,112 @@
+import os
+import sys
+import time
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Method: Used to measure the time from a cold start until the first frame has been processed (run in a fresh process)
+def measure_start_up(video_path, mode='cold'):
+    """
+    :param video_path: Path to the video
+    :param mode: 'cold' (load the model), 'warmup' (load the model and run 'warmup' before the first frame) or
+        'cache' (replay detections from the video's DetectionCache)
+    :return: Dictionary with the time (seconds) for each step from the start of the process
+    """
+    start = time.perf_counter()
+
+    import cv2
+    from VehicleDetectionAndTrackingProject import VehicleDetectionAndTrackingProject
+    imported = time.perf_counter()
+
+    video = cv2.VideoCapture(video_path)
+    ok, first_frame = video.read()
+    ok, second_frame = video.read()
+    video.release()
+
+    if mode == 'cache':
+        from utilities.DetectionCache import DetectionCache, CachedVehicleDetector
+        detector = CachedVehicleDetector(DetectionCache(video_path), min_conf=0.6)
+    else:
+        from utilities.VehicleDetector import VehicleDetector
+        detector = VehicleDetector(kitti=False, min_conf=0.6, input_size=first_frame.shape[0:2],
+                                   warmup=mode == 'warmup')
+    ready = time.perf_counter()
+
+    vdt = VehicleDetectionAndTrackingProject(detector=detector)
+    vdt.pipeline(first_frame)
+    first = time.perf_counter()
+    vdt.pipeline(second_frame)
+    second = time.perf_counter()
+
+    return {'mode': mode, 'import_s': imported - start, 'detector_s': ready - imported,
+            'first_frame_s': first - ready, 'cold_start_s': first - start, 'second_frame_s': second - first,
+            'tensorflow_loaded': 'tensorflow' in sys.modules,
+            'startup_times': getattr(detector, 'startup_times', {})}
+
+
+# Method: Used to check that a cached detector can be warmed up and reported on like a VehicleDetector, without
+# loading the model
+def check_cached_detector():
+    from utilities.DetectionCache import DetectionCache, CachedVehicleDetector
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # The cache is keyed by the contents of the video and the model, so placeholder files are enough
+        video_path, model_path = os.path.join(tmp_dir, 'camera.avi'), os.path.join(tmp_dir, 'model.pb')
+        for path in (video_path, model_path):
+            with open(path, 'w') as fid:
+                fid.write(path)
+
+        cache = DetectionCache(video_path, model_path=model_path, cache_dir=os.path.join(tmp_dir, 'cache'),
+                               n_frames=4)
+        detector = CachedVehicleDetector(cache, min_conf=0.6)
+
+        assert detector.warmup(input_size=(720, 1280)) == 0.0, 'A cached detector without a model warmed up'
+        assert 'total' in detector.startup_report(), 'The startup report of a cached detector has no total'
+        assert 'tensorflow' not in sys.modules, 'A cached detector loaded TensorFlow'
+
+
+# Method: Used to run each measurement in a fresh interpreter so that nothing is already imported or loaded
+def run_benchmark(video_path, modes=('cold', 'warmup', 'cache')):
+    """
+    :param video_path: Path to the video
+    :param modes: Start up modes to measure (see 'measure_start_up')
+    :return: List with the result of each mode
+    """
+    results = []
+
+    for mode in modes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            try:
+                results.append(executor.submit(measure_start_up, video_path, mode).result())
+            except Exception as e:
+                results.append({'mode': mode, 'error': repr(e)})
+
+    return results
+
+
+# Method: Used to print the benchmark results as a table
+def print_results(results):
+    """
+    :param results: List of results from 'run_benchmark'
+    """
+    print('{:>8} {:>9} {:>10} {:>13} {:>12} {:>14} {:>4}'.format('mode', 'import s', 'detector s', 'first frame s',
+                                                                  'cold start s', 'second frame s', 'TF'))
+
+    for r in results:
+        if 'error' in r:
+            print('{:>8} {}'.format(r['mode'], r['error']))
+            continue
+
+        print('{:>8} {:>9.2f} {:>10.2f} {:>13.3f} {:>12.2f} {:>14.3f} {:>4}'.format(
+            r['mode'], r['import_s'], r['detector_s'], r['first_frame_s'], r['cold_start_s'], r['second_frame_s'],
+            'yes' if r['tensorflow_loaded'] else 'no'))
+
+
+if __name__ == '__main__':
+    check_cached_detector()
+    print('[INFO]: A cached detector can be warmed up and reported on without loading the model')
+
+    # 'cache' needs the detections cached beforehand (e.g. by running VehicleDetectionAndTracking.py)
+    print_results(run_benchmark('videos/video1_short.mp4'))
@@ -0,0 +1,318 @@
+import time
+import tracemalloc
+import numpy as np
+from collections import defaultdict
+from scipy.optimize import linear_sum_assignment
+
+from VehicleDetectionAndTracking import VehicleDetectionAndTracking, coco_motion_profiles
+from utilities.BoundingBox import box_iou_matrix
+from utilities.DetectionScheduler import DetectionScheduler
+from utilities.SyntheticTraffic import generate_scene, SyntheticDetector
+
+
+# Method: Used to calculate MOTA and IDF1-style accuracy of the tracks against the ground truth
+def evaluate_tracks(gt_ids, gt_boxes, hyp_ids, hyp_boxes, min_iou=0.5):
+    """
+    :param gt_ids: List with the ground truth IDs for each frame
+    :param gt_boxes: List with the ground truth boxes for each frame
+    :param hyp_ids: List with the track IDs for each frame
+    :param hyp_boxes: List with the track boxes for each frame
+    :param min_iou: Minimum IOU for a track to be matched to a ground truth box
+    :return: Dictionary with MOTA, IDF1, ID switches, misses, false positives and the number of ground truth boxes
+    """
+    n_gt, n_hyp, misses, false_positives, id_switches = 0, 0, 0, 0, 0
+    last_match = {}
+    co_occurrence = defaultdict(int)
+
+    for f_gt_ids, f_gt_boxes, f_hyp_ids, f_hyp_boxes in zip(gt_ids, gt_boxes, hyp_ids, hyp_boxes):
+        iou_matrix = box_iou_matrix(f_gt_boxes, f_hyp_boxes)
+        rows, cols = linear_sum_assignment(-iou_matrix)
+        keep = iou_matrix[rows, cols] >= min_iou
+        rows, cols = rows[keep], cols[keep]
+
+        n_gt += len(f_gt_ids)
+        n_hyp += len(f_hyp_ids)
+        misses += len(f_gt_ids) - len(rows)
+        false_positives += len(f_hyp_ids) - len(cols)
+
+        for r, c in zip(rows, cols):
+            gt_id, hyp_id = f_gt_ids[r], f_hyp_ids[c]
+            if gt_id in last_match and last_match[gt_id] != hyp_id:
+                id_switches += 1
+            last_match[gt_id] = hyp_id
+            co_occurrence[(gt_id, hyp_id)] += 1
+
+    # Find the best one-to-one mapping between ground truth IDs and track IDs over the whole video
+    id_tp = 0
+    if co_occurrence:
+        gt_keys = sorted(set(k[0] for k in co_occurrence))
+        hyp_keys = sorted(set(k[1] for k in co_occurrence))
+        gt_index = {k: i for i, k in enumerate(gt_keys)}
+        hyp_index = {k: i for i, k in enumerate(hyp_keys)}
+        counts = np.zeros((len(gt_keys), len(hyp_keys)))
+        for (gt_id, hyp_id), count in co_occurrence.items():
+            counts[gt_index[gt_id], hyp_index[hyp_id]] = count
+        rows, cols = linear_sum_assignment(-counts)
+        id_tp = counts[rows, cols].sum()
+
+    mota = 1.0 - (misses + false_positives + id_switches) / float(max(1, n_gt))
+    idf1 = 2.0 * id_tp / max(1, n_gt + n_hyp)
+
+    return {'mota': mota, 'idf1': idf1, 'id_switches': id_switches, 'misses': misses,
+            'false_positives': false_positives, 'gt_boxes': n_gt}
+
+
+# Method: Used to create a tracker fed by the synthetic detections (the TensorFlow detector is never loaded)
+def make_tracker(scene, max_age, max_hits, latency=0.0, scheduler=None):
+    """
+    :param scene: Scene from 'generate_scene'
+    :param max_age: No. of consecutive unmatched detection before a track is deleted
+    :param max_hits: No. of consecutive matches needed to establish a track
+    :param latency: Time (seconds) each detector call takes
+    :param scheduler: DetectionScheduler (the detector runs on every frame if None)
+    :return: VehicleDetectionAndTracking
+    """
+    return VehicleDetectionAndTracking(max_age=max_age, max_hits=max_hits,
+                                       detector=SyntheticDetector(scene['det_boxes'], latency=latency),
+                                       scheduler=scheduler)
+
+
+# Method: Used to run the tracking loop over a synthetic scene and report accuracy, throughput and memory
+def run_benchmark(n_objects, n_frames=100, max_age=4, max_hits=3, seed=0):
+    """
+    :param n_objects: Number of vehicles in the scene
+    :param n_frames: Number of frames
+    :param max_age: No. of consecutive unmatched detection before a track is deleted
+    :param max_hits: No. of consecutive matches needed to establish a track
+    :param seed: Random seed
+    :return: Dictionary with the accuracy, frames/second, per-stage latency percentiles and peak memory
+    """
+    scene = generate_scene(n_objects, n_frames=n_frames, seed=seed)
+
+    # Timed pass
+    vdt = make_tracker(scene, max_age, max_hits)
+    timings = {'detect': [], 'match': [], 'update': [], 'frame': []}
+    match = vdt.match_detections_to_trackers
+
+    def timed_match(*args, **kwargs):
+        start = time.perf_counter()
+        result = match(*args, **kwargs)
+        timings['match'].append(time.perf_counter() - start)
+        return result
+
+    vdt.match_detections_to_trackers = timed_match
+    hyp_ids, hyp_boxes = [], []
+
+    for _ in range(n_frames):
+        start = time.perf_counter()
+        det_boxes = vdt.detector.get_bounding_box_locations()
+        detected = time.perf_counter()
+        good_ids, good_boxes = vdt.track(det_boxes)
+        end = time.perf_counter()
+
+        timings['detect'].append(detected - start)
+        timings['update'].append(end - detected - timings['match'][-1])
+        timings['frame'].append(end - start)
+        hyp_ids.append(good_ids)
+        hyp_boxes.append(good_boxes)
+
+    # Memory pass (run separately so that tracing does not distort the timings)
+    vdt = make_tracker(scene, max_age, max_hits)
+    tracemalloc.start()
+    for _ in range(n_frames):
+        vdt.track(vdt.detector.get_bounding_box_locations())
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = evaluate_tracks(scene['gt_ids'], scene['gt_boxes'], hyp_ids, hyp_boxes)
+    result.update({'objects': n_objects,
+                   'fps': n_frames / sum(timings['frame']),
+                   'peak_memory_mb': peak_memory / 2.0 ** 20})
+
+    for stage, values in timings.items():
+        values = 1000.0 * np.array(values)
+        for p in (50, 95, 99):
+            result['{}_p{}_ms'.format(stage, p)] = float(np.percentile(values, p))
+
+    return result
+
+
+# Method: Used to compare detecting on every frame with the adaptive detection scheduler on a slow detector
+def run_scheduler_benchmark(n_objects, n_frames=300, fps=30.0, latency=0.05, max_age=4, max_hits=3, seed=0):
+    """
+    :param n_objects: Number of vehicles in the scene
+    :param n_frames: Number of frames
+    :param fps: Frame rate the tracker has to keep up with
+    :param latency: Time (seconds) each detector call takes
+    :param max_age: No. of consecutive unmatched detection before a track is deleted
+    :param max_hits: No. of consecutive matches needed to establish a track
+    :param seed: Random seed
+    :return: List with the accuracy, detection rate and frames/second with and without the scheduler
+    """
+    scene = generate_scene(n_objects, n_frames=n_frames, seed=seed)
+    results = []
+
+    for scheduler in (None, DetectionScheduler(fps=fps)):
+        vdt = make_tracker(scene, max_age, max_hits, latency=latency, scheduler=scheduler)
+        hyp_ids, hyp_boxes = [], []
+
+        start = time.perf_counter()
+        for _ in range(n_frames):
+            good_ids, good_boxes = vdt.detect_and_track(None)
+            hyp_ids.append(good_ids)
+            hyp_boxes.append(good_boxes)
+        elapsed = time.perf_counter() - start
+
+        result = evaluate_tracks(scene['gt_ids'], scene['gt_boxes'], hyp_ids, hyp_boxes)
+        result.update({'scheduler': scheduler is not None, 'fps': n_frames / elapsed,
+                       'detection_rate': scheduler.detection_rate if scheduler is not None else 1.0})
+        results.append(result)
+
+    return results
+
+
+# Method: Used to compare class-agnostic and class-aware tracking on a scene with cars, trucks and pedestrians
+def run_class_benchmark(n_objects, n_frames=100, density=60, max_age=4, max_hits=3, seed=0):
+    """
+    :param n_objects: Number of vehicles (and pedestrians) in the scene
+    :param n_frames: Number of frames
+    :param density: Number of objects per 1080x1920 area
+    :param max_age: No. of consecutive unmatched detection before a track is deleted
+    :param max_hits: No. of consecutive matches needed to establish a track
+    :param seed: Random seed
+    :return: List with the accuracy, matching time and number of compared pairs per frame for each mode
+    """
+    class_mix = {1: {'share': 0.3, 'box_height': (40, 80), 'aspect': (0.3, 0.5), 'speed': 1.0},
+                 3: {'share': 0.5},
+                 7: {'share': 0.2, 'box_height': (70, 120), 'aspect': (1.5, 2.5), 'speed': 2.0}}
+    scene = generate_scene(n_objects, n_frames=n_frames, density=density, class_mix=class_mix, seed=seed)
+    results = []
+
+    for motion_profiles in (None, coco_motion_profiles):
+        vdt = VehicleDetectionAndTracking(max_age=max_age, max_hits=max_hits, motion_profiles=motion_profiles,
+                                          detector=SyntheticDetector(scene['det_boxes'],
+                                                                     det_classes=scene['det_classes']))
+        match = vdt.match_detections_to_trackers
+        cost = {'time': 0.0, 'pairs': 0}
+
+        # Time every call and count the tracker/detection pairs that can be matched (of the same class only if the
+        # tracking is class-aware)
+        def timed_match(trackers, detections, **kwargs):
+            start = time.perf_counter()
+            result = match(trackers, detections, **kwargs)
+            cost['time'] += time.perf_counter() - start
+
+            trk_classes, det_classes = kwargs.get('trk_classes'), kwargs.get('det_classes')
+            if trk_classes is None:
+                cost['pairs'] += len(trackers) * len(detections)
+            else:
+                cost['pairs'] += sum(int((trk_classes == c).sum()) * int((det_classes == c).sum())
+                                     for c in np.union1d(trk_classes, det_classes))
+            return result
+
+        vdt.match_detections_to_trackers = timed_match
+        hyp_ids, hyp_boxes = [], []
+
+        for _ in range(n_frames):
+            good_ids, good_boxes = vdt.track(vdt.detector.get_detections())
+            hyp_ids.append(good_ids)
+            hyp_boxes.append(good_boxes)
+
+        result = evaluate_tracks(scene['gt_ids'], scene['gt_boxes'], hyp_ids, hyp_boxes)
+        result.update({'objects': n_objects, 'class_aware': motion_profiles is not None,
+                       'match_ms': 1000.0 * cost['time'] / n_frames, 'pairs': cost['pairs'] / float(n_frames)})
+        results.append(result)
+
+    return results
+
+
+# Method: Used to compare the association strategies on a scene where partly occluded vehicles give weak detections
+def run_association_benchmark(n_objects, n_frames=100, weak_rate=0.7, min_conf=0.6, max_age=4, max_hits=3, seed=0):
+    """
+    :param n_objects: Number of vehicles in the scene
+    :param n_frames: Number of frames
+    :param weak_rate: Probability that a hidden vehicle is still detected in a frame, with a low confidence
+    :param min_conf: Minimum acceptable confidence level (weak detections are below it)
+    :param max_age: No. of consecutive unmatched detection before a track is deleted
+    :param max_hits: No. of consecutive matches needed to establish a track
+    :param seed: Random seed
+    :return: List with the accuracy, matching time and frame time for each association strategy
+    """
+    scene = generate_scene(n_objects, n_frames=n_frames, weak_rate=weak_rate, seed=seed)
+    results = []
+
+    for association in ('hungarian', 'greedy', 'two_stage'):
+        detector = SyntheticDetector(scene['det_boxes'], det_scores=scene['det_scores'], min_conf=min_conf)
+        vdt = VehicleDetectionAndTracking(max_age=max_age, max_hits=max_hits, association=association,
+                                          detector=detector)
+        match = vdt.match_detections_to_trackers
+        cost = {'match': 0.0, 'frame': 0.0}
+
+        # Time every call (two per frame for the two-stage association)
+        def timed_match(trackers, detections, **kwargs):
+            start = time.perf_counter()
+            result = match(trackers, detections, **kwargs)
+            cost['match'] += time.perf_counter() - start
+            return result
+
+        vdt.match_detections_to_trackers = timed_match
+        hyp_ids, hyp_boxes = [], []
+
+        for _ in range(n_frames):
+            detections = vdt.detector.get_detections(low_conf=vdt.low_conf)
+            start = time.perf_counter()
+            good_ids, good_boxes = vdt.track(detections)
+            cost['frame'] += time.perf_counter() - start
+            hyp_ids.append(good_ids)
+            hyp_boxes.append(good_boxes)
+
+        result = evaluate_tracks(scene['gt_ids'], scene['gt_boxes'], hyp_ids, hyp_boxes)
+        result.update({'objects': n_objects, 'association': association,
+                       'match_ms': 1000.0 * cost['match'] / n_frames, 'track_ms': 1000.0 * cost['frame'] / n_frames})
+        results.append(result)
+
+    return results
+
+
+# Method: Used to print the benchmark results as a table
+def print_results(results):
+    """
+    :param results: List of results from 'run_benchmark'
+    """
+    print('{:>8} {:>7} {:>7} {:>6} {:>9} {:>21} {:>21} {:>9}'.format('objects', 'MOTA', 'IDF1', 'IDSW', 'fps',
+                                                                     'match p50/p95/p99 ms', 'frame p50/p95/p99 ms',
+                                                                     'peak MB'))
+
+    for r in results:
+        print('{:>8} {:>7.3f} {:>7.3f} {:>6} {:>9.1f} {:>21} {:>21} {:>9.2f}'.format(
+            r['objects'], r['mota'], r['idf1'], r['id_switches'], r['fps'],
+            '{:.2f}/{:.2f}/{:.2f}'.format(r['match_p50_ms'], r['match_p95_ms'], r['match_p99_ms']),
+            '{:.2f}/{:.2f}/{:.2f}'.format(r['frame_p50_ms'], r['frame_p95_ms'], r['frame_p99_ms']),
+            r['peak_memory_mb']))
+
+
+if __name__ == '__main__':
+    print_results([run_benchmark(n_objects) for n_objects in (10, 100, 1000)])
+
+    # A 50 ms detector cannot keep up with 30 fps on its own
+    for r in run_scheduler_benchmark(20):
+        print('[INFO]: scheduler {:<5} MOTA {:.3f} IDF1 {:.3f} detection rate {:.2f} {:.1f} fps'.format(
+            str(r['scheduler']), r['mota'], r['idf1'], r['detection_rate'], r['fps']))
+
+    # Mixed scenes of cars, trucks and pedestrians, getting denser
+    print('{:>8} {:>12} {:>7} {:>7} {:>6} {:>9} {:>10}'.format('objects', 'class-aware', 'MOTA', 'IDF1', 'IDSW',
+                                                                'match ms', 'pairs'))
+    for n_objects in (50, 200, 800):
+        for r in run_class_benchmark(n_objects):
+            print('{:>8} {:>12} {:>7.3f} {:>7.3f} {:>6} {:>9.2f} {:>10.0f}'.format(
+                r['objects'], str(r['class_aware']), r['mota'], r['idf1'], r['id_switches'], r['match_ms'],
+                r['pairs']))
+
+    # Partly occluded vehicles give weak detections, below the confidence level
+    print('{:>8} {:>12} {:>7} {:>7} {:>6} {:>7} {:>9} {:>9}'.format('objects', 'association', 'MOTA', 'IDF1', 'IDSW',
+                                                                    'misses', 'match ms', 'track ms'))
+    for n_objects in (20, 200, 1000):
+        for r in run_association_benchmark(n_objects):
+            print('{:>8} {:>12} {:>7.3f} {:>7.3f} {:>6} {:>7} {:>9.2f} {:>9.2f}'.format(
+                r['objects'], r['association'], r['mota'], r['idf1'], r['id_switches'], r['misses'], r['match_ms'],
+                r['track_ms']))
@@ -1,8 +1,16 @@
 import cv2
-import numpy as np
 from tqdm import tqdm
 
-from VehicleDetectionAndTrackingProject import VehicleDetectionAndTrackingProject
+from MultiCameraDetectionAndTracking import MultiCameraDetectionAndTracking
+from utilities.FrameBuffer import FrameBuffer
+from utilities.StreamingRunner import StreamingRunner, read_video_frames
+from utilities.VideoConversion import VideoSink
+
+# Number of frames per camera passed to the detector in a single call (1 processes the videos frame by frame)
+batch_size = 8
+
+# Maximum number of frame pairs waiting between two stages
+queue_size = 4
 
 # Set up video capture
 left_video = cv2.VideoCapture('videos/front_left_1.mp4')
@@ -11,33 +19,55 @@ right_video = cv2.VideoCapture('videos/front_right_1.mp4')
 # Get information about the videos
 n_frames = min(int(left_video.get(cv2.CAP_PROP_FRAME_COUNT)), int(right_video.get(cv2.CAP_PROP_FRAME_COUNT)))
 fps = int(left_video.get(cv2.CAP_PROP_FPS))
+frame_size = (int(left_video.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(left_video.get(cv2.CAP_PROP_FRAME_WIDTH)))
+
+# Frames are decoded into preallocated buffers and annotated in place, then each camera is resized straight into its
+# half of a preallocated output canvas
+frame_buffer = FrameBuffer(frame_size, n_cameras=2, scale=0.5)
+
+# Write annotated frames straight into a video ('frames' dumps a PNG per frame into the output directory instead)
+sink = VideoSink('output/front_both_1_out.mp4', fps=fps, codec='mp4v', backend='opencv')
+
+# Create instances for vehicle detection (both cameras share one detector)
+vdt = MultiCameraDetectionAndTracking(cameras=[{'left': True}, {'left': False}], max_batch_size=2 * batch_size)
 
-# Create instances for vehicle detection
-left_vdt = VehicleDetectionAndTrackingProject(left=True)
-right_vdt = VehicleDetectionAndTrackingProject(left=False)
+# Run dummy inferences at the video size before the first frame and report the start up time
+vdt.detector.warmup(input_size=frame_size)
+print(vdt.detector.startup_report())
 
-for n in tqdm(range(n_frames)):
-    # Grab the frames from their respective video streams
-    ok, left_in = left_video.read()
-    _, right_in = right_video.read()
 
-    if ok:
-        # Process images
-        left_out = left_vdt.pipeline(left_in)
-        right_out = right_vdt.pipeline(right_in)
+# Method: Used to detect vehicles in a micro-batch of frame pairs with one detector call and update the trackers in
+# frame order
+def process(frame_sets):
+    outputs = []
 
+    for left_out, right_out in vdt.pipeline_batch(frame_sets):
         # Get warnings
-        left_warning = left_vdt.warning
-        right_warning = right_vdt.warning
+        left_warning, right_warning = vdt.warnings
+
+        outputs.append((left_out, right_out, (not left_warning) and (not right_warning)))
+
+    return outputs
+
+
+# Method: Used to compose a processed frame pair into the output canvas, save it and hand the buffers back for decoding
+def write(n, out):
+    left_out, right_out, safe = out
+    frame_buffer.compose(0, left_out)
+    canvas = frame_buffer.compose(1, right_out)
+
+    # Add 'SAFE' to image when no warnings were issued
+    if safe:
+        dims = canvas.shape[:2]
+        cv2.putText(canvas, 'SAFE', (int(dims[1]/2)-40, 25), cv2.FONT_HERSHEY_DUPLEX, 1.0, (0, 255, 0), 2, cv2.LINE_AA)
 
-        # Horizontally concatenate images and resize
-        out = np.hstack([left_out, right_out])
-        out = cv2.resize(out, (0, 0), fx=0.5, fy=0.5)
+    sink.write(canvas)
+    frame_buffer.release([left_out, right_out])
 
-        # Add 'SAFE' to image when no warnings were issued
-        if (not left_warning) and (not right_warning):
-            dims = out.shape[:2]
-            cv2.putText(out, 'SAFE', (int(dims[1]/2)-40, 25), cv2.FONT_HERSHEY_DUPLEX, 1.0, (0, 255, 0), 2, cv2.LINE_AA)
 
-        # Save frame
-        cv2.imwrite('output/front_both_1_out/frame{}.png'.format(n+1), out)
+# Decode, detect and track, and write frames on separate threads
+runner = StreamingRunner(tqdm(read_video_frames([left_video, right_video], n_frames, frame_buffer), total=n_frames),
+                         process, write, batch_size=batch_size, queue_size=queue_size)
+with sink:
+    runner.run()
+print(runner.summary())
@@ -1,151 +1,340 @@
 import sys
 import numpy as np
-from collections import deque
-from moviepy.editor import VideoFileClip
-from sklearn.utils.linear_assignment_ import linear_assignment
 
+from utilities import Association
+from utilities.DetectionCache import DetectionCache, CachedVehicleDetector
 from utilities.VehicleDetector import VehicleDetector
-from utilities.VehicleTracker import VehicleTracker
+from utilities.TrackerBank import TrackerBank, track_confirmed
+from utilities.TrackIdAllocator import TrackIdAllocator
+from utilities.TrackUpdate import TrackUpdate
+from utilities.SpatialGrid import SpatialGrid
 from utilities.BoundingBox import *
 
+# Motion profile for each class of the COCO label map: factor by which the process noise is scaled and measurement
+# noise variance, plus optional 'min_hits' and 'max_age' replacing those of the tracker for the class
+coco_motion_profiles = {
+    1: {'q': 0.25, 'r': 4.0},    # person (slow, with small boxes)
+    2: {'q': 0.5, 'r': 4.0},     # bicycle
+    3: {'q': 1.0, 'r': 6.25},    # car
+    4: {'q': 2.0, 'r': 6.25},    # motorcycle
+    5: {'q': 0.5, 'r': 12.0},    # bus (large boxes, so noisier edges)
+    6: {'q': 0.25, 'r': 12.0},   # train
+    7: {'q': 0.5, 'r': 12.0},    # truck
+}
+
+# Matcher used by each association strategy: optimal assignment (Hungarian algorithm), greedy from the highest IOU
+# down, or optimal assignment of the confident detections first and then of the weak detections to the left over tracks
+association_matchers = {
+    'hungarian': Association.match_detections_to_trackers,
+    'greedy': Association.match_detections_to_trackers_greedy,
+    'two_stage': Association.match_detections_to_trackers,
+}
+
 
 class VehicleDetectionAndTracking:
-    def __init__(self, min_conf=0.6, max_age=2, max_hits=8):
+    def __init__(self, min_conf=0.6, max_age=2, max_hits=8, min_iou=0.25, detector=None, profiler=None,
+                 recycle_ids=False, scheduler=None, writer=None, render=True, motion_profiles=None,
+                 association='hungarian', low_conf=0.1, low_min_iou=0.5, reid_window=10):
+        if association not in association_matchers:
+            raise ValueError('Unknown association strategy {}, expected one of {}'.format(
+                association, sorted(association_matchers)))
+
         # Initialize constants
-        self.max_age = max_age                   # no. of consecutive unmatched detection before a track is deleted
+        self.max_age = max_age                   # no. of consecutive unmatched detection before a track is lost
         self.min_hits = max_hits                 # no. of consecutive matches needed to establish a track
-        self.tracker_list = []
-        self.track_id_list = deque(['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K'])
+        self.reid_window = reid_window           # no. of further unmatched detections before a lost track is deleted
+        self.min_iou = min_iou                   # min. IOU for a detection to be matched to a track
+        self.low_min_iou = low_min_iou           # min. IOU for a weak detection to be matched to a track (two-stage)
+        self.low_conf = low_conf if association == 'two_stage' else None  # min. confidence of a weak detection
+        self.association = association           # association strategy, see 'association_matchers'
+        self.matcher = association_matchers[association]
+        self.tracker_bank = TrackerBank()
+        self.spatial_grid = SpatialGrid()        # finds the overlapping tracker/detection pairs in crowded scenes
+        self.spatial_grids = {}                  # one grid for each stage of the two-stage association
+        self.track_ids = TrackIdAllocator(recycle=recycle_ids)  # unbounded integer IDs for new tracks
         self.count = 0
-
-        # Set up 'Vehicle Detector'
-        self.detector = VehicleDetector(kitti=False, min_conf=min_conf)
-
-    # Method: Used to match detections to trackers
-    @staticmethod
-    def match_detections_to_trackers(trackers, detections, min_iou=0.25):
-        # Initialize 'iou_matrix'
-        iou_matrix = np.zeros((len(trackers), len(detections)), dtype=np.float32)
-
-        # Populate 'iou_matrix'
-        for t, tracker in enumerate(trackers):
-            for d, detection in enumerate(detections):
-                iou_matrix[t, d] = box_iou_ratio(tracker, detection)
-
-        # Produce matches by using the Hungarian algorithm to maximize the sum of IOU
-        matched_index = linear_assignment(-iou_matrix)
-
-        # Populate 'unmatched_trackers'
-        unmatched_trackers = []
-        for t in np.arange(len(trackers)):
-            if t not in matched_index[:, 0]:
-                unmatched_trackers.append(t)
-
-        # Populate 'unmatched_detections'
-        unmatched_detections = []
-        for d in np.arange(len(detections)):
-            if d not in matched_index[:, 1]:
-                unmatched_detections.append(d)
-
-        # Populate 'matches'
-        matches = []
-        for m in matched_index:
-            # Create tracker if IOU is greater than 'min_iou'
-            if iou_matrix[m[0], m[1]] > min_iou:
-                matches.append(m.reshape(1, 2))
-            else:
-                unmatched_trackers.append(m[0])
-                unmatched_detections.append(m[1])
-
-        if matches:
-            # Concatenate arrays on the same axis
-            matches = np.concatenate(matches, axis=0)
-        else:
-            matches = np.empty((0, 2), dtype=int)
-
-        # Return matches, unmatched detection and unmatched trackers
-        return matches, np.array(unmatched_detections), np.array(unmatched_trackers)
-
-    # Method: Used as a 'pipeline' function for detection and tracking
-    def pipeline(self, image):
-        # Get bounding boxes for located vehicles
-        det_boxes = self.detector.get_bounding_box_locations(image)
+        self.frame_index = -1                    # index of the last frame
+        self.good_ids = []                       # IDs of the established tracks in the last frame
+        self.good_boxes = np.zeros((0, 4))
+        self.good_velocities = np.zeros((0, 4))
+        self.good_classes = []
+        self.detected = False                    # True if the detector ran on the last frame
+        self.warning = False                     # True if an established track was in a warning zone in the last frame
+        self.profiler = profiler                 # records the time spent in each stage (disabled if None)
+        self.scheduler = scheduler               # decides on which frames the detector runs (every frame if None)
+        self.writer = writer                     # TrackWriter for a record of every established track (None to skip)
+        self.render = render                     # if False, 'pipeline' leaves the image untouched
+        self.set_motion_profiles(motion_profiles)
+
+        # Set up 'Vehicle Detector' (or share one that is already loaded)
+        self.detector = detector if detector is not None else VehicleDetector(kitti=False, min_conf=min_conf)
+
+        # Share the profiler with the detector so that inference shows up in the same trace
+        if profiler is not None and getattr(self.detector, 'profiler', False) is None:
+            self.detector.profiler = profiler
+
+    # Method: Used to set the motion profile of each class (tracks are only matched to detections of their own class)
+    def set_motion_profiles(self, motion_profiles=None):
+        """
+        :param motion_profiles: Dictionary with the motion profile of each class ID, e.g. 'coco_motion_profiles'
+            (classes are ignored and every track has the same motion model if None)
+        """
+        self.motion_profiles = motion_profiles
+
+        if motion_profiles is None:
+            self.profile_table = None
+            return
+
+        # Lookup table with a row for each class ID [q, r, min_hits, max_age]. Classes without a profile (and unknown
+        # classes, -1, which index the last row) use the defaults of the tracker
+        default = {'q': 1.0, 'r': self.tracker_bank.r, 'min_hits': self.min_hits, 'max_age': self.max_age}
+        self.profile_table = np.tile([default['q'], default['r'], default['min_hits'], default['max_age']],
+                                     (max(motion_profiles) + 2, 1)).astype(float)
+        for class_id, profile in motion_profiles.items():
+            profile = dict(default, **profile)
+            self.profile_table[class_id] = [profile['q'], profile['r'], profile['min_hits'], profile['max_age']]
+
+    # Method: Used to get the no. of matches needed to establish each track and the no. of misses before it is deleted
+    def track_limits(self):
+        """
+        :return: 'min_hits' and 'max_age' (arrays with a value for each track if the motion profiles are per class)
+        """
+        if self.profile_table is None:
+            return self.min_hits, self.max_age
+
+        profiles = self.profile_table[np.minimum(self.tracker_bank.classes, self.profile_table.shape[0] - 1)]
+
+        return profiles[:, 2], profiles[:, 3]
+
+    # Method: Used to match detections to trackers with the matcher of the association strategy
+    def match_detections_to_trackers(self, trackers, detections, min_iou=0.25, grid=None, trk_classes=None,
+                                     det_classes=None):
+        return self.matcher(trackers, detections, min_iou=min_iou, grid=grid, trk_classes=trk_classes,
+                            det_classes=det_classes)
+
+    # Method: Used to update the trackers with the detections for one frame
+    def track(self, det_boxes, det_classes=None):
+        """
+        :param det_boxes: Bounding boxes detected in the frame, or structured array of detections (detection_dtype)
+        :param det_classes: Class of each detected box (from the structured array, or unknown if None)
+        :return: IDs and bounding boxes (array of shape (N, 4)) of the established tracks
+        """
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.mark()
+
+        # Detections below the confidence level of their class are only in the structured array
+        confident = None
+        if getattr(det_boxes, 'dtype', None) is not None and det_boxes.dtype.names is not None:
+            confident = self.detector.is_confident(det_boxes)
+            det_boxes, det_classes = det_boxes['box'], det_boxes['class']
+
+        det_boxes = np.array(det_boxes, dtype=float).reshape(-1, 4)
+        if det_classes is None:
+            det_classes = np.full(det_boxes.shape[0], -1)
+        if confident is None:
+            confident = np.ones(det_boxes.shape[0], dtype=bool)
+
+        # Weak detections are only used by the two-stage association
+        if self.association != 'two_stage' and not confident.all():
+            det_boxes, det_classes = det_boxes[confident], np.asarray(det_classes)[confident]
 
         # Get list of tracker bounding boxes
-        trk_boxes = []
-        if self.tracker_list:
-            for tracker in self.tracker_list:
-                trk_boxes.append(tracker.box)
-
-        # Match detected vehicles to trackers
-        matched, unmatched_dets, unmatched_trks = self.match_detections_to_trackers(trk_boxes, det_boxes)
+        trk_boxes = self.tracker_bank.boxes
+
+        # Match detected vehicles to trackers (of the same class only, if the motion profiles are per class)
+        if self.association == 'two_stage':
+            matched, unmatched_dets, unmatched_trks = Association.match_detections_to_trackers_two_stage(
+                trk_boxes, det_boxes, confident, min_iou=self.min_iou, low_min_iou=self.low_min_iou,
+                matcher=self.match_detections_to_trackers,
+                trk_classes=self.tracker_bank.classes if self.profile_table is not None else None,
+                det_classes=det_classes, grids=self.spatial_grids)
+        elif self.profile_table is None:
+            matched, unmatched_dets, unmatched_trks = self.match_detections_to_trackers(trk_boxes, det_boxes,
+                                                                                        min_iou=self.min_iou,
+                                                                                        grid=self.spatial_grid)
+        else:
+            matched, unmatched_dets, unmatched_trks = Association.match_detections_to_trackers_by_class(
+                trk_boxes, self.tracker_bank.classes, det_boxes, det_classes, min_iou=self.min_iou,
+                matcher=self.match_detections_to_trackers, grid=self.spatial_grid)
+        if profiler is not None:
+            profiler.lap('match')
 
-        # Deal with matched detections
+        # Deal with matched detections (a match ends any run of misses)
         if len(matched) > 0:
-            for trk_idx, det_idx in matched:
-                z = det_boxes[det_idx]
-                z = np.expand_dims(z, axis=0).T
-                temp_trk = self.tracker_list[trk_idx]
-                temp_trk.predict_and_update(z)
-                xx = temp_trk.x_state.T[0].tolist()
-                xx = [xx[0], xx[2], xx[4], xx[6]]
-                trk_boxes[trk_idx] = xx
-                temp_trk.box = xx
-                temp_trk.num_hits += 1
-
-        # Deal with unmatched detections
-        if len(unmatched_dets) > 0:
-            for i in unmatched_dets:
-                z = det_boxes[i]
-                z = np.expand_dims(z, axis=0).T
-                temp_trk = VehicleTracker()  # Create a new tracker
-                x = np.array([[z[0], 0, z[1], 0, z[2], 0, z[3], 0]]).T
-                temp_trk.x_state = x
-                temp_trk.predict()
-                xx = temp_trk.x_state
-                xx = xx.T[0].tolist()
-                xx = [xx[0], xx[2], xx[4], xx[6]]
-                temp_trk.box = xx
-                temp_trk.id = self.track_id_list.popleft()  # assign an ID for the tracker
-                self.tracker_list.append(temp_trk)
-                trk_boxes.append(xx)
+            self.tracker_bank.predict_and_update(matched[:, 0], det_boxes[matched[:, 1]])
+            self.tracker_bank.num_hits[matched[:, 0]] += 1
+            self.tracker_bank.num_unmatched[matched[:, 0]] = 0
 
         # Deal with unmatched tracks
         if len(unmatched_trks) > 0:
-            for i in unmatched_trks:
-                temp_trk = self.tracker_list[i]
-                temp_trk.num_unmatched += 1
-                temp_trk.predict()
-                xx = temp_trk.x_state
-                xx = xx.T[0].tolist()
-                xx = [xx[0], xx[2], xx[4], xx[6]]
-                temp_trk.box = xx
-                trk_boxes[i] = xx
-
-        # Populate the list of trackers to be displayed on the image
-        good_tracker_list = []
-
-        for tracker in self.tracker_list:
-            if tracker.num_hits >= self.min_hits and tracker.num_unmatched <= self.max_age:
-                good_tracker_list.append(tracker)
-                tracker_bb = tracker.box
+            self.tracker_bank.num_unmatched[unmatched_trks] += 1
+            self.tracker_bank.predict(unmatched_trks)
 
-                # Draw bounding box on the image
-                image = draw_box_label(image, tracker_bb)
-
-                self.count += 1
+        # Deal with unmatched detections
+        if len(unmatched_dets) > 0:
+            new_ids = self.track_ids.allocate(len(unmatched_dets))  # assign an ID for each tracker
+            new_classes = np.asarray(det_classes)[unmatched_dets]
 
-        # Find list of trackers to be deleted
-        deleted_trackers = filter(lambda x: x.num_unmatched > self.max_age, self.tracker_list)
+            # Create new trackers (with the motion profile of their class)
+            if self.profile_table is None:
+                new_trks = self.tracker_bank.add(det_boxes[unmatched_dets], new_ids, new_classes)
+            else:
+                profiles = self.profile_table[np.minimum(new_classes, self.profile_table.shape[0] - 1)]
+                new_trks = self.tracker_bank.add(det_boxes[unmatched_dets], new_ids, new_classes,
+                                                 q_scale=profiles[:, 0], r=profiles[:, 1])
+            self.tracker_bank.predict(new_trks)
+
+        if profiler is not None:
+            profiler.lap('kalman')
+
+        # Confirm, lose and find again trackers, then find the established (confirmed) trackers
+        min_hits, max_age = self.track_limits()
+        deleted_trackers = self.tracker_bank.update_states(min_hits, max_age, self.reid_window)
+        good_ids, good_boxes = self.established_tracks()
+
+        # Remove trackers to be deleted and release their IDs
+        self.track_ids.release(self.tracker_bank.remove(deleted_trackers))
+
+        if profiler is not None:
+            profiler.lap('prune')
+            profiler.end_frame(len(self.tracker_bank), len(unmatched_dets), int(deleted_trackers.sum()))
+
+        return good_ids, good_boxes
+
+    # Method: Used to get the established tracks
+    def established_tracks(self):
+        """
+        :return: IDs and bounding boxes (array of shape (N, 4)) of the established tracks
+        """
+        good_trackers = self.tracker_bank.states == track_confirmed
+        self.good_ids = self.tracker_bank.ids[good_trackers].tolist()
+        self.good_boxes = self.tracker_bank.boxes[good_trackers]
+        self.good_velocities = self.tracker_bank.x[good_trackers][:, 1::2]
+        self.good_classes = self.tracker_bank.classes[good_trackers].tolist()
+
+        return self.good_ids, self.good_boxes
+
+    # Method: Used to move every track on by its prediction on a frame where the detector does not run
+    def coast(self):
+        """
+        :return: IDs and bounding boxes (array of shape (N, 4)) of the established tracks
+        """
+        if self.profiler is not None:
+            self.profiler.mark()
+
+        # Hits and misses are left untouched, since there are no detections to compare against
+        self.tracker_bank.predict()
+        good_ids, good_boxes = self.established_tracks()
+
+        if self.profiler is not None:
+            self.profiler.lap('kalman')
+            self.profiler.end_frame(len(self.tracker_bank), 0, 0)
+
+        return good_ids, good_boxes
+
+    # Method: Used to detect vehicles (unless the scheduler skips the frame) and update the trackers for one frame
+    def detect_and_track(self, image, det_boxes=None):
+        """
+        :param image: Image
+        :param det_boxes: Bounding boxes already detected in the image (the scheduler is not asked if given)
+        :return: IDs and bounding boxes (array of shape (N, 4)) of the established tracks
+        """
+        self.frame_index += 1
+        detect = det_boxes is not None or self.scheduler is None or self.scheduler.should_detect(self.tracker_bank)
+        self.detected = detect
+
+        if detect:
+            # Get bounding boxes for located vehicles
+            if det_boxes is None and (self.profile_table is not None or self.association == 'two_stage'):
+                det_boxes = self.detector.get_detections(image, low_conf=self.low_conf)
+            elif det_boxes is None:
+                det_boxes = self.detector.get_bounding_box_locations(image)
+
+            # Update the trackers
+            good_ids, good_boxes = self.track(det_boxes)
+        else:
+            self.detector.skip_frame()
+            good_ids, good_boxes = self.coast()
+
+        if self.scheduler is not None:
+            self.scheduler.update(detect, self.tracker_bank)
+
+        return good_ids, good_boxes
+
+    # Method: Used to find the warning zone each box is in
+    def warning_zones(self, boxes, dims):
+        """
+        :param boxes: Integer array of shape (N, 4) with the boxes [ymin, xmin, ymax, xmax] in pixels
+        :param dims: Size (height, width) of the image
+        :return: List with the warning zone of each box, None if the box is not in a warning zone (there are no warning
+            zones here)
+        """
+        return [None] * len(boxes)
+
+    # Method: Used to detect vehicles and update the trackers for one frame without drawing anything
+    def step(self, frame, det_boxes=None):
+        """
+        :param frame: Image (only read, and only when the detector runs on it)
+        :param det_boxes: Bounding boxes already detected in the frame (e.g. by a batched detector call)
+        :return: TrackUpdate with the established tracks and warnings for the frame
+        """
+        dims = frame.shape[:2]
+
+        # Detect vehicles and update the trackers
+        good_ids, good_boxes = self.detect_and_track(frame, det_boxes)
+
+        # True if vehicle was detected in a 'danger zone' (in pixel coordinates, like the boxes that are drawn)
+        zones = self.warning_zones(good_boxes.astype(int), dims)
+        self.warning = any(zone is not None for zone in zones)
+
+        self.write_tracks(zones)
+
+        return TrackUpdate(self.frame_index, self.detected, good_ids, self.good_classes, good_boxes,
+                           self.good_velocities, zones, self.warning)
+
+    # Method: Used to draw the established tracks of a frame on an image
+    def draw(self, image, update):
+        """
+        :param image: Image (the frame passed to 'step', or a copy of it)
+        :param update: TrackUpdate returned by 'step' for the frame
+        :return: Image with the tracked vehicles drawn on it
+        """
+        # Pixel coordinates are only needed for drawing
+        for tracker_bb in update.boxes.astype(int).tolist():
+            # Draw bounding box on the image
+            image = draw_box_label(image, tracker_bb)
 
-        for tracker in deleted_trackers:
-            self.track_id_list.append(tracker.id)
+        return image
 
-        # Update list of active trackers
-        self.tracker_list = [x for x in self.tracker_list if x.num_unmatched <= self.max_age]
+    # Method: Used as a 'pipeline' function for detection and tracking
+    def pipeline(self, image, det_boxes=None):
+        """
+        :param image: Image
+        :param det_boxes: Bounding boxes already detected in the image (e.g. by a batched detector call)
+        :return: Image with the tracked vehicles drawn on it (untouched if 'render' is False)
+        """
+        update = self.step(image, det_boxes)
+        self.count += len(update.ids)
+
+        if self.render:
+            image = self.draw(image, update)
+
+        # Drawing belongs to the frame that 'track' has just finished
+        if self.profiler is not None:
+            self.profiler.lap('draw', frame=self.profiler.frame - 1)
 
         return image
 
+    # Method: Used to send a record of every established track in the last frame to the writer
+    def write_tracks(self, zones=None):
+        """
+        :param zones: List with the warning zone each established track is in (None if it is not in a warning zone)
+        """
+        if self.writer is not None:
+            self.writer.write_tracks(self.frame_index, self.good_ids, self.good_boxes, self.good_velocities, zones,
+                                     classes=self.good_classes)
+
     # Method: Used to end VideoFileClip processes
     @staticmethod
     def close_clip(clip):
@@ -162,11 +351,24 @@ class VehicleDetectionAndTracking:
             sys.exc_clear()
 
 
-vdt = VehicleDetectionAndTracking(min_conf=0.8, max_age=2, max_hits=8)
-output = 'video1_short_out_80.mp4'
-input_vid = VideoFileClip('videos/video1_short.mp4')
-output_vid = input_vid.fl_image(vdt.pipeline)
-output_vid.write_videofile(output, threads=4, audio=False)
-vdt.close_clip(output_vid)
-print(vdt.count)
+if __name__ == '__main__':
+    from moviepy.editor import VideoFileClip
+
+    # Detections are cached on disk, so re-runs with other tracker settings (or 'min_conf') skip inference
+    detection_cache = DetectionCache('videos/video1_short.mp4')
+    vdt = VehicleDetectionAndTracking(max_age=2, max_hits=8,
+                                      detector=CachedVehicleDetector(detection_cache, min_conf=0.8))
+    output = 'video1_short_out_80.mp4'
+    input_vid = VideoFileClip('videos/video1_short.mp4')
+
+    # Method: Used to process the frame at time t. moviepy also renders the first frame once while it builds the
+    # clip, so the cached detector is moved to the frame at time t rather than counting calls
+    def process_frame(get_frame, t):
+        vdt.detector.seek(int(round(t * input_vid.fps)))
+        return vdt.pipeline(get_frame(t))
 
+    output_vid = input_vid.fl(process_frame)
+    output_vid.write_videofile(output, threads=4, audio=False)
+    vdt.close_clip(output_vid)
+    detection_cache.flush()
+    print(vdt.count)
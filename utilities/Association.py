@@ -0,0 +1,264 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from utilities.BoundingBox import box_iou_matrix, box_iou_pairs
+from utilities.SpatialGrid import SpatialGrid
+
+# Number of tracker/detection pairs from which the overlapping pairs are found with a spatial grid instead of a full
+# IOU matrix
+grid_min_pairs = 20000
+
+
+# Method: Used to solve the assignment problem for each connected component of the gated cost graph
+def solve_gated_assignment(iou_matrix, gate):
+    """
+    :param iou_matrix: Array of shape (N, M) with the IOU between every tracker and detection
+    :param gate: Boolean array of shape (N, M), True for the pairs that are allowed to be matched
+    :return: Array of shape (K, 2) with the [tracker, detection] index pairs
+    """
+    trk_idx, det_idx = np.nonzero(gate)
+
+    return solve_sparse_assignment(trk_idx, det_idx, iou_matrix[trk_idx, det_idx], *gate.shape)
+
+
+# Method: Used to solve the assignment problem for each connected component of a sparse cost graph
+def solve_sparse_assignment(trk_idx, det_idx, iou, n_trk, n_det):
+    """
+    :param trk_idx: Array of shape (K,) with the tracker of each pair that is allowed to be matched
+    :param det_idx: Array of shape (K,) with the detection of each pair that is allowed to be matched
+    :param iou: Array of shape (K,) with the IOU of each pair
+    :param n_trk: Number of trackers
+    :param n_det: Number of detections
+    :return: Array of shape (L, 2) with the [tracker, detection] index pairs
+    """
+    if len(trk_idx) == 0:
+        return np.empty((0, 2), dtype=int)
+
+    # Split the bipartite graph into independent connected components
+    graph = coo_matrix((np.ones(len(trk_idx)), (trk_idx, n_trk + det_idx)), shape=(n_trk + n_det, n_trk + n_det))
+    n_components, labels = connected_components(graph, directed=False)
+    trk_labels, det_labels = labels[:n_trk], labels[n_trk:]
+    trk_count = np.bincount(trk_labels, minlength=n_components)
+    det_count = np.bincount(det_labels, minlength=n_components)
+
+    # Components with a single tracker and a single detection are matched directly
+    single = (trk_count == 1) & (det_count == 1)
+    det_of_component = np.full(n_components, -1)
+    det_of_component[det_labels] = np.arange(n_det)
+    single_trks = np.flatnonzero(single[trk_labels])
+    matches = [np.stack([single_trks, det_of_component[trk_labels[single_trks]]], axis=1)]
+
+    # Group tracker indices, detection indices and pairs by component, and number the trackers and detections within
+    # their component
+    trk_order = np.argsort(trk_labels, kind='stable')
+    det_order = np.argsort(det_labels, kind='stable')
+    pair_order = np.argsort(trk_labels[trk_idx], kind='stable')
+    trk_bounds = np.searchsorted(trk_labels[trk_order], np.arange(n_components + 1))
+    det_bounds = np.searchsorted(det_labels[det_order], np.arange(n_components + 1))
+    pair_bounds = np.searchsorted(trk_labels[trk_idx[pair_order]], np.arange(n_components + 1))
+    trk_local = np.empty(n_trk, dtype=int)
+    det_local = np.empty(n_det, dtype=int)
+    trk_local[trk_order] = np.arange(n_trk) - trk_bounds[trk_labels[trk_order]]
+    det_local[det_order] = np.arange(n_det) - det_bounds[det_labels[det_order]]
+
+    # Produce matches by using the Hungarian algorithm to maximize the sum of IOU within each remaining component
+    for c in np.flatnonzero((trk_count > 0) & (det_count > 0) & ~single):
+        t = trk_order[trk_bounds[c]:trk_bounds[c + 1]]
+        d = det_order[det_bounds[c]:det_bounds[c + 1]]
+        p = pair_order[pair_bounds[c]:pair_bounds[c + 1]]
+        cost = np.zeros((len(t), len(d)))
+        cost[trk_local[trk_idx[p]], det_local[det_idx[p]]] = -iou[p]
+        rows, cols = linear_sum_assignment(cost)
+        matches.append(np.stack([t[rows], d[cols]], axis=1))
+
+    return np.concatenate(matches, axis=0)
+
+
+# Method: Used to find the tracker/detection pairs that overlap by more than a minimum IOU
+def overlapping_pairs(trackers, detections, min_iou=0.0, grid=None, trk_classes=None, det_classes=None):
+    """
+    :param trackers: Array of shape (N, 4) with the tracker boxes
+    :param detections: Array of shape (M, 4) with the detection boxes
+    :param min_iou: Pairs are kept if their IOU is greater than 'min_iou'
+    :param grid: SpatialGrid used to find the overlapping pairs in large scenes (a temporary one is built if None)
+    :param trk_classes: Array of shape (N,) with the class of each tracker (classes are ignored if None)
+    :param det_classes: Array of shape (M,) with the class of each detection (pairs of different classes never match)
+    :return: Arrays with the tracker, detection and IOU of each kept pair
+    """
+    if trackers.shape[0] * detections.shape[0] < grid_min_pairs:
+        # Compute the IOU between every tracker and detection
+        iou_matrix = box_iou_matrix(trackers, detections)
+        trk_idx, det_idx = np.nonzero(iou_matrix > min_iou)
+        iou = iou_matrix[trk_idx, det_idx]
+    else:
+        # Only compute the IOU for the pairs that share a grid cell
+        if grid is None:
+            grid = SpatialGrid()
+        grid.update(trackers)
+        trk_idx, det_idx = grid.query(detections)
+        iou = box_iou_pairs(trackers, detections, trk_idx, det_idx)
+        keep = iou > min_iou
+        trk_idx, det_idx, iou = trk_idx[keep], det_idx[keep], iou[keep]
+
+    # Gate out the pairs of different classes
+    if trk_classes is not None:
+        keep = np.asarray(trk_classes)[trk_idx] == np.asarray(det_classes)[det_idx]
+        trk_idx, det_idx, iou = trk_idx[keep], det_idx[keep], iou[keep]
+
+    return trk_idx, det_idx, iou
+
+
+# Method: Used to find the detections and trackers that are not part of any match
+def unmatched_indices(matches, n_trk, n_det):
+    """
+    :param matches: Array of [tracker, detection] index pairs
+    :param n_trk: Number of trackers
+    :param n_det: Number of detections
+    :return: Unmatched detections and unmatched trackers
+    """
+    trk_matched = np.zeros(n_trk, dtype=bool)
+    det_matched = np.zeros(n_det, dtype=bool)
+    trk_matched[matches[:, 0]] = True
+    det_matched[matches[:, 1]] = True
+
+    return np.flatnonzero(~det_matched), np.flatnonzero(~trk_matched)
+
+
+# Method: Used to match detections to trackers
+def match_detections_to_trackers(trackers, detections, min_iou=0.25, grid=None, trk_classes=None, det_classes=None):
+    """
+    :param trackers: Array of shape (N, 4) with the tracker boxes
+    :param detections: Array of shape (M, 4) with the detection boxes
+    :param min_iou: Minimum IOU for a tracker and detection to be matched
+    :param grid: SpatialGrid used to find the overlapping pairs in large scenes (a temporary one is built if None)
+    :param trk_classes: Array of shape (N,) with the class of each tracker (classes are ignored if None)
+    :param det_classes: Array of shape (M,) with the class of each detection (pairs of different classes never match)
+    :return: Matches as an array of [tracker, detection] index pairs, unmatched detections and unmatched trackers
+    """
+    trackers = np.asarray(trackers, dtype=float).reshape(-1, 4)
+    detections = np.asarray(detections, dtype=float).reshape(-1, 4)
+    n_trk, n_det = trackers.shape[0], detections.shape[0]
+
+    # Gate out pairs that do not overlap, then solve each independent group of overlapping boxes
+    trk_idx, det_idx, iou = overlapping_pairs(trackers, detections, grid=grid, trk_classes=trk_classes,
+                                              det_classes=det_classes)
+    matched_index = solve_sparse_assignment(trk_idx, det_idx, iou, n_trk, n_det)
+
+    # Keep matches if IOU is greater than 'min_iou'
+    matches = matched_index[box_iou_pairs(trackers, detections, matched_index[:, 0], matched_index[:, 1]) > min_iou]
+
+    # Return matches, unmatched detection and unmatched trackers
+    return (matches,) + unmatched_indices(matches, n_trk, n_det)
+
+
+# Method: Used to match detections to trackers greedily, from the pair with the highest IOU down
+def match_detections_to_trackers_greedy(trackers, detections, min_iou=0.25, grid=None, trk_classes=None,
+                                        det_classes=None):
+    """
+    :param trackers: Array of shape (N, 4) with the tracker boxes
+    :param detections: Array of shape (M, 4) with the detection boxes
+    :param min_iou: Minimum IOU for a tracker and detection to be matched
+    :param grid: SpatialGrid used to find the overlapping pairs in large scenes (a temporary one is built if None)
+    :param trk_classes: Array of shape (N,) with the class of each tracker (classes are ignored if None)
+    :param det_classes: Array of shape (M,) with the class of each detection (pairs of different classes never match)
+    :return: Matches as an array of [tracker, detection] index pairs, unmatched detections and unmatched trackers
+    """
+    trackers = np.asarray(trackers, dtype=float).reshape(-1, 4)
+    detections = np.asarray(detections, dtype=float).reshape(-1, 4)
+    n_trk, n_det = trackers.shape[0], detections.shape[0]
+
+    # Only pairs that could be kept are visited, from the highest IOU down
+    trk_idx, det_idx, iou = overlapping_pairs(trackers, detections, min_iou=min_iou, grid=grid,
+                                              trk_classes=trk_classes, det_classes=det_classes)
+    order = np.argsort(-iou, kind='stable')
+    trk_idx, det_idx = trk_idx[order], det_idx[order]
+
+    trk_free = np.ones(n_trk, dtype=bool)
+    det_free = np.ones(n_det, dtype=bool)
+    matches = [np.empty((0, 2), dtype=int)]
+
+    while len(trk_idx) > 0:
+        # A pair that comes first for both its tracker and its detection would be taken by a sequential greedy pass
+        # before any other pair of either of them, so all such pairs are matched in one go
+        trk_first = np.unique(trk_idx, return_index=True)[1]
+        det_first = np.unique(det_idx, return_index=True)[1]
+        first = np.intersect1d(trk_first, det_first, assume_unique=True)
+        matches.append(np.stack([trk_idx[first], det_idx[first]], axis=1))
+
+        # Drop the remaining pairs of the matched trackers and detections
+        trk_free[trk_idx[first]] = False
+        det_free[det_idx[first]] = False
+        keep = trk_free[trk_idx] & det_free[det_idx]
+        trk_idx, det_idx = trk_idx[keep], det_idx[keep]
+
+    matches = np.concatenate(matches, axis=0)
+
+    return (matches,) + unmatched_indices(matches, n_trk, n_det)
+
+
+# Method: Used to match detections to trackers of the same class only
+def match_detections_to_trackers_by_class(trackers, trk_classes, detections, det_classes, min_iou=0.25,
+                                          matcher=match_detections_to_trackers, grid=None):
+    """
+    :param trackers: Array of shape (N, 4) with the tracker boxes
+    :param trk_classes: Array of shape (N,) with the class of each tracker
+    :param detections: Array of shape (M, 4) with the detection boxes
+    :param det_classes: Array of shape (M,) with the class of each detection
+    :param min_iou: Minimum IOU for a tracker and detection to be matched
+    :param matcher: Function matching the detections to the trackers
+    :param grid: SpatialGrid used to find the overlapping pairs in large scenes (a temporary one is built if None)
+    :return: Matches as an array of [tracker, detection] index pairs, unmatched detections and unmatched trackers
+    """
+    # Pairs of different classes are gated out of a single assignment problem, which then splits into independent
+    # groups of the same class. This gives the same matches as an assignment for each class, but finds the candidate
+    # pairs with one grid and solves them in one go
+    return matcher(trackers, detections, min_iou=min_iou, grid=grid, trk_classes=np.asarray(trk_classes),
+                   det_classes=np.asarray(det_classes))
+
+
+# Method: Used to match confident detections to trackers first, then the left over trackers to the weak detections
+def match_detections_to_trackers_two_stage(trackers, detections, confident, min_iou=0.25, low_min_iou=0.5,
+                                           matcher=match_detections_to_trackers, trk_classes=None, det_classes=None,
+                                           grids=None):
+    """
+    :param trackers: Array of shape (N, 4) with the tracker boxes
+    :param detections: Array of shape (M, 4) with the detection boxes
+    :param confident: Boolean array of shape (M,), True for the detections above the confidence threshold
+    :param min_iou: Minimum IOU for a tracker and a confident detection to be matched
+    :param low_min_iou: Minimum IOU for a tracker and a weak detection to be matched (stricter, since weak detections
+        are more often false positives)
+    :param matcher: Function matching the detections to the trackers in each stage
+    :param trk_classes: Array of shape (N,) with the class of each tracker (classes are ignored if None)
+    :param det_classes: Array of shape (M,) with the class of each detection
+    :param grids: Dictionary with the SpatialGrid of each stage ('high' and 'low'), filled in as needed (temporary
+        grids if None). Each stage has its own grid, since the second stage only indexes the left over trackers
+    :return: Matches as an array of [tracker, detection] index pairs, unmatched confident detections (weak detections
+        never start a track) and unmatched trackers
+    """
+    trackers = np.asarray(trackers, dtype=float).reshape(-1, 4)
+    detections = np.asarray(detections, dtype=float).reshape(-1, 4)
+    confident = np.asarray(confident, dtype=bool)
+
+    # Method: Used to match a subset of the detections to a subset of the trackers
+    def match(t, d, stage_min_iou, stage):
+        grid = grids.setdefault(stage, SpatialGrid()) if grids is not None else None
+        if trk_classes is None:
+            stage_matches, stage_dets, stage_trks = matcher(trackers[t], detections[d], min_iou=stage_min_iou,
+                                                            grid=grid)
+        else:
+            stage_matches, stage_dets, stage_trks = matcher(trackers[t], detections[d], min_iou=stage_min_iou,
+                                                            grid=grid, trk_classes=np.asarray(trk_classes)[t],
+                                                            det_classes=np.asarray(det_classes)[d])
+
+        return np.stack([t[stage_matches[:, 0]], d[stage_matches[:, 1]]], axis=1), d[stage_dets], t[stage_trks]
+
+    # First stage: every tracker against the confident detections
+    high_matches, unmatched_dets, unmatched_trks = match(np.arange(trackers.shape[0]), np.flatnonzero(confident),
+                                                         min_iou, 'high')
+
+    # Second stage: the trackers left over against the weak detections (e.g. partly occluded vehicles)
+    low_matches, _, unmatched_trks = match(unmatched_trks, np.flatnonzero(~confident), low_min_iou, 'low')
+
+    return np.concatenate([high_matches, low_matches], axis=0), unmatched_dets, np.sort(unmatched_trks)
@@ -0,0 +1,119 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BatchingDetector:
+    # Method: Constructor
+    def __init__(self, detector, max_batch_size=16, max_latency=0.02):
+        """
+        :param detector: VehicleDetector shared by every stream
+        :param max_batch_size: Maximum number of frames (across all streams) passed to the model in a single call
+        :param max_latency: Maximum time (seconds) the oldest waiting frame is held back to fill a batch
+        """
+        self.detector = detector
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+
+        # Frames waiting for the detector as (frame, weak detection threshold, future, submit time)
+        self.pending = []
+        self.wakeup = asyncio.Event()
+        self.closed = False
+        self.n_streams = 0
+
+        # Number of frames in each batch sent to the model
+        self.batch_sizes = []
+
+    # Method: Used to register a stream (a batch is sent early once every registered stream has a frame waiting)
+    def add_stream(self):
+        self.n_streams += 1
+
+    # Method: Used to unregister a stream at the end of its video
+    def remove_stream(self):
+        self.n_streams -= 1
+        self.wakeup.set()
+
+    # Method: Used to detect vehicles in a single frame (batched with the frames of the other streams)
+    async def detect(self, frame, low_conf=None):
+        """
+        :param frame: Image
+        :param low_conf: Minimum confidence of the weak detections kept along with the confident ones, for a two-stage
+            association (weak detections are dropped if None)
+        :return: Structured array (detection_dtype) with the box, class and score of each detection in the frame
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((frame, low_conf, future, loop.time()))
+        self.wakeup.set()
+
+        return await future
+
+    # Method: Used to stop the worker once the waiting frames have been detected
+    def close(self):
+        self.closed = True
+        self.wakeup.set()
+
+    # Method: Used to drop the weak detections a frame did not ask for (kept for another frame of its batch)
+    def drop_weak(self, detections, low_conf, batch_low_conf):
+        """
+        :param detections: Structured array (detection_dtype) of detections
+        :param low_conf: Weak detection threshold of the frame (confident detections only if None)
+        :param batch_low_conf: Weak detection threshold the batch was detected with
+        :return: Structured array with the detections above the threshold of the frame
+        """
+        if low_conf == batch_low_conf:
+            return detections
+
+        keep = self.detector.is_confident(detections)
+        if low_conf is not None:
+            keep |= detections['score'] > low_conf
+
+        return detections[keep]
+
+    # Method: Used as the detector worker (runs until 'close' is called)
+    async def run(self):
+        loop = asyncio.get_running_loop()
+
+        # The model runs on a single worker thread so that the event loop keeps serving the streams
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='detector')
+
+        try:
+            while not (self.closed and not self.pending):
+                if not self.pending:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                    continue
+
+                # Wait for more frames until the batch is full or the oldest frame reaches its deadline
+                deadline = self.pending[0][3] + self.max_latency
+                while not self.closed and len(self.pending) < min(self.max_batch_size, max(1, self.n_streams)):
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+
+                    self.wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self.wakeup.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+
+                batch = self.pending[:self.max_batch_size]
+                del self.pending[:self.max_batch_size]
+                self.batch_sizes.append(len(batch))
+
+                # The batch keeps the weak detections down to the lowest threshold any of its frames asked for
+                low_confs = [low_conf for _, low_conf, _, _ in batch if low_conf is not None]
+                batch_low_conf = min(low_confs) if low_confs else None
+
+                try:
+                    results = await loop.run_in_executor(executor, self.detector.get_detections_batch,
+                                                         [frame for frame, _, _, _ in batch], batch_low_conf)
+                except Exception as e:
+                    for _, _, future, _ in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                else:
+                    for (_, low_conf, future, _), detections in zip(batch, results):
+                        if not future.done():
+                            future.set_result(self.drop_weak(detections, low_conf, batch_low_conf))
+        finally:
+            executor.shutdown(wait=False)
@@ -1,4 +1,5 @@
 import cv2
+import numpy as np
 
 
 # Method: Used to calculate the ratio between intersection and union of 2 bounding boxes
@@ -33,3 +34,48 @@ def draw_box_label(image, box, colour=(0, 255, 255)):
 
     return image
 
+
+# Method: Used to calculate the ratio between intersection and union for every pair of boxes in 2 sets
+def box_iou_matrix(a, b):
+    """
+    :param a: Array of shape (N, 4) with boxes
+    :param b: Array of shape (M, 4) with boxes
+    :return: Array of shape (N, M) with Ratio = AnB / AuB for every pair of boxes
+    """
+    a = np.asarray(a, dtype=float).reshape(-1, 4)
+    b = np.asarray(b, dtype=float).reshape(-1, 4)
+
+    w_intersection = np.maximum(0, (np.minimum(a[:, None, 2], b[None, :, 2]) -
+                                    np.maximum(a[:, None, 0], b[None, :, 0])))
+    h_intersection = np.maximum(0, (np.minimum(a[:, None, 3], b[None, :, 3]) -
+                                    np.maximum(a[:, None, 1], b[None, :, 1])))
+    s_intersection = w_intersection * h_intersection
+
+    s_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    s_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    s_union = s_a[:, None] + s_b[None, :] - s_intersection
+
+    return np.divide(s_intersection, s_union, out=np.zeros_like(s_intersection), where=s_union > 0)
+
+
+# Method: Used to calculate the ratio between intersection and union for selected pairs of boxes in 2 sets
+def box_iou_pairs(a, b, a_idx, b_idx):
+    """
+    :param a: Array of shape (N, 4) with boxes
+    :param b: Array of shape (M, 4) with boxes
+    :param a_idx: Array of shape (K,) with the index of the box in 'a' for each pair
+    :param b_idx: Array of shape (K,) with the index of the box in 'b' for each pair
+    :return: Array of shape (K,) with Ratio = AnB / AuB for each pair
+    """
+    a = np.asarray(a, dtype=float).reshape(-1, 4)[a_idx]
+    b = np.asarray(b, dtype=float).reshape(-1, 4)[b_idx]
+
+    w_intersection = np.maximum(0, np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]))
+    h_intersection = np.maximum(0, np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]))
+    s_intersection = w_intersection * h_intersection
+
+    s_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    s_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    s_union = s_a + s_b - s_intersection
+
+    return np.divide(s_intersection, s_union, out=np.zeros_like(s_intersection), where=s_union > 0)
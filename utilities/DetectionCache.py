@@ -0,0 +1,254 @@
+import os
+import cv2
+import hashlib
+import numpy as np
+
+from utilities.VehicleDetector import VehicleDetector
+
+
+# Method: Used to calculate the hash of a file
+def file_hash(path, chunk_size=1 << 20):
+    """
+    :param path: Path to file
+    :param chunk_size: Number of bytes read at a time
+    :return: SHA-1 hex digest of the file contents
+    """
+    sha1 = hashlib.sha1()
+
+    with open(path, 'rb') as fid:
+        for chunk in iter(lambda: fid.read(chunk_size), b''):
+            sha1.update(chunk)
+
+    return sha1.hexdigest()
+
+
+class DetectionCache:
+    # Method: Constructor
+    def __init__(self, video_path, model_path='data/frozen_model.pb', cache_dir='cache', n_frames=None,
+                 max_detections=100, roi=None, scale=1.0):
+        """
+        :param video_path: Path to the video the detections belong to
+        :param model_path: Path to the model used for the detections
+        :param cache_dir: Directory holding all detection caches
+        :param n_frames: Number of frames in the video (read from the video if None)
+        :param max_detections: Number of detections returned by the model for each frame
+        :param roi: Region of interest of the detector (the model outputs are normalized to it)
+        :param scale: Factor by which the region of interest is resized before it is passed to the model
+        """
+        # Key the cache by the contents of the video and the model (and by the model input if it is not the frame)
+        self.key = '{}_{}'.format(file_hash(video_path)[:16], file_hash(model_path)[:16])
+        if roi is not None or scale != 1.0:
+            self.key += '_' + hashlib.sha1(repr((np.asarray(roi).tolist(), float(scale))).encode()).hexdigest()[:8]
+        self.path = os.path.join(cache_dir, self.key)
+
+        if os.path.isdir(self.path):
+            self.open_columns('r+')
+        else:
+            if n_frames is None:
+                video = cv2.VideoCapture(video_path)
+                n_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+                video.release()
+
+            os.makedirs(self.path)
+            self.open_columns('w+', {'boxes': ((n_frames, max_detections, 4), np.float32),
+                                     'scores': ((n_frames, max_detections), np.float32),
+                                     'classes': ((n_frames, max_detections), np.uint16),
+                                     'dims': ((n_frames, 2), np.int32),
+                                     'done': ((n_frames,), np.bool_)})
+
+    # Method: Used to open an existing cache directly from its directory (without hashing the video and model)
+    @classmethod
+    def from_path(cls, path, mode='r'):
+        """
+        :param path: Path to the cache directory
+        :param mode: Memory-map mode ('r' for read-only, 'r+' to allow new frames to be stored)
+        :return: DetectionCache
+        """
+        cache = cls.__new__(cls)
+        cache.key = os.path.basename(os.path.normpath(path))
+        cache.path = path
+        cache.open_columns(mode)
+
+        return cache
+
+    # Method: Used to open the memory-mapped columns with one row per frame
+    def open_columns(self, mode, shapes=None):
+        """
+        :param mode: Memory-map mode
+        :param shapes: Dictionary with the (shape, dtype) of each column when creating a new cache
+        """
+        for name in ('boxes', 'scores', 'classes', 'dims', 'done'):
+            shape, dtype = shapes[name] if shapes else (None, None)
+            setattr(self, name, np.lib.format.open_memmap(os.path.join(self.path, name + '.npy'), mode=mode,
+                                                          dtype=dtype, shape=shape))
+
+    # Method: Used to get the number of frames in the cache
+    def __len__(self):
+        """
+        :return: Number of frames
+        """
+        return self.done.shape[0]
+
+    # Method: Used to check if the detections for a frame are in the cache
+    def __contains__(self, index):
+        """
+        :param index: Frame index
+        :return: True if the frame has been stored
+        """
+        return 0 <= index < len(self) and bool(self.done[index])
+
+    # Method: Used to check if every frame is in the cache
+    @property
+    def complete(self):
+        """
+        :return: True if every frame has been stored
+        """
+        return bool(self.done.all())
+
+    # Method: Used to store the raw model outputs for a frame
+    def store(self, index, boxes, scores, classes, dims):
+        """
+        :param index: Frame index
+        :param boxes: Array of shape (100, 4) with normalized box coordinates
+        :param scores: Array of shape (100,) with the confidence of each box
+        :param classes: Array of shape (100,) with the class of each box
+        :param dims: Image dimensions
+        """
+        self.boxes[index] = boxes
+        self.scores[index] = scores
+        self.classes[index] = classes
+        self.dims[index] = dims[0:2]
+        self.done[index] = True
+
+    # Method: Used to load the raw model outputs for a frame
+    def load(self, index):
+        """
+        :param index: Frame index
+        :return: Boxes, scores, classes and image dimensions for the frame
+        """
+        return self.boxes[index], self.scores[index], self.classes[index], self.dims[index]
+
+    # Method: Used to write pending changes to disk
+    def flush(self):
+        for column in (self.boxes, self.scores, self.classes, self.dims, self.done):
+            column.flush()
+
+
+class CachedVehicleDetector(VehicleDetector):
+    # Method: Constructor
+    def __init__(self, cache, kitti=False, min_conf=0.7, info=False, max_batch_size=8, detector=None, profiler=None,
+                 roi=None, scale=1.0, class_filters=None, low_conf=None):
+        """
+        :param cache: DetectionCache for the video being processed
+        :param kitti: If True, use the Kitti classes
+        :param min_conf: Minimum acceptable confidence level (applied to the cached outputs)
+        :param info: If True, display all visualisations
+        :param max_batch_size: Maximum number of uncached frames passed to the model in a single call
+        :param detector: VehicleDetector used for frames missing from the cache (created when first needed if None)
+        :param profiler: Profiler recording the time spent in each stage (disabled if None)
+        :param roi: Region of interest the cache was created with (see VehicleDetector.set_roi)
+        :param scale: Factor by which the region of interest is resized before it is passed to the model
+        :param class_filters: Classes to keep (see VehicleDetector.set_class_filters)
+        :param low_conf: Minimum confidence of the weak detections kept for a two-stage association (dropped if None)
+        """
+        self.cache = cache
+        self.detector = detector
+        self.frame_index = 0
+
+        self.bounding_boxes = []
+        self.min_conf = min_conf
+        self.low_conf = low_conf
+        self.info = info
+        self.kitti = kitti
+        self.max_batch_size = max_batch_size
+        self.profiler = profiler
+        self.input_size = None
+        self.startup_times = {}
+        self.set_roi(roi, scale)
+        self.set_class_filters(class_filters)
+
+    # Method: Used to warm up the model used for frames missing from the cache (nothing to do until it is loaded)
+    def warmup(self, input_size=None, batch_sizes=None, n_runs=2):
+        """
+        :param input_size: Size (height, width) of the dummy frames
+        :param batch_sizes: Batch sizes to warm up (1 and 'max_batch_size' if None)
+        :param n_runs: Number of dummy inferences for each batch size
+        :return: Time (seconds) spent warming up
+        """
+        if self.detector is None:
+            return 0.0
+
+        return self.detector.warmup(input_size, batch_sizes, n_runs)
+
+    # Method: Used to get a report of the time spent starting up the detector
+    def startup_report(self):
+        """
+        :return: String with the time spent in each step of the start up (of the model, if it has been loaded)
+        """
+        if self.detector is None:
+            return super().startup_report()
+
+        return self.detector.startup_report()
+
+    # Method: Used to move to a frame of the video
+    def seek(self, index=0):
+        """
+        :param index: Index of the next frame to be processed
+        """
+        self.frame_index = index
+        self.bounding_boxes = []
+
+    # Method: Used to skip a frame without detecting vehicles in it
+    def skip_frame(self):
+        self.frame_index += 1
+
+    # Method: Used to get the raw model outputs for the next frames, running the model only for uncached frames
+    def get_raw_detections_batch(self, frames):
+        """
+        :param frames: List of images (may be None for frames that are in the cache)
+        :return: List with the (boxes, scores, classes) model outputs for each image, before any filtering
+        """
+        indices = range(self.frame_index, self.frame_index + len(frames))
+        missing = [i for i, index in enumerate(indices) if index not in self.cache]
+        results = {}
+
+        if missing:
+            if self.detector is None:
+                self.detector = VehicleDetector(kitti=self.kitti, max_batch_size=self.max_batch_size, roi=self.roi,
+                                                scale=self.scale)
+
+            # Frames past the end of the cache (e.g. the frame count of the video was short) bypass it
+            raw = self.detector.get_raw_detections_batch([frames[i] for i in missing])
+            for i, (boxes, scores, classes) in zip(missing, raw):
+                if indices[i] < len(self.cache):
+                    self.cache.store(indices[i], boxes, scores, classes, frames[i].shape)
+                else:
+                    results[i] = (boxes, scores, classes)
+
+        self.frame_index += len(frames)
+
+        return [results[i] if i in results else self.cache.load(index)[0:3] for i, index in enumerate(indices)]
+
+    # Method: Used to get the detections of the kept classes in the next frames from the cache
+    def get_detections_batch(self, frames, low_conf=None):
+        """
+        :param frames: List of images (may be None for frames that are in the cache)
+        :param low_conf: Minimum confidence of the weak detections kept for a two-stage association ('low_conf' of the
+            detector if None)
+        :return: List with a structured array (detection_dtype) of detections for each image
+        """
+        start = self.frame_index
+        results = []
+
+        if self.profiler is not None:
+            self.profiler.mark()
+
+        # Filter the detections for each image in order
+        for index, (boxes, scores, classes) in enumerate(self.get_raw_detections_batch(frames), start):
+            dims = self.cache.dims[index] if index < len(self.cache) else frames[index - start].shape[0:2]
+            results.append(self.filter_detections(boxes, scores, classes, dims, low_conf))
+
+        if self.profiler is not None:
+            self.profiler.lap('filter')
+
+        return results
@@ -0,0 +1,129 @@
+import time
+import numpy as np
+
+
+class DetectionScheduler:
+    # Method: Constructor
+    def __init__(self, fps=30.0, min_interval=1, max_interval=8, max_std=10.0, max_unmatched=2, max_motion=0.25):
+        """
+        :param fps: Frame rate of the video (the time budget for each frame is 1 / fps)
+        :param min_interval: Minimum no. of frames between two detector runs
+        :param max_interval: Maximum no. of frames between two detector runs
+        :param max_std: Position uncertainty (standard deviation in pixels) of any followed track that forces a detector
+            run
+        :param max_unmatched: No. of tracks lost at the last detector run that forces a detector run on the next frame
+        :param max_motion: Largest movement (as a fraction of the box size) any track may make between two detector
+            runs, used to lower the interval in fast moving scenes
+        """
+        self.frame_time = 1.0 / fps
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_std = max_std
+        self.max_unmatched = max_unmatched
+        self.max_motion = max_motion
+
+        # Current no. of frames between two detector runs
+        self.interval = min_interval
+        self.frames_since_detection = max_interval
+        self.n_unmatched = 0
+
+        # Time by which processing is behind the video (the time over budget, paid back by frames under budget)
+        self.backlog = 0.0
+        self.last_update = None
+
+        self.n_frames = 0
+        self.n_detections = 0
+        self.n_forced = 0
+
+    # Method: Used to decide if the detector has to run on the next frame
+    def should_detect(self, tracker_bank):
+        """
+        :param tracker_bank: TrackerBank with the current tracks
+        :return: True if the detector has to run, False if the tracks can coast on their predictions
+        """
+        if self.frames_since_detection >= self.interval:
+            return True
+
+        # Never run early while processing is behind the video
+        if self.backlog > self.frame_time:
+            return False
+
+        # Run early if some tracks were lost at the last detector run, or if the tracks that are being followed
+        # (matched at the last detector run) have become too uncertain
+        forced = self.n_unmatched > self.max_unmatched
+        followed = (tracker_bank.num_hits > 0) & (tracker_bank.num_unmatched == 0)
+        if not forced and followed.any():
+            forced = tracker_bank.position_std()[followed].max() > self.max_std
+
+        self.n_forced += forced
+
+        return forced
+
+    # Method: Used to get the largest movement of any track between two frames as a fraction of its size
+    @staticmethod
+    def scene_motion(tracker_bank):
+        """
+        :param tracker_bank: TrackerBank with the current tracks
+        :return: Largest movement per frame (0 if there are no tracks)
+        """
+        if len(tracker_bank) == 0:
+            return 0.0
+
+        x = tracker_bank.x
+        heights = np.maximum(x[:, 4] - x[:, 0], 1.0)
+        widths = np.maximum(x[:, 6] - x[:, 2], 1.0)
+        motion = np.maximum(np.abs(x[:, [1, 5]]) / heights[:, np.newaxis],
+                            np.abs(x[:, [3, 7]]) / widths[:, np.newaxis])
+
+        return float(motion.max())
+
+    # Method: Used to record a processed frame and adapt the interval to the scene and the processing backlog
+    def update(self, detected, tracker_bank):
+        """
+        :param detected: True if the detector ran on the frame
+        :param tracker_bank: TrackerBank with the tracks after the frame
+        """
+        now = time.perf_counter()
+        self.n_frames += 1
+
+        # Time between two frames covers everything done for a frame (detection, tracking, drawing, writing)
+        if self.last_update is not None:
+            self.backlog = max(0.0, self.backlog + (now - self.last_update) - self.frame_time)
+        self.last_update = now
+
+        if not detected:
+            self.frames_since_detection += 1
+            return
+
+        self.n_detections += 1
+        self.frames_since_detection = 1
+        self.n_unmatched = int((tracker_bank.num_unmatched == 1).sum())
+
+        # Detect less often while behind, more often while keeping up
+        behind = self.backlog > self.frame_time
+        self.interval += 1 if behind else -1
+
+        # Fast moving scenes cap the interval, unless processing is falling behind the video
+        limit = self.max_interval
+        motion = self.scene_motion(tracker_bank)
+        if not behind and motion > 0:
+            limit = min(limit, int(self.max_motion / motion))
+
+        self.interval = int(np.clip(self.interval, self.min_interval, max(self.min_interval, limit)))
+
+    # Method: Used to get the fraction of frames on which the detector ran
+    @property
+    def detection_rate(self):
+        """
+        :return: Detector runs / frames
+        """
+        return self.n_detections / float(max(1, self.n_frames))
+
+    # Method: Used to get a summary of how often the detector ran
+    def summary(self):
+        """
+        :return: String with the detector runs, frames and the current interval
+        """
+        return '[INFO]: detector ran on {} of {} frames ({:.1f}%), {} forced early, interval {}, backlog {:.2f} s'\
+            .format(self.n_detections, self.n_frames, 100.0 * self.detection_rate, self.n_forced, self.interval,
+                    self.backlog)
@@ -0,0 +1,73 @@
+import cv2
+import numpy as np
+
+
+class FrameBuffer:
+    # Method: Constructor
+    def __init__(self, frame_size, n_cameras=1, scale=1.0):
+        """
+        :param frame_size: Size (height, width) of the frames of each camera
+        :param n_cameras: Number of cameras
+        :param scale: Factor by which each camera is resized in the output canvas
+        """
+        self.frame_size = tuple(frame_size)
+        self.n_cameras = n_cameras
+
+        # Frame sets (one buffer per camera) that have been released and can be decoded into again. New buffers are
+        # only allocated while every existing one is still queued or being processed
+        self.free = []
+        self.n_allocated = 0
+
+        # Output canvas with the cameras side by side (not needed for a single camera at full size)
+        self.view_size = (int(round(frame_size[0] * scale)), int(round(frame_size[1] * scale)))
+        if n_cameras == 1 and self.view_size == self.frame_size:
+            self.canvas = None
+        else:
+            self.canvas = np.zeros((self.view_size[0], self.view_size[1] * n_cameras, 3), dtype=np.uint8)
+
+    # Method: Used to get the buffers for the next set of frames (one per camera)
+    def acquire(self):
+        """
+        :return: List with the buffer for each camera
+        """
+        try:
+            return self.free.pop()
+        except IndexError:
+            self.n_allocated += 1
+            return [np.empty((self.frame_size[0], self.frame_size[1], 3), dtype=np.uint8)
+                    for _ in range(self.n_cameras)]
+
+    # Method: Used to hand the buffers of a set of frames back once they have been written
+    def release(self, frames):
+        """
+        :param frames: Frame (single camera) or list with the frame of each camera, as returned by 'acquire'
+        """
+        self.free.append(frames if isinstance(frames, list) else [frames])
+
+    # Method: Used to get the part of the output canvas that belongs to a camera
+    def view(self, camera=0):
+        """
+        :param camera: Camera index
+        :return: View into the canvas (no copy)
+        """
+        width = self.view_size[1]
+
+        return self.canvas[:, camera * width:(camera + 1) * width]
+
+    # Method: Used to write the annotated frame of a camera into its view of the output canvas
+    def compose(self, camera, image):
+        """
+        :param camera: Camera index
+        :param image: Annotated frame
+        :return: Output canvas (the frame itself if there is no canvas)
+        """
+        if self.canvas is None:
+            return image
+
+        view = self.view(camera)
+        if image.shape[0:2] == self.view_size:
+            view[...] = image
+        else:
+            cv2.resize(image, (self.view_size[1], self.view_size[0]), dst=view, interpolation=cv2.INTER_AREA)
+
+        return self.canvas
@@ -1,7 +1,4 @@
 import logging
-import tensorflow as tf
-from google.protobuf import text_format
-from object_detection.protos import string_int_label_map_pb2
 
 
 # Method: Used to checks if a label map is valid
@@ -71,7 +68,11 @@ def load_label_map(path):
     :param path: Path to StringIntLabelMap proto text file
     :return: A StringIntLabelMapProto
     """
-    with tf.gfile.GFile(path, 'r') as fid:
+    # Imported here so that tools that never load a label map do not need the protobuf packages
+    from google.protobuf import text_format
+    from object_detection.protos import string_int_label_map_pb2
+
+    with open(path, 'r') as fid:
         label_map_string = fid.read()
         label_map = string_int_label_map_pb2.StringIntLabelMap()
 
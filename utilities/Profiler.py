@@ -0,0 +1,145 @@
+import csv
+import json
+import time
+import numpy as np
+
+
+class Profiler:
+    # Method: Constructor
+    def __init__(self, capacity=100000, frame_capacity=10000):
+        """
+        :param capacity: Maximum number of stage timings kept (oldest are overwritten)
+        :param frame_capacity: Maximum number of per-frame track counts kept (oldest are overwritten)
+        """
+        self.stage_names = []
+        self.stage_index = {}
+        self.frame = 0
+        self.last_mark = time.perf_counter()
+        self.origin = self.last_mark
+
+        # Ring buffer of stage timings
+        self.capacity = capacity
+        self.n_events = 0
+        self.event_frame = np.zeros(capacity, dtype=np.int64)
+        self.event_stage = np.zeros(capacity, dtype=np.int16)
+        self.event_start = np.zeros(capacity)
+        self.event_duration = np.zeros(capacity)
+
+        # Ring buffer of per-frame track counts
+        self.frame_capacity = frame_capacity
+        self.n_frames = 0
+        self.frame_end = np.zeros(frame_capacity)
+        self.frame_counts = np.zeros((frame_capacity, 4), dtype=np.int64)
+
+    # Method: Used to start timing from now
+    def mark(self):
+        self.last_mark = time.perf_counter()
+
+    # Method: Used to record the time since the last mark (or lap) as a stage and start timing the next stage
+    def lap(self, stage, frame=None):
+        """
+        :param stage: Stage name
+        :param frame: Frame the stage belongs to (the current frame if None)
+        """
+        now = time.perf_counter()
+
+        if stage not in self.stage_index:
+            self.stage_index[stage] = len(self.stage_names)
+            self.stage_names.append(stage)
+
+        i = self.n_events % self.capacity
+        self.event_frame[i] = self.frame if frame is None else frame
+        self.event_stage[i] = self.stage_index[stage]
+        self.event_start[i] = self.last_mark - self.origin
+        self.event_duration[i] = now - self.last_mark
+        self.n_events += 1
+        self.last_mark = now
+
+    # Method: Used to record the track counts at the end of a frame and move on to the next frame
+    def end_frame(self, active, births, deaths):
+        """
+        :param active: Number of active tracks
+        :param births: Number of tracks created in the frame
+        :param deaths: Number of tracks deleted in the frame
+        """
+        i = self.n_frames % self.frame_capacity
+        self.frame_end[i] = time.perf_counter() - self.origin
+        self.frame_counts[i] = (self.frame, active, births, deaths)
+        self.n_frames += 1
+        self.frame += 1
+
+    # Method: Used to get the stage timings still held in the ring buffer, oldest first
+    def events(self):
+        """
+        :return: Arrays with the frame, stage index, start time and duration (seconds) of each event
+        """
+        n = min(self.n_events, self.capacity)
+        order = (np.arange(n) + (self.n_events - n)) % self.capacity
+
+        return self.event_frame[order], self.event_stage[order], self.event_start[order], self.event_duration[order]
+
+    # Method: Used to get the per-frame track counts still held in the ring buffer, oldest first
+    def frames(self):
+        """
+        :return: Array of frame end times and array of (frame, active, births, deaths) rows
+        """
+        n = min(self.n_frames, self.frame_capacity)
+        order = (np.arange(n) + (self.n_frames - n)) % self.frame_capacity
+
+        return self.frame_end[order], self.frame_counts[order]
+
+    # Method: Used to summarise the stage timings and track counts
+    def summary(self):
+        """
+        :return: Dictionary with count, mean, p50, p95 and p99 (ms) for each stage, and the track counts
+        """
+        _, stages, _, durations = self.events()
+        result = {}
+
+        for index, stage in enumerate(self.stage_names):
+            values = 1000.0 * durations[stages == index]
+            if len(values) > 0:
+                result[stage] = {'count': len(values), 'mean_ms': float(values.mean()),
+                                 'p50_ms': float(np.percentile(values, 50)),
+                                 'p95_ms': float(np.percentile(values, 95)),
+                                 'p99_ms': float(np.percentile(values, 99))}
+
+        _, counts = self.frames()
+        if len(counts) > 0:
+            result['tracks'] = {'frames': len(counts), 'mean_active': float(counts[:, 1].mean()),
+                                'max_active': int(counts[:, 1].max()), 'births': int(counts[:, 2].sum()),
+                                'deaths': int(counts[:, 3].sum())}
+
+        return result
+
+    # Method: Used to save the stage timings as a CSV trace
+    def to_csv(self, path):
+        """
+        :param path: Path to CSV file
+        """
+        frames, stages, starts, durations = self.events()
+
+        with open(path, 'w', newline='') as fid:
+            writer = csv.writer(fid)
+            writer.writerow(['frame', 'stage', 'start_ms', 'duration_ms'])
+            for frame, stage, start, duration in zip(frames, stages, starts, durations):
+                writer.writerow([frame, self.stage_names[stage], '{:.4f}'.format(1000.0 * start),
+                                 '{:.4f}'.format(1000.0 * duration)])
+
+    # Method: Used to save the stage timings and track counts as a Chrome trace-event JSON file (chrome://tracing)
+    def to_chrome_trace(self, path):
+        """
+        :param path: Path to JSON file
+        """
+        frames, stages, starts, durations = self.events()
+        trace_events = [{'name': self.stage_names[stage], 'ph': 'X', 'pid': 0, 'tid': 0,
+                         'ts': 1e6 * start, 'dur': 1e6 * duration, 'args': {'frame': int(frame)}}
+                        for frame, stage, start, duration in zip(frames, stages, starts, durations)]
+
+        frame_ends, counts = self.frames()
+        trace_events.extend({'name': 'tracks', 'ph': 'C', 'pid': 0, 'ts': 1e6 * end,
+                             'args': {'active': int(active), 'births': int(births), 'deaths': int(deaths)}}
+                            for end, (_, active, births, deaths) in zip(frame_ends, counts))
+
+        with open(path, 'w') as fid:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, fid)
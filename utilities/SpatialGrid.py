@@ -0,0 +1,118 @@
+import numpy as np
+
+
+class SpatialGrid:
+    # Method: Constructor
+    def __init__(self, cell_size=None, smoothing=0.2, max_cells=64):
+        """
+        :param cell_size: Size (pixels) of the square grid cells (follows the size of the indexed boxes if None)
+        :param smoothing: Weight of the current frame when the cell size follows the box size
+        :param max_cells: Maximum number of cells a box is listed in (larger boxes are paired with every box instead)
+        """
+        self.fixed_cell_size = cell_size
+        self.cell_size = cell_size
+        self.smoothing = smoothing
+        self.max_cells = max_cells
+
+        # Indexed boxes, one entry per (cell, box) pair sorted by cell key, and the boxes over too many cells
+        self.boxes = np.zeros((0, 4))
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.index = np.zeros(0, dtype=np.int64)
+        self.large = np.zeros(0, dtype=np.int64)
+
+    # Method: Used to get the number of indexed boxes
+    def __len__(self):
+        """
+        :return: Number of boxes
+        """
+        return self.boxes.shape[0]
+
+    # Method: Used to list every cell each box overlaps
+    def cells(self, boxes):
+        """
+        :param boxes: Array of shape (N, 4) with boxes [ymin, xmin, ymax, xmax]
+        :return: Array with the cell key and array with the box index of every (cell, box) pair, and array with the
+            boxes over more than 'max_cells' cells (not listed in any cell)
+        """
+        # Predicted boxes can be inverted (e.g. ymax < ymin after coasting for a while), so the cells are taken from
+        # the smallest and largest corner coordinates
+        first = np.floor(np.minimum(boxes[:, 0:2], boxes[:, 2:4]) / self.cell_size)
+        last = np.floor(np.maximum(boxes[:, 0:2], boxes[:, 2:4]) / self.cell_size)
+        n_rows = last[:, 0] - first[:, 0] + 1
+        n_cols = last[:, 1] - first[:, 1] + 1
+
+        # Boxes over too many cells would blow up the number of entries
+        large = np.flatnonzero(n_rows * n_cols > self.max_cells)
+        n_rows[large] = 0
+        first, n_rows, n_cols = first.astype(np.int64), n_rows.astype(np.int64), n_cols.astype(np.int64)
+        counts = n_rows * n_cols
+
+        # Expand each box into its block of cells (row-major within the block)
+        index = np.repeat(np.arange(boxes.shape[0]), counts)
+        offset = np.arange(index.shape[0]) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = first[index, 0] + offset // n_cols[index]
+        cols = first[index, 1] + offset % n_cols[index]
+
+        return (rows << 32) + cols, index, large
+
+    # Method: Used to index the boxes of the current frame (e.g. the predicted tracker boxes)
+    def update(self, boxes):
+        """
+        The index is rebuilt from scratch (only the cell size carries over): every predicted box moves each frame, and
+        a rebuild is one sort of the cell entries (see MatchingBenchmark.py for its share of the matching time)
+        :param boxes: Array of shape (N, 4) with boxes [ymin, xmin, ymax, xmax]
+        """
+        self.boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+
+        # Cells about the size of a box, so that a box overlaps 1 to 4 cells. The size carries over from frame to frame
+        if self.fixed_cell_size is None and len(self) > 0:
+            box_size = float(np.median(np.maximum(np.abs(self.boxes[:, 2] - self.boxes[:, 0]),
+                                                  np.abs(self.boxes[:, 3] - self.boxes[:, 1]))))
+            box_size = max(box_size, 1.0)
+            if self.cell_size is None:
+                self.cell_size = box_size
+            else:
+                self.cell_size += self.smoothing * (box_size - self.cell_size)
+
+        if len(self) == 0 or self.cell_size is None:
+            self.keys = np.zeros(0, dtype=np.int64)
+            self.index = np.zeros(0, dtype=np.int64)
+            self.large = np.zeros(0, dtype=np.int64)
+            return
+
+        keys, index, self.large = self.cells(self.boxes)
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.index = index[order]
+
+    # Method: Used to find the indexed boxes that share a cell with each query box
+    def query(self, boxes):
+        """
+        :param boxes: Array of shape (M, 4) with boxes [ymin, xmin, ymax, xmax]
+        :return: Arrays with the indexed box and the query box of each candidate pair (each pair appears once)
+        """
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        if len(self) == 0 or boxes.shape[0] == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        keys, query_index, query_large = self.cells(boxes)
+
+        # Range of indexed entries in the cell of each query entry
+        start = np.searchsorted(self.keys, keys, side='left')
+        counts = np.searchsorted(self.keys, keys, side='right') - start
+
+        # Expand every query entry into its pairs with the indexed entries of the same cell
+        query_index = np.repeat(query_index, counts)
+        position = np.repeat(start - (np.cumsum(counts) - counts), counts) + np.arange(query_index.shape[0])
+        box_index = self.index[position]
+
+        # Boxes over too many cells are paired with every box of the other set
+        n, m = len(self), boxes.shape[0]
+        box_index = np.concatenate([box_index, np.repeat(self.large, m), np.tile(np.arange(n), len(query_large))])
+        query_index = np.concatenate([query_index, np.tile(np.arange(m), len(self.large)),
+                                      np.repeat(query_large, n)])
+
+        # Boxes sharing more than one cell give the same pair more than once
+        pairs = np.unique(box_index * m + query_index)
+
+        return pairs // boxes.shape[0], pairs % boxes.shape[0]
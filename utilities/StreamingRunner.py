@@ -0,0 +1,209 @@
+import time
+import queue
+import threading
+
+
+class StreamingRunner:
+    # Marker placed on a queue at the end of the stream
+    end_of_stream = object()
+
+    # Method: Constructor
+    def __init__(self, frames, process_batch, write_frame, batch_size=1, queue_size=16):
+        """
+        :param frames: Iterable of frames (decoding happens while iterating, on the decode thread)
+        :param process_batch: Function taking a list of frames and returning a list of results (one per frame)
+        :param write_frame: Function taking the frame index and the result for that frame
+        :param batch_size: Maximum number of frames passed to 'process_batch' in a single call
+        :param queue_size: Maximum number of items waiting between two stages
+        """
+        self.frames = frames
+        self.process_batch = process_batch
+        self.write_frame = write_frame
+        self.batch_size = batch_size
+
+        # Bounded queues between the stages (a full queue blocks the stage before it)
+        self.decoded = queue.Queue(maxsize=queue_size)
+        self.processed = queue.Queue(maxsize=queue_size)
+
+        self.stop = threading.Event()
+        self.errors = []
+        self.wall_time = 0.0
+        self.timings = {stage: {'frames': 0, 'calls': 0, 'total': 0.0, 'max': 0.0}
+                        for stage in ('decode', 'process', 'write')}
+
+    # Method: Used to record the time spent by a stage on one call
+    def record(self, stage, start, n_frames=1):
+        """
+        :param stage: Stage name
+        :param start: Time at which the call started
+        :param n_frames: Number of frames handled by the call
+        """
+        elapsed = time.perf_counter() - start
+        timing = self.timings[stage]
+        timing['frames'] += n_frames
+        timing['calls'] += 1
+        timing['total'] += elapsed
+        timing['max'] = max(timing['max'], elapsed)
+
+    # Method: Used to put an item on a queue without blocking forever if another stage has failed
+    def put(self, q, item):
+        """
+        :param q: Queue
+        :param item: Item
+        :return: False if the runner is stopping
+        """
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    # Method: Used to get an item from a queue without blocking forever if another stage has failed
+    def get(self, q):
+        """
+        :param q: Queue
+        :return: Item, or 'end_of_stream' if the runner is stopping
+        """
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+        return self.end_of_stream
+
+    # Method: Used to run a stage and stop the other stages if it fails
+    def run_stage(self, stage):
+        """
+        :param stage: Function running the stage
+        """
+        try:
+            stage()
+        except BaseException as e:
+            self.errors.append(e)
+            self.stop.set()
+
+    # Method: Used as the decode stage
+    def decode_stage(self):
+        iterator = iter(self.frames)
+        index = 0
+
+        while True:
+            start = time.perf_counter()
+            frame = next(iterator, self.end_of_stream)
+            if frame is self.end_of_stream:
+                break
+            self.record('decode', start)
+
+            if not self.put(self.decoded, (index, frame)):
+                return
+            index += 1
+
+        self.put(self.decoded, self.end_of_stream)
+
+    # Method: Used as the detect and track stage (frames are processed in micro-batches, in order)
+    def process_stage(self):
+        done = False
+
+        while not done:
+            batch = []
+            while len(batch) < self.batch_size:
+                item = self.get(self.decoded)
+                if item is self.end_of_stream:
+                    done = True
+                    break
+                batch.append(item)
+
+            if batch:
+                start = time.perf_counter()
+                results = self.process_batch([frame for _, frame in batch])
+                self.record('process', start, len(batch))
+
+                for (index, _), result in zip(batch, results):
+                    if not self.put(self.processed, (index, result)):
+                        return
+
+        self.put(self.processed, self.end_of_stream)
+
+    # Method: Used as the write stage
+    def write_stage(self):
+        while True:
+            item = self.get(self.processed)
+            if item is self.end_of_stream:
+                break
+
+            start = time.perf_counter()
+            self.write_frame(*item)
+            self.record('write', start)
+
+    # Method: Used to run all stages until the end of the stream
+    def run(self):
+        """
+        :return: Wall time for the whole stream in seconds
+        """
+        start = time.perf_counter()
+        threads = [threading.Thread(target=self.run_stage, args=(stage,), name=name)
+                   for name, stage in (('decode', self.decode_stage), ('process', self.process_stage))]
+
+        for thread in threads:
+            thread.start()
+
+        # The write stage runs on the calling thread
+        self.run_stage(self.write_stage)
+
+        for thread in threads:
+            thread.join()
+
+        if self.errors:
+            raise self.errors[0]
+
+        self.wall_time = time.perf_counter() - start
+
+        return self.wall_time
+
+    # Method: Used to get a summary of the time spent in each stage
+    def summary(self):
+        """
+        :return: String with the frames, total time and mean time per frame for each stage
+        """
+        lines = []
+        for stage, timing in self.timings.items():
+            mean = 1000.0 * timing['total'] / timing['frames'] if timing['frames'] else 0.0
+            lines.append('[INFO]: {:<8} {:>6} frames {:>9.2f} s {:>9.2f} ms/frame'.format(stage, timing['frames'],
+                                                                                         timing['total'], mean))
+
+        if self.wall_time > 0:
+            n_frames = self.timings['write']['frames']
+            lines.append('[INFO]: {:<8} {:>6} frames {:>9.2f} s {:>9.2f} frames/s'.format('overall', n_frames,
+                                                                                         self.wall_time,
+                                                                                         n_frames / self.wall_time))
+
+        return '\n'.join(lines)
+
+
+# Method: Used to read frames from one or more videos in lockstep
+def read_video_frames(videos, n_frames=None, frame_buffer=None):
+    """
+    :param videos: A cv2.VideoCapture, or a list of them to read together
+    :param n_frames: Maximum number of frames to read (until the end of the shortest video if None)
+    :param frame_buffer: FrameBuffer the frames are decoded into (a new array is allocated for every frame if None)
+    :return: Generator with a frame (or a list of frames, one per video) for each time step
+    """
+    multiple = isinstance(videos, (list, tuple))
+    captures = videos if multiple else [videos]
+    count = 0
+
+    while n_frames is None or count < n_frames:
+        frames = []
+        buffers = frame_buffer.acquire() if frame_buffer is not None else [None] * len(captures)
+        for capture, buffer in zip(captures, buffers):
+            ok, frame = capture.read(buffer)
+            if not ok:
+                return
+            frames.append(frame)
+
+        yield frames if multiple else frames[0]
+        count += 1
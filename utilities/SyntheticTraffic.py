@@ -0,0 +1,177 @@
+import time
+import numpy as np
+
+from utilities.VehicleDetector import detection_dtype
+
+
+# Method: Used to generate synthetic vehicle trajectories with ground truth IDs and noisy detections
+def generate_scene(n_objects, n_frames=100, density=20, box_height=(40, 80), speed=3.0, noise=2.0, miss_rate=0.05,
+                   occlusion_rate=0.2, false_positives=0.5, seed=0, class_mix=None, weak_rate=0.0):
+    """
+    :param n_objects: Number of vehicles in the scene
+    :param n_frames: Number of frames
+    :param density: Number of vehicles per 1080x1920 area (the scene grows with the number of vehicles)
+    :param box_height: Range of box heights in pixels (box widths are 1.3 to 2 times the height)
+    :param speed: Standard deviation of the vehicle velocity in pixels/frame
+    :param noise: Standard deviation of the detection noise in pixels
+    :param miss_rate: Probability that a visible vehicle is not detected in a frame
+    :param occlusion_rate: Probability that a vehicle is hidden for a run of 3 to 10 frames
+    :param false_positives: Mean number of false detections per frame
+    :param seed: Random seed
+    :param class_mix: Dictionary with the share of the vehicles and the 'box_height', 'aspect' (width/height range)
+        and 'speed' of each class ID, e.g. {3: {'share': 0.7}, 1: {'share': 0.3, 'aspect': (0.3, 0.5), 'speed': 1.0}}
+        (missing values are taken from the arguments). Every vehicle is a car (class 3) if None
+    :param weak_rate: Probability that a hidden vehicle is still detected in a frame, with a low confidence (a partly
+        occluded vehicle)
+    :return: Dictionary with the ground truth IDs, ground truth boxes, detected boxes, their classes and their
+        confidences for each frame
+    """
+    rng = np.random.RandomState(seed)
+
+    # Confidences and weak detections are drawn separately, so that the rest of the scene does not depend on them
+    score_rng = np.random.RandomState(seed + 1)
+
+    # Grow the scene so that the density of vehicles stays the same
+    scale = np.sqrt(max(1.0, n_objects / float(density)))
+    dims = (int(1080 * scale), int(1920 * scale))
+
+    # Initial position, velocity and size for each vehicle
+    heights = rng.uniform(box_height[0], box_height[1], n_objects)
+    widths = heights * rng.uniform(1.3, 2.0, n_objects)
+    positions = rng.uniform([0, 0], [dims[0] - box_height[1], dims[1] - 2 * box_height[1]], (n_objects, 2))
+    velocities = rng.normal(0, speed, (n_objects, 2))
+    classes = np.full(n_objects, 3)
+
+    # Draw the class of each vehicle, then its size and velocity from the values of its class
+    if class_mix is not None:
+        class_ids = sorted(class_mix)
+        shares = np.array([class_mix[c].get('share', 1.0) for c in class_ids], dtype=float)
+        classes = rng.choice(class_ids, n_objects, p=shares / shares.sum())
+
+        for class_id in class_ids:
+            idx = np.flatnonzero(classes == class_id)
+            class_height = class_mix[class_id].get('box_height', box_height)
+            class_aspect = class_mix[class_id].get('aspect', (1.3, 2.0))
+            heights[idx] = rng.uniform(class_height[0], class_height[1], len(idx))
+            widths[idx] = heights[idx] * rng.uniform(class_aspect[0], class_aspect[1], len(idx))
+            velocities[idx] = rng.normal(0, class_mix[class_id].get('speed', speed), (len(idx), 2))
+
+    # Each vehicle enters in the first half of the video and stays for at least half of it
+    first_frame = rng.randint(0, max(1, n_frames // 2), n_objects)
+    last_frame = np.minimum(n_frames, first_frame + rng.randint(n_frames // 2, n_frames + 1, n_objects))
+
+    # Some vehicles are hidden for a run of frames
+    occluded = rng.rand(n_objects) < occlusion_rate
+    occlusion_start = first_frame + rng.randint(0, max(1, n_frames // 2), n_objects)
+    occlusion_end = np.where(occluded, occlusion_start + rng.randint(3, 11, n_objects), occlusion_start)
+
+    gt_ids, gt_boxes, gt_classes, det_boxes, det_classes, det_scores = [], [], [], [], [], []
+
+    for n in range(n_frames):
+        present = (first_frame <= n) & (n < last_frame)
+        idx = np.flatnonzero(present)
+
+        top_left = positions[idx] + velocities[idx] * (n - first_frame[idx])[:, None]
+        boxes = np.stack([top_left[:, 0], top_left[:, 1],
+                          top_left[:, 0] + heights[idx], top_left[:, 1] + widths[idx]], axis=1)
+
+        # Detections are noisy, some are missed and some vehicles are hidden
+        hidden = (occlusion_start[idx] <= n) & (n < occlusion_end[idx])
+        visible = ~hidden & (rng.rand(len(idx)) >= miss_rate)
+        detections = boxes[visible] + rng.normal(0, noise, (int(visible.sum()), 4))
+        scores = score_rng.uniform(0.65, 1.0, len(detections))
+
+        # Partly occluded vehicles are detected with a low confidence and more noise
+        weak = hidden & (score_rng.rand(len(idx)) < weak_rate)
+        detections = np.vstack([detections, boxes[weak] + score_rng.normal(0, 2 * noise, (int(weak.sum()), 4))])
+        scores = np.concatenate([scores, score_rng.uniform(0.15, 0.55, int(weak.sum()))])
+
+        # Add false detections
+        n_false = rng.poisson(false_positives)
+        false_top_left = rng.uniform([0, 0], dims, (n_false, 2))
+        false_size = rng.uniform(box_height[0], box_height[1], (n_false, 1)) * [1.0, 1.6]
+        detections = np.vstack([detections, np.hstack([false_top_left, false_top_left + false_size])])
+        detection_classes = np.concatenate([classes[idx[visible]], classes[idx[weak]], np.full(n_false, 3)])
+        scores = np.concatenate([scores, score_rng.uniform(0.15, 0.75, n_false)])
+
+        gt_ids.append(idx)
+        gt_boxes.append(boxes)
+        gt_classes.append(classes[idx])
+        order = rng.permutation(len(detections))
+        det_boxes.append(detections[order].astype(int))
+        det_classes.append(detection_classes[order])
+        det_scores.append(scores[order])
+
+    return {'dims': dims, 'gt_ids': gt_ids, 'gt_boxes': gt_boxes, 'gt_classes': gt_classes, 'det_boxes': det_boxes,
+            'det_classes': det_classes, 'det_scores': det_scores}
+
+
+class SyntheticDetector:
+    # Method: Constructor
+    def __init__(self, det_boxes, latency=0.0, det_classes=None, det_scores=None, min_conf=None, low_conf=None):
+        """
+        :param det_boxes: List with the detected boxes for each frame
+        :param latency: Time (seconds) each call takes, to stand in for the cost of running the model
+        :param det_classes: List with the class of each detected box for each frame (cars if None)
+        :param det_scores: List with the confidence of each detected box for each frame (fully confident if None)
+        :param min_conf: Minimum acceptable confidence level (every box is kept if None)
+        :param low_conf: Minimum confidence of the weak detections kept along with the confident ones, for a two-stage
+            association (weak detections are dropped if None)
+        """
+        self.det_boxes = det_boxes
+        self.det_classes = det_classes
+        self.det_scores = det_scores
+        self.min_conf = min_conf
+        self.low_conf = low_conf
+        self.latency = latency
+        self.frame_index = 0
+
+    # Method: Used to return the detections for the next frame (stands in for VehicleDetector)
+    def get_bounding_box_locations(self, image=None):
+        """
+        :param image: Image (ignored)
+        :return: Bounding box locations for the next frame
+        """
+        detections = self.get_detections(image)
+
+        return detections['box'][self.is_confident(detections)]
+
+    # Method: Used to return the detections with their classes for the next frame (stands in for VehicleDetector)
+    def get_detections(self, image=None, low_conf=None):
+        """
+        :param image: Image (ignored)
+        :param low_conf: Minimum confidence of the weak detections kept along with the confident ones, for a two-stage
+            association ('low_conf' of the detector if None)
+        :return: Structured array (detection_dtype) with the box, class and score of each detection
+        """
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        boxes = self.det_boxes[self.frame_index]
+        detections = np.empty(len(boxes), dtype=detection_dtype)
+        detections['box'] = boxes
+        detections['class'] = self.det_classes[self.frame_index] if self.det_classes is not None else 3
+        detections['score'] = self.det_scores[self.frame_index] if self.det_scores is not None else 1.0
+        self.frame_index += 1
+
+        low_conf = low_conf if low_conf is not None else self.low_conf
+        min_conf = low_conf if low_conf is not None else self.min_conf
+        if min_conf is not None:
+            detections = detections[detections['score'] > min_conf]
+
+        return detections
+
+    # Method: Used to find the detections that are above the confidence level (not just 'low_conf')
+    def is_confident(self, detections):
+        """
+        :param detections: Structured array (detection_dtype) of detections
+        :return: Boolean array, True for the confident detections
+        """
+        if self.min_conf is None:
+            return np.ones(len(detections), dtype=bool)
+
+        return detections['score'] > self.min_conf
+
+    # Method: Used to skip a frame without detecting vehicles in it
+    def skip_frame(self):
+        self.frame_index += 1
@@ -0,0 +1,49 @@
+import heapq
+import numpy as np
+
+
+class TrackIdAllocator:
+    # Method: Constructor
+    def __init__(self, recycle=False, first_id=0):
+        """
+        :param recycle: If True, IDs of deleted tracks are handed out again (smallest first) before new IDs
+        :param first_id: First ID to hand out
+        """
+        self.recycle = recycle
+        self.next_id = first_id
+        self.free_ids = []
+
+    # Method: Used to get the number of IDs handed out so far (excluding recycled ones)
+    def __len__(self):
+        """
+        :return: Number of distinct IDs
+        """
+        return self.next_id
+
+    # Method: Used to get IDs for new tracks
+    def allocate(self, n=1):
+        """
+        :param n: Number of IDs
+        :return: Array of n unique integer IDs
+        """
+        ids = np.empty(n, dtype=np.int64)
+
+        # Reuse released IDs first (only if recycling)
+        k = min(n, len(self.free_ids))
+        for i in range(k):
+            ids[i] = heapq.heappop(self.free_ids)
+
+        # Hand out new monotonic IDs for the rest
+        ids[k:] = np.arange(self.next_id, self.next_id + n - k)
+        self.next_id += n - k
+
+        return ids
+
+    # Method: Used to release the IDs of deleted tracks
+    def release(self, ids):
+        """
+        :param ids: IDs of the deleted tracks
+        """
+        if self.recycle:
+            for track_id in np.asarray(ids, dtype=np.int64).tolist():
+                heapq.heappush(self.free_ids, track_id)
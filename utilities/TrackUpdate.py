@@ -0,0 +1,17 @@
+import collections
+
+
+class TrackUpdate(collections.namedtuple('TrackUpdate', ['frame', 'detected', 'ids', 'classes', 'boxes', 'velocities',
+                                                         'zones', 'warning'])):
+    """
+    Result of the tracking step for one frame:
+    frame: Frame index
+    detected: True if the detector ran on the frame, False if the tracks coasted on their predictions
+    ids: List with the IDs of the established tracks
+    classes: List with the class of each established track (-1 if unknown)
+    boxes: Array of shape (N, 4) with the boxes [ymin, xmin, ymax, xmax] of the established tracks in pixels
+    velocities: Array of shape (N, 4) with the velocity of each box coordinate in pixels/frame
+    zones: List with the warning zone each established track is in (None if it is not in a warning zone)
+    warning: True if any established track is in a warning zone
+    """
+    __slots__ = ()
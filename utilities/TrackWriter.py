@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import numpy as np
+
+
+class TrackWriter:
+    # Columns of a track record (one record per established track per frame)
+    columns = ('frame', 'timestamp', 'track_id', 'class_id', 'ymin', 'xmin', 'ymax', 'xmax', 'v_ymin', 'v_xmin',
+               'v_ymax', 'v_xmax', 'zone')
+
+    # Method: Constructor
+    def __init__(self, output_path, backend='jsonl', fps=None, buffer_size=1024):
+        """
+        :param output_path: Path to the output file. A JSONL file is appended to if it exists, while a Parquet file
+            cannot be appended to, so the records go to the first free path with a numbered suffix instead (e.g.
+            tracks_1.parquet next to an existing tracks.parquet)
+        :param backend: 'jsonl' (one JSON object per line) or 'parquet' (columnar, needs pyarrow)
+        :param fps: Frames/second of the video, used for the timestamps (wall clock time at which the frame was written
+            if None, e.g. for a live camera)
+        :param buffer_size: Number of records buffered in memory before they are written
+        """
+        self.output_path = output_path
+        self.backend = backend
+        self.fps = fps
+        self.buffer_size = buffer_size
+
+        # Records are buffered per frame as columns and written in one go when the buffer is full
+        self.chunks = []
+        self.n_buffered = 0
+        self.n_written = 0
+        self.file = None
+        self.writer = None
+        self.schema = None
+
+    # Method: Used to find the first path next to an existing file that is not taken
+    @staticmethod
+    def free_path(path):
+        """
+        :param path: Path to an existing file
+        :return: Path with the first numbered suffix (e.g. tracks_1.parquet for tracks.parquet) that does not exist
+        """
+        root, ext = os.path.splitext(path)
+        n = 1
+        while os.path.exists('{}_{}{}'.format(root, n, ext)):
+            n += 1
+
+        return '{}_{}{}'.format(root, n, ext)
+
+    # Method: Used to open the output file when the first records are written
+    def open(self):
+        output_dir = os.path.dirname(self.output_path)
+        if output_dir and not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+
+        if self.backend == 'parquet':
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                self.output_path = os.path.splitext(self.output_path)[0] + '.jsonl'
+                print('[WARNING]: pyarrow is not installed, writing tracks to {}'.format(self.output_path))
+                self.backend = 'jsonl'
+            else:
+                self.schema = pa.schema([('frame', pa.int64()), ('timestamp', pa.float64()), ('track_id', pa.int64()),
+                                         ('class_id', pa.int32())] +
+                                        [(name, pa.float64()) for name in self.columns[4:12]] +
+                                        [('zone', pa.string())])
+
+                # A Parquet file is written in one go, so an existing file is kept and a new one is started next to it
+                if os.path.exists(self.output_path):
+                    self.output_path = self.free_path(self.output_path)
+                    print('[WARNING]: Track file already exists, writing tracks to {}'.format(self.output_path))
+
+                # Each flush is appended to the file as a row group
+                self.writer = pq.ParquetWriter(self.output_path, self.schema)
+
+        if self.backend == 'jsonl':
+            self.file = open(self.output_path, 'a')
+
+    # Method: Used to add the established tracks of a frame
+    def write_tracks(self, frame, ids, boxes, velocities, zones=None, timestamp=None, classes=None):
+        """
+        :param frame: Frame index
+        :param ids: Track IDs
+        :param boxes: Array of shape (N, 4) with the boxes [ymin, xmin, ymax, xmax] in pixels
+        :param velocities: Array of shape (N, 4) with the velocity of each box coordinate in pixels/frame
+        :param zones: List with the warning zone each track is in (None if it is not in a warning zone)
+        :param timestamp: Time of the frame in seconds (from 'fps' if None)
+        :param classes: Class of each track (-1 if unknown or None)
+        """
+        n = len(ids)
+        if n == 0:
+            return
+
+        if timestamp is None:
+            timestamp = frame / float(self.fps) if self.fps else time.time()
+
+        self.chunks.append((frame, timestamp, np.asarray(ids, dtype=np.int64),
+                            np.asarray(classes if classes is not None else [-1] * n, dtype=np.int32),
+                            np.asarray(boxes, dtype=float).reshape(-1, 4),
+                            np.asarray(velocities, dtype=float).reshape(-1, 4),
+                            list(zones) if zones is not None else [None] * n))
+        self.n_buffered += n
+
+        if self.n_buffered >= self.buffer_size:
+            self.flush()
+
+    # Method: Used to gather the buffered records into columns
+    def to_columns(self):
+        """
+        :return: Dictionary with an array (list for 'zone') for each column
+        """
+        frames, timestamps, ids, classes, boxes, velocities, zones = zip(*self.chunks)
+        counts = [len(i) for i in ids]
+        boxes = np.concatenate(boxes)
+        velocities = np.concatenate(velocities)
+
+        columns = {'frame': np.repeat(frames, counts).astype(np.int64),
+                   'timestamp': np.repeat(timestamps, counts).astype(float),
+                   'track_id': np.concatenate(ids),
+                   'class_id': np.concatenate(classes)}
+        for i, name in enumerate(self.columns[4:8]):
+            columns[name] = boxes[:, i]
+        for i, name in enumerate(self.columns[8:12]):
+            columns[name] = velocities[:, i]
+        columns['zone'] = [zone for frame_zones in zones for zone in frame_zones]
+
+        return columns
+
+    # Method: Used to write the buffered records
+    def flush(self):
+        if not self.chunks:
+            return
+
+        if self.file is None and self.writer is None:
+            self.open()
+
+        columns = self.to_columns()
+
+        if self.backend == 'parquet':
+            import pyarrow as pa
+            self.writer.write_table(pa.Table.from_pydict(columns, schema=self.schema))
+        else:
+            rows = zip(columns['frame'].tolist(), np.round(columns['timestamp'], 3).tolist(),
+                       columns['track_id'].tolist(), columns['class_id'].tolist(),
+                       np.round(np.stack([columns[name] for name in self.columns[4:8]], axis=1), 2).tolist(),
+                       np.round(np.stack([columns[name] for name in self.columns[8:12]], axis=1), 3).tolist(),
+                       columns['zone'])
+            lines = [json.dumps({'frame': frame, 'timestamp': timestamp, 'track_id': track_id, 'class_id': class_id,
+                                 'box': box, 'velocity': velocity, 'zone': zone})
+                     for frame, timestamp, track_id, class_id, box, velocity, zone in rows]
+            self.file.write('\n'.join(lines) + '\n')
+            self.file.flush()
+
+        self.n_written += self.n_buffered
+        self.chunks = []
+        self.n_buffered = 0
+
+    # Method: Used to write the remaining records and close the output file
+    def close(self):
+        self.flush()
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    # Method: Used to open the writer in a 'with' statement
+    def __enter__(self):
+        return self
+
+    # Method: Used to close the writer at the end of a 'with' statement
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
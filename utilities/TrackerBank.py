@@ -0,0 +1,262 @@
+import numpy as np
+
+# Lifecycle state of a track: tentative until it has been matched 'min_hits' times in a row, confirmed (and reported)
+# while it is matched or has missed at most 'max_age' detections in a row, then lost (not reported, but still
+# predicted and matched so that it keeps its ID if it is found again) until it is deleted
+track_tentative = 0
+track_confirmed = 1
+track_lost = 2
+track_state_names = ('tentative', 'confirmed', 'lost')
+
+
+class TrackerBank:
+    # Per-track columns (one row per track) with their shape and type
+    columns = (('x', (8,), float), ('P', (3,), float), ('ids', (), np.int64), ('classes', (), np.int32),
+               ('noise', (2,), float), ('num_hits', (), int), ('num_unmatched', (), int), ('states', (), np.int8))
+
+    # Scratch rows for the tracks selected by 'predict' and 'predict_and_update': their state, covariance and motion
+    # profile, the innovation y and K y, [S, K position, K velocity], and the terms of the predict step (dt times the
+    # velocities, and one term of P at a time)
+    scratch_columns = (('x', (8,)), ('P', (3,)), ('noise', (2,)), ('y', (4,)), ('ky', (4,)), ('k', (3,)),
+                       ('dx', (4,)), ('dp', ()))
+
+    # Method: Constructor
+    def __init__(self, dt=1.0, r=6.25, p0=100.0, capacity=64):
+        """
+        :param dt: Time step between frames
+        :param r: Measurement noise variance of each box coordinate (default for tracks added without their own)
+        :param p0: Initial variance of the position and velocity of a new track
+        :param capacity: Number of tracks the storage has room for before it grows
+        """
+        self.dt = dt
+        self.r = r
+        self.p0 = p0
+
+        # Constant velocity model: every box coordinate is an independent (position, velocity) system with the same
+        # F = [[1, dt], [0, 1]], Q and R, and only the position is measured. Since the 4 systems of a track start
+        # with the same covariance and are always predicted and updated together, they share one 2x2 covariance
+        self.q = np.array([self.dt ** 4 / 2., self.dt ** 3 / 2., self.dt ** 2])
+
+        # Stacked track storage (one row per track), in buffers with room for more tracks so that adding and removing
+        # tracks does not copy every column each frame. The columns (x, P, ids, ...) are views of the first 'n_tracks'
+        # rows. The state is [ymin, v_ymin, xmin, v_xmin, ymax, v_ymax, xmax, v_xmax], the covariance is stored as
+        # [var(position), cov(position, velocity), var(velocity)] and the motion profile of each track is [scale of
+        # the process noise Q, measurement noise variance R], so that tracks of different classes (e.g. pedestrians
+        # and cars) can share the bank. 'num_hits' counts the matches, 'num_unmatched' the misses since the last match
+        self.n_tracks = 0
+        self.buffers = {name: np.zeros((capacity,) + shape, dtype=dtype) for name, shape, dtype in self.columns}
+        self.set_views()
+
+        # The selected tracks are gathered into scratch rows (the same number as the buffers) instead of new arrays
+        self.scratch = {name: np.zeros((capacity,) + shape) for name, shape in self.scratch_columns}
+
+    # Method: Used to get the number of tracks in the bank
+    def __len__(self):
+        """
+        :return: Number of tracks
+        """
+        return self.n_tracks
+
+    # Method: Used to point each column at the rows of its buffer that hold tracks
+    def set_views(self):
+        for name, _, _ in self.columns:
+            setattr(self, name, self.buffers[name][:self.n_tracks])
+
+    # Method: Used to make room for more tracks (the buffers double in size, so growing is rare)
+    def reserve(self, n):
+        """
+        :param n: Number of tracks the storage needs room for
+        """
+        capacity = len(self.buffers['x'])
+        if n <= capacity:
+            return
+
+        capacity = max(n, 2 * capacity)
+        for name, shape, dtype in self.columns:
+            buffer = np.zeros((capacity,) + shape, dtype=dtype)
+            buffer[:self.n_tracks] = self.buffers[name][:self.n_tracks]
+            self.buffers[name] = buffer
+
+        self.scratch = {name: np.zeros((capacity,) + shape) for name, shape in self.scratch_columns}
+
+    # Method: Used to get the bounding boxes for every track
+    @property
+    def boxes(self):
+        """
+        :return: Array of shape (N, 4) with sub-pixel coordinates for each track (rounded only when drawn)
+        """
+        return self.x[:, ::2].copy()
+
+    # Method: Used to get the position uncertainty of every track
+    def position_std(self):
+        """
+        :return: Array of shape (N,) with the standard deviation (pixels) of each box coordinate
+        """
+        return np.sqrt(self.P[:, 0])
+
+    # Method: Used to add new tracks to the bank
+    def add(self, boxes, ids, classes=-1, q_scale=1.0, r=None):
+        """
+        :param boxes: Array of shape (M, 4) with the boxes used to initialise the new tracks
+        :param ids: Integer IDs for the new tracks
+        :param classes: Class of each new track (-1 if unknown)
+        :param q_scale: Factor by which the process noise of each new track is scaled
+        :param r: Measurement noise variance of each new track ('r' of the bank if None)
+        :return: Indices of the new tracks
+        """
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        n, m = len(self), boxes.shape[0]
+        self.reserve(n + m)
+        new = slice(n, n + m)
+        buffers = self.buffers
+
+        # Initial state has the box coordinates and zero velocity
+        buffers['x'][new] = 0.0
+        buffers['x'][new, ::2] = boxes
+        buffers['P'][new] = [self.p0, 0.0, self.p0]
+        buffers['ids'][new] = np.asarray(ids, dtype=np.int64).reshape(-1)
+        buffers['classes'][new] = classes
+        buffers['noise'][new, 0] = q_scale
+        buffers['noise'][new, 1] = self.r if r is None else r
+        buffers['num_hits'][new] = 0
+        buffers['num_unmatched'][new] = 0
+        buffers['states'][new] = track_tentative
+
+        self.n_tracks = n + m
+        self.set_views()
+
+        return np.arange(n, n + m)
+
+    # Method: Used to predict the next state of a set of tracks in place
+    def predict_in_place(self, x, P, noise):
+        """
+        :param x: Array of shape (M, 8) with the states
+        :param P: Array of shape (M, 3) with the covariances
+        :param noise: Array of shape (M, 2) with the motion profiles
+        """
+        dt, q = self.dt, self.q
+        pp, pv, vv = P[:, 0], P[:, 1], P[:, 2]
+
+        # Every term is computed into a scratch row and added in place, so that no array is allocated
+        m = len(x)
+        dx, dp = self.scratch['dx'][:m], self.scratch['dp'][:m]
+
+        # x = F x
+        x[:, ::2] += np.multiply(x[:, 1::2], dt, out=dx)
+
+        # P = F P F' + Q (var(position) first, since it needs the old cov(position, velocity))
+        q_scale = noise[:, 0]
+        pp += np.multiply(pv, 2.0 * dt, out=dp)
+        pp += np.multiply(vv, dt * dt, out=dp)
+        pp += np.multiply(q_scale, q[0], out=dp)
+        pv += np.multiply(vv, dt, out=dp)
+        pv += np.multiply(q_scale, q[1], out=dp)
+        vv += np.multiply(q_scale, q[2], out=dp)
+
+    # Method: Used to copy the state, covariance and motion profile of the selected tracks into the scratch rows
+    def gather(self, idx):
+        """
+        :param idx: Integer array with the indices of the tracks (each at most once)
+        :return: Scratch arrays of shape (M, 8), (M, 3) and (M, 2) with the state, covariance and motion profile
+        """
+        m, scratch = len(idx), self.scratch
+
+        # mode='clip' lets np.take write straight into 'out' (the indices come from the bank, so none are clipped)
+        return (self.x.take(idx, 0, scratch['x'][:m], 'clip'), self.P.take(idx, 0, scratch['P'][:m], 'clip'),
+                self.noise.take(idx, 0, scratch['noise'][:m], 'clip'))
+
+    # Method: Used to only predict the next state for the selected tracks
+    def predict(self, idx=None):
+        """
+        :param idx: Indices of the tracks to predict (all tracks if None)
+        """
+        if idx is None:
+            self.predict_in_place(self.x, self.P, self.noise)
+            return
+
+        x, P, noise = self.gather(idx)
+        self.predict_in_place(x, P, noise)
+        self.x[idx] = x
+        self.P[idx] = P
+
+    # Method: Used to predict and update the next state for the selected tracks
+    def predict_and_update(self, idx, z):
+        """
+        :param idx: Indices of the tracks to update
+        :param z: Array of shape (M, 4) with the matched boxes
+        """
+        z = np.asarray(z, dtype=float).reshape(-1, 4)
+
+        # Predict
+        x, P, noise = self.gather(idx)
+        self.predict_in_place(x, P, noise)
+        pp, pv, vv = P[:, 0], P[:, 1], P[:, 2]
+
+        # Update (H selects the position, so S and K are scalars shared by the 4 coordinates and no inverse is needed)
+        m = len(x)
+        k = self.scratch['k'][:m]
+        s, k_position, k_velocity = k[:, 0], k[:, 1], k[:, 2]
+        np.add(pp, noise[:, 1], out=s)
+        np.divide(pp, s, out=k_position)
+        np.divide(pv, s, out=k_velocity)
+
+        y, ky = self.scratch['y'][:m], self.scratch['ky'][:m]
+        np.subtract(z, x[:, ::2], out=y)
+        x[:, ::2] += np.multiply(k[:, 1:2], y, out=ky)
+        x[:, 1::2] += np.multiply(k[:, 2:3], y, out=ky)
+
+        # P = (I - K H) P (var(velocity) first, since it needs the old cov(position, velocity))
+        vv -= np.multiply(k_velocity, pv, out=s)
+        pv -= np.multiply(k_position, pv, out=s)
+        pp -= np.multiply(k_position, pp, out=s)
+
+        self.x[idx] = x
+        self.P[idx] = P
+
+    # Method: Used to move the tracks through their lifecycle after the matches and misses of a frame
+    def update_states(self, min_hits, max_age, reid_window=0):
+        """
+        :param min_hits: No. of consecutive matches needed to confirm a track (scalar or array with one per track)
+        :param max_age: No. of consecutive misses before a confirmed track is lost (scalar or array with one per track)
+        :param reid_window: No. of further misses during which a lost track can be found again before it is deleted
+        :return: Boolean array of shape (N,), True for the tracks to be deleted
+        """
+        states, num_hits, num_unmatched = self.states, self.num_hits, self.num_unmatched
+        tentative = states == track_tentative
+        missed = num_unmatched > 0
+
+        # A miss breaks the run of matches of a tentative track, which is deleted after more than 'max_age' misses in
+        # a row (a confirmed track is lost then, and only deleted after 'reid_window' further misses)
+        num_hits[tentative & missed] = 0
+        states[tentative & ~missed & (num_hits >= min_hits)] = track_confirmed
+
+        # Confirmed tracks are lost after too many misses in a row, and lost tracks are confirmed again when matched
+        states[(states == track_confirmed) & (num_unmatched > max_age)] = track_lost
+        states[(states == track_lost) & ~missed] = track_confirmed
+
+        return num_unmatched > np.where(tentative, max_age, max_age + reid_window)
+
+    # Method: Used to remove tracks from the bank
+    def remove(self, mask):
+        """
+        :param mask: Boolean array of shape (N,), True for the tracks to be removed
+        :return: Array with the IDs of the removed tracks
+        """
+        mask = np.asarray(mask, dtype=bool)
+        index = np.flatnonzero(mask)
+        removed_ids = self.ids[index]
+        if len(index) == 0:
+            return removed_ids
+
+        # Swap remove: the kept tracks past the new end move into the rows of the removed tracks before it, so that
+        # only those rows are copied (the order of the tracks is not kept)
+        n = len(self) - len(index)
+        holes = index[index < n]
+        moved = n + np.flatnonzero(~mask[n:])
+        for buffer in self.buffers.values():
+            buffer[holes] = buffer[moved]
+
+        self.n_tracks = n
+        self.set_views()
+
+        return removed_ids
@@ -1,27 +1,73 @@
 import os
+import cv2
+import time
 import numpy as np
-import tensorflow as tf
 
-from utilities import LabelMap
+# Detections kept for an image: pixel box [ymin, xmin, ymax, xmax], class and confidence
+detection_dtype = np.dtype([('box', np.int64, (4,)), ('class', np.int32), ('score', np.float32)])
+
+# Filters for each class of the label maps: minimum confidence ('min_conf' of the detector if missing), range of the
+# height/width ratio and minimum height and width in pixels. Boxes pass if score > min_conf, min_ratio <= ratio <
+# max_ratio, height > min_height and width > min_width
+coco_class_filters = {
+    1: {'min_ratio': 1.0, 'max_ratio': np.inf, 'min_height': 20, 'min_width': 8},   # person
+    2: {'min_ratio': 0.3, 'max_ratio': 2.0, 'min_height': 20, 'min_width': 10},     # bicycle
+    3: {'min_ratio': 0.0, 'max_ratio': 0.8, 'min_height': 20, 'min_width': 20},     # car
+    4: {'min_ratio': 0.3, 'max_ratio': 2.0, 'min_height': 20, 'min_width': 10},     # motorcycle
+    5: {'min_ratio': 0.0, 'max_ratio': 1.5, 'min_height': 30, 'min_width': 30},     # bus
+    6: {'min_ratio': 0.0, 'max_ratio': 1.5, 'min_height': 30, 'min_width': 30},     # train
+    7: {'min_ratio': 0.0, 'max_ratio': 1.5, 'min_height': 30, 'min_width': 30},     # truck
+}
+kitti_class_filters = {
+    1: {'min_ratio': 0.0, 'max_ratio': 0.8, 'min_height': 20, 'min_width': 20},     # car
+    2: {'min_ratio': 1.0, 'max_ratio': np.inf, 'min_height': 20, 'min_width': 8},   # pedestrian
+}
 
 
 class VehicleDetector:
     # Method: Constructor
-    def __init__(self, kitti=False, min_conf=0.7, info=False):
+    def __init__(self, kitti=False, min_conf=0.7, info=False, max_batch_size=8, profiler=None, input_size=None,
+                 warmup=False, roi=None, scale=1.0, class_filters=None, low_conf=None):
         """
         :param kitti: If True, use the Kitti model
         :param min_conf: Minimum acceptable confidence level
         :param info: If True, display all visualisations
+        :param max_batch_size: Maximum number of frames passed to the model in a single call
+        :param profiler: Profiler recording the time spent in each stage (disabled if None)
+        :param input_size: Size (height, width) of the frames that will be passed to the model, used by 'warmup'
+        :param warmup: If True, run 'warmup' before returning
+        :param roi: Region of interest passed to the model (whole frame if None), see 'set_roi'
+        :param scale: Factor by which the region of interest is resized before it is passed to the model
+        :param class_filters: Classes to keep, see 'set_class_filters' (cars only if None)
+        :param low_conf: Minimum confidence of the weak detections kept along with the confident ones, for a two-stage
+            association (weak detections are dropped if None)
         """
         # Change to current working directory
         os.chdir(os.getcwd())
 
         self.bounding_boxes = []
         self.min_conf = min_conf
+        self.low_conf = low_conf
         self.info = info
         self.kitti = kitti
+        self.max_batch_size = max_batch_size
+        self.profiler = profiler
+        self.input_size = input_size
+        self.set_roi(roi, scale)
+        self.set_class_filters(class_filters)
+
+        # Time (seconds) spent in each step of the start up
+        self.startup_times = {}
+        start = time.perf_counter()
+
+        # TensorFlow and the label map protos are only imported once a detector is built, so that tools replaying
+        # cached detections never load them
+        import tensorflow as tf
+        from utilities import LabelMap
+        self.startup_times['import'] = time.perf_counter() - start
 
         path_to_model = 'data/frozen_model.pb'
+        self.path_to_model = path_to_model
         if self.kitti:
             path_to_label_map = 'data/kitti_label_map.pbtxt'
             num_classes = 2
@@ -33,6 +79,7 @@ class VehicleDetector:
         self.detection_graph = tf.Graph()
 
         # Load model and initialize the TensorFlow graph
+        start = time.perf_counter()
         with self.detection_graph.as_default():
             od_graph_def = tf.GraphDef()
             with tf.gfile.GFile(path_to_model, 'rb') as fid:
@@ -51,8 +98,10 @@ class VehicleDetector:
             self.scores = self.detection_graph.get_tensor_by_name('detection_scores:0')
             self.classes = self.detection_graph.get_tensor_by_name('detection_classes:0')
             self.num_detections = self.detection_graph.get_tensor_by_name('num_detections:0')
+        self.startup_times['load_model'] = time.perf_counter() - start
 
         # Load label map and convert into categories
+        start = time.perf_counter()
         loaded_label_map = LabelMap.load_label_map(path_to_label_map)
         categories = LabelMap.convert_label_map_to_categories(label_map=loaded_label_map,
                                                               max_num_classes=num_classes,
@@ -60,6 +109,136 @@ class VehicleDetector:
 
         # Assign an index to each category
         self.category_index = LabelMap.create_category_index(categories)
+        self.startup_times['label_map'] = time.perf_counter() - start
+
+        if warmup:
+            self.warmup()
+
+    # Method: Used to set the region of interest and the scale of the images passed to the model
+    def set_roi(self, roi=None, scale=1.0):
+        """
+        :param roi: Rectangle [ymin, xmin, ymax, xmax] or polygon [(x, y), ...] in normalized coordinates (whole
+            frame if None). Frames are cropped to the bounding rectangle of the polygon, and boxes whose center is
+            outside the polygon are dropped
+        :param scale: Factor by which the region of interest is resized before it is passed to the model
+        """
+        self.roi = roi
+        self.scale = scale
+        self.roi_polygon = None
+
+        if roi is None:
+            self.roi_bounds = None
+        elif len(roi) == 4 and np.ndim(roi[0]) == 0:
+            self.roi_bounds = np.clip(np.array(roi, dtype=float), 0.0, 1.0)
+        else:
+            self.roi_polygon = np.clip(np.array(roi, dtype=np.float32), 0.0, 1.0)
+            self.roi_bounds = np.array([self.roi_polygon[:, 1].min(), self.roi_polygon[:, 0].min(),
+                                        self.roi_polygon[:, 1].max(), self.roi_polygon[:, 0].max()])
+
+    # Method: Used to set the classes that are kept and the filters applied to the boxes of each class
+    def set_class_filters(self, class_filters=None):
+        """
+        :param class_filters: List of class IDs (with the filters from 'coco_class_filters' or 'kitti_class_filters'),
+            or dictionary with the filters for each class ID, e.g. {3: {'min_conf': 0.6}, 7: {'min_conf': 0.8,
+            'max_ratio': 1.2}} (missing filters are taken from the tables). Cars only if None
+        """
+        defaults = kitti_class_filters if self.kitti else coco_class_filters
+
+        if class_filters is None:
+            class_filters = [1] if self.kitti else [3]
+        if not isinstance(class_filters, dict):
+            class_filters = {class_id: {} for class_id in class_filters}
+
+        self.class_filters = {}
+        for class_id, filters in class_filters.items():
+            self.class_filters[int(class_id)] = dict({'min_conf': self.min_conf, 'min_ratio': 0.0, 'max_ratio': np.inf,
+                                                      'min_height': 0, 'min_width': 0},
+                                                     **dict(defaults.get(int(class_id), {}), **filters))
+
+        # Lookup table with a row of filters for each class ID [min_conf, min_ratio, max_ratio, min_height,
+        # min_width]. Classes that are not kept (including any ID past the end, which is clipped to the last row)
+        # have a minimum confidence that no box can reach
+        self.class_table = np.full((max(self.class_filters) + 2, 5), [np.inf, 0.0, np.inf, 0.0, 0.0])
+        for class_id, filters in self.class_filters.items():
+            self.class_table[class_id] = [filters['min_conf'], filters['min_ratio'], filters['max_ratio'],
+                                          filters['min_height'], filters['min_width']]
+
+    # Method: Used to get the pixel window of the region of interest in a frame
+    def crop_window(self, dims):
+        """
+        :param dims: Image dimensions
+        :return: Window (top, left, bottom, right) in pixel coordinates
+        """
+        if self.roi_bounds is None:
+            return 0, 0, int(dims[0]), int(dims[1])
+
+        return (int(self.roi_bounds[0] * dims[0]), int(self.roi_bounds[1] * dims[1]),
+                int(np.ceil(self.roi_bounds[2] * dims[0])), int(np.ceil(self.roi_bounds[3] * dims[1])))
+
+    # Method: Used to check if the center of a box is inside the region of interest
+    def inside_roi(self, box, dims):
+        """
+        :param box: Box with pixel coordinates
+        :param dims: Image dimensions
+        :return: True if the center of the box is inside the polygon (always True for a rectangle)
+        """
+        if self.roi_polygon is None:
+            return True
+
+        center = (0.5 * (box[1] + box[3]) / dims[1], 0.5 * (box[0] + box[2]) / dims[0])
+
+        return cv2.pointPolygonTest(self.roi_polygon, center, False) >= 0
+
+    # Method: Used to crop and resize an image to the region of interest before it is passed to the model
+    def prepare_image(self, image):
+        """
+        :param image: Image
+        :return: Image passed to the model
+        """
+        if self.roi_bounds is not None:
+            top, left, bottom, right = self.crop_window(image.shape[0:2])
+            image = image[top:bottom, left:right]
+
+        if self.scale != 1.0:
+            image = cv2.resize(image, (0, 0), fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+
+        return image
+
+    # Method: Used to run dummy inferences so that the first real frame does not pay for graph optimization
+    def warmup(self, input_size=None, batch_sizes=None, n_runs=2):
+        """
+        :param input_size: Size (height, width) of the dummy frames ('input_size' of the constructor if None)
+        :param batch_sizes: Batch sizes to warm up (1 and 'max_batch_size' if None)
+        :param n_runs: Number of dummy inferences for each batch size
+        :return: Time (seconds) spent warming up
+        """
+        input_size = input_size or self.input_size or (720, 1280)
+        batch_sizes = batch_sizes or sorted({1, self.max_batch_size})
+        start = time.perf_counter()
+
+        # Dummy frames are cropped and resized like real frames, and fed to the session directly so that they never
+        # show up in the profiler
+        image = self.prepare_image(np.zeros((input_size[0], input_size[1], 3), dtype=np.uint8))
+        for batch_size in batch_sizes:
+            image_batch = np.stack([image] * batch_size, axis=0)
+            for _ in range(n_runs):
+                with self.detection_graph.as_default():
+                    self.session.run([self.boxes, self.scores, self.classes, self.num_detections],
+                                     feed_dict={self.image_tensor: image_batch})
+
+        self.startup_times['warmup'] = self.startup_times.get('warmup', 0.0) + time.perf_counter() - start
+
+        return self.startup_times['warmup']
+
+    # Method: Used to get a report of the time spent starting up the detector
+    def startup_report(self):
+        """
+        :return: String with the time spent in each step of the start up
+        """
+        lines = ['[INFO]: {:<12} {:>9.2f} s'.format(step, seconds) for step, seconds in self.startup_times.items()]
+        lines.append('[INFO]: {:<12} {:>9.2f} s'.format('total', sum(self.startup_times.values())))
+
+        return '\n'.join(lines)
 
     # Method: Used to convert image into numpy array
     @staticmethod
@@ -68,22 +247,83 @@ class VehicleDetector:
         :param image: Image
         :return: Image as NumPy array
         """
-        (im_width, im_height) = image.size
-
-        return np.array(image.getdata()).reshape((im_height, im_width, 3)).astype(np.uint8)
+        # PIL exposes its pixel buffer through the array interface, so there is no per-pixel Python list
+        return np.asarray(image, dtype=np.uint8)
 
     # Method: Used to convert normalized coordinates to pixel coordinates
     @staticmethod
-    def normalized_to_pixel_coordinates(box, dims):
+    def normalized_to_pixel_coordinates(box, dims, window=None):
+        """
+        :param box: Box with normalized coordinates, or array of shape (N, 4) with one box per row
+        :param dims: Image dimensions
+        :param window: Window (top, left, bottom, right) the box is normalized to, in pixel coordinates of the image
+            (whole image if None)
+        :return: Box (or array of boxes) with integer pixel coordinates
         """
-        :param box: Box with normalized coordinates
+        top, left, bottom, right = window if window is not None else (0, 0, dims[0], dims[1])
+        size = [bottom - top, right - left, bottom - top, right - left]
+
+        return (np.asarray(box, dtype=float) * size).astype(int) + [top, left, top, left]
+
+    # Method: Used to filter the raw model outputs for a single image down to the detections of the kept classes
+    def filter_detections(self, boxes, scores, classes, dims, low_conf=None):
+        """
+        :param boxes: Array of shape (100, 4) with normalized box coordinates
+        :param scores: Array of shape (100,) with the confidence of each box
+        :param classes: Array of shape (100,) with the class of each box
         :param dims: Image dimensions
-        :return: Box with pixel coordinates
+        :param low_conf: Minimum confidence of the weak detections kept along with the confident ones, for a two-stage
+            association ('low_conf' of the detector if None)
+        :return: Structured array (detection_dtype) with the box in pixel coordinates, class and score of each kept
+            detection
+        """
+        scores = np.asarray(scores)
+        classes = np.minimum(np.asarray(classes).astype(int), self.class_table.shape[0] - 1)
+
+        # Only boxes confident enough for their class are converted and checked further (weak boxes too, down to
+        # 'low_conf', for the classes that are kept)
+        min_conf = self.class_table[classes, 0]
+        low_conf = low_conf if low_conf is not None else self.low_conf
+        if low_conf is not None:
+            min_conf = np.where(np.isfinite(min_conf), np.minimum(min_conf, low_conf), min_conf)
+        index = np.flatnonzero(scores > min_conf)
+        filters = self.class_table[classes[index]]
+
+        # Convert normalized coordinates (relative to the region of interest) to pixel coordinates
+        pixel_boxes = self.normalized_to_pixel_coordinates(np.asarray(boxes)[index], dims, self.crop_window(dims))
+
+        # Filter out boxes that are not the right shape or size for their class
+        box_h = pixel_boxes[:, 2] - pixel_boxes[:, 0]
+        box_w = pixel_boxes[:, 3] - pixel_boxes[:, 1]
+        ratio = np.divide(box_h, box_w, out=np.full(box_h.shape, np.inf), where=box_w > 0)
+        keep = (ratio >= filters[:, 1]) & (ratio < filters[:, 2]) & (box_h > filters[:, 3]) & (box_w > filters[:, 4])
+        index, pixel_boxes = index[keep], pixel_boxes[keep]
+
+        # Filter out boxes outside the region of interest (only the few remaining boxes are tested)
+        if self.roi_polygon is not None:
+            inside = np.array([self.inside_roi(box, dims) for box in pixel_boxes], dtype=bool)
+            index, pixel_boxes = index[inside], pixel_boxes[inside]
+
+        detections = np.empty(len(index), dtype=detection_dtype)
+        detections['box'] = pixel_boxes
+        detections['class'] = classes[index]
+        detections['score'] = scores[index]
+
+        if self.info:
+            for box, class_id, score in zip(detections['box'], detections['class'], detections['score']):
+                print('[INFO]: Class {} detected at {} with {:.2f}% confidence'.format(class_id, box, score * 100.0))
+
+        return detections
+
+    # Method: Used to find the detections that are above the confidence level of their class (not just 'low_conf')
+    def is_confident(self, detections):
+        """
+        :param detections: Structured array (detection_dtype) of detections
+        :return: Boolean array, True for the confident detections
         """
-        height, width = dims[0], dims[1]
-        pixel_coords = [int(box[0] * height), int(box[1] * width), int(box[2] * height), int(box[3] * width)]
+        classes = np.minimum(detections['class'], self.class_table.shape[0] - 1)
 
-        return np.array(pixel_coords)
+        return detections['score'] > self.class_table[classes, 0]
 
     # Method: Used to detect the locations of the vehicles in the image
     def get_bounding_box_locations(self, image):
@@ -91,54 +331,101 @@ class VehicleDetector:
         :param image: Image
         :return: Bounding box locations surrounding detected vehicles
         """
-        with self.detection_graph.as_default():
-            # Expand dimensions since the model expects images to have shape: [1, None, None, 3]
-            image_expanded = np.expand_dims(image, axis=0)
+        return self.get_bounding_box_locations_batch([image])[0]
+
+    # Method: Used to get the detections of the kept classes in the image
+    def get_detections(self, image, low_conf=None):
+        """
+        :param image: Image
+        :param low_conf: Minimum confidence of the weak detections kept along with the confident ones, for a two-stage
+            association ('low_conf' of the detector if None)
+        :return: Structured array (detection_dtype) with the box, class and score of each detection
+        """
+        return self.get_detections_batch([image], low_conf)[0]
 
+    # Method: Used to skip a frame without running the model (detection is stateless, so there is nothing to do)
+    def skip_frame(self):
+        pass
+
+    # Method: Used to run the model on a batch of images
+    def run_model(self, image_batch):
+        """
+        :param image_batch: Array of images with shape [batch, height, width, 3]
+        :return: Arrays with the normalized boxes, scores and classes for each image in the batch
+        """
+        if self.profiler is not None:
+            self.profiler.mark()
+
+        with self.detection_graph.as_default():
             # Actual detection
             (boxes, scores, classes, num_detections) = self.session.run([self.boxes,
                                                                          self.scores,
                                                                          self.classes,
                                                                          self.num_detections],
-                                                                        feed_dict={self.image_tensor: image_expanded})
+                                                                        feed_dict={self.image_tensor: image_batch})
 
-            # Remove 1D entries from the shape of the array
-            boxes = np.squeeze(boxes)
-            classes = np.squeeze(classes)
-            scores = np.squeeze(scores)
+        if self.profiler is not None:
+            self.profiler.lap('inference')
 
-            # Convert to a list
-            classes_list = classes.tolist()
+        return boxes, scores, classes
 
-            # Find cars detected in the image
-            if self.kitti:
-                index_vector = [i for i, id in enumerate(classes_list) if ((id == 1) and (scores[i] > self.min_conf))]
+    # Method: Used to get the raw model outputs for a list of images with batched model calls
+    def get_raw_detections_batch(self, frames):
+        """
+        :param frames: List of images (consecutive images with the same shape are stacked into one batch)
+        :return: List with the (boxes, scores, classes) model outputs for each image, before any filtering
+        """
+        results = []
+        start = 0
+
+        while start < len(frames):
+            # Grow the batch while the images have the same shape, up to 'max_batch_size'
+            end = start + 1
+            while end < len(frames) and end - start < self.max_batch_size and \
+                    frames[end].shape == frames[start].shape:
+                end += 1
+
+            # Stack images since the model expects images to have shape: [batch, None, None, 3] (a single image is
+            # passed as a view with a new batch axis, without a copy)
+            if end - start == 1:
+                image_batch = self.prepare_image(frames[start])[np.newaxis]
             else:
-                index_vector = [i for i, id in enumerate(classes_list) if ((id == 3) and (scores[i] > self.min_conf))]
+                image_batch = np.stack([self.prepare_image(frame) for frame in frames[start:end]], axis=0)
 
-            if len(index_vector) > 0:
-                temp_boxes = []
+            boxes, scores, classes = self.run_model(image_batch)
+            results.extend(zip(boxes, scores, classes))
 
-                for index in index_vector:
-                    # Get image dimensions
-                    dims = image.shape[0:2]
+            start = end
 
-                    # Convert normalized coordinates to pixel coordinates
-                    box = self.normalized_to_pixel_coordinates(boxes[index], dims)
+        return results
 
-                    # Calculate height, width and ratio to filter out boxes that not the right shape or size
-                    box_h = box[2] - box[0]
-                    box_w = box[3] - box[1]
-                    ratio = box_h / box_w
+    # Method: Used to get the detections of the kept classes in a list of images with batched model calls
+    def get_detections_batch(self, frames, low_conf=None):
+        """
+        :param frames: List of images (consecutive images with the same shape are stacked into one batch)
+        :param low_conf: Minimum confidence of the weak detections kept along with the confident ones, for a two-stage
+            association ('low_conf' of the detector if None)
+        :return: List with a structured array (detection_dtype) of detections for each image
+        """
+        results = []
+
+        # Filter the detections for each image in order
+        for frame, (boxes, scores, classes) in zip(frames, self.get_raw_detections_batch(frames)):
+            results.append(self.filter_detections(boxes, scores, classes, frame.shape[0:2], low_conf))
 
-                    # Filter out boxes that are not the right shape or size
-                    if ratio < 0.8 and box_h > 20 and box_w > 20:
-                        temp_boxes.append(box)
+        if self.profiler is not None:
+            self.profiler.lap('filter')
 
-                        if self.info:
-                            print('[INFO]: Vehicle Detected at {} with {:.2f}% confidence'.format(box,
-                                                                                                  scores[index]*100.0))
+        return results
 
-                self.bounding_boxes = temp_boxes
+    # Method: Used to detect the locations of the vehicles in a list of images with batched model calls
+    def get_bounding_box_locations_batch(self, frames):
+        """
+        :param frames: List of images (consecutive images with the same shape are stacked into one batch)
+        :return: List with the bounding box locations surrounding detected vehicles for each image
+        """
+        results = [list(detections['box'][self.is_confident(detections)])
+                   for detections in self.get_detections_batch(frames)]
+        self.bounding_boxes = results[-1] if results else []
 
-        return self.bounding_boxes
+        return results
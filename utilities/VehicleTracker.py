@@ -13,7 +13,7 @@ class VehicleTracker:
         self.box = []
 
         # Initialize parameters for the Kalman filter
-        self.kf = KalmanFilter(dim_x=8, dim_z=8)
+        self.kf = KalmanFilter(dim_x=8, dim_z=4)
         self.dt = 1.0
         self.x_state = []
 
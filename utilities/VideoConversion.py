@@ -1,5 +1,6 @@
 import os
 import cv2
+import numpy as np
 from tqdm import tqdm as tq
 import subprocess
 
@@ -50,8 +51,104 @@ def frames_to_video(input_dir, output_path, frame_format='frame', file_type='.pn
     subprocess.call('ffmpeg -y -r {} -i {} -vcodec {} {}'.format(fps, input_image_format, codec, output_path))
 
 
-# video_to_frames('C:/PythonProjects/VehicleDetectionAndTracking/front_left_vlc_2.mp4',
-#                 'C:/PythonProjects/VehicleDetectionAndTracking/output/front_left_2_out/')
+class VideoSink:
+    # Method: Constructor
+    def __init__(self, output_path, fps=30, codec='mp4v', frame_size=None, backend='opencv', frame_dir=None):
+        """
+        :param output_path: Path to output video
+        :param fps: Frames/second
+        :param codec: Video codec (a FourCC such as 'mp4v' for 'opencv', an encoder such as 'libx264' for 'ffmpeg')
+        :param frame_size: Output (width, height), frames are resized if needed (size of the first frame if None)
+        :param backend: 'opencv' (cv2.VideoWriter), 'ffmpeg' (raw frames piped to ffmpeg) or 'frames' (PNG per frame)
+        :param frame_dir: Directory for the 'frames' backend and the fallback (output path without extension if None)
+        """
+        self.output_path = output_path
+        self.fps = fps
+        self.codec = codec
+        self.frame_size = frame_size
+        self.backend = backend
+        self.frame_dir = frame_dir if frame_dir is not None else os.path.splitext(output_path)[0]
+        self.frame_num = 0
+        self.writer = None
 
-frames_to_video('C:/PythonProjects/VehicleDetectionAndTracking/output/front_both_1_out/',
-                'C:/PythonProjects/VehicleDetectionAndTracking/videos/front_both_1_out.mp4', fps=30)
+    # Method: Used to open the writer once the frame size is known
+    def open(self):
+        width, height = self.frame_size
+
+        if self.backend == 'opencv':
+            self.writer = cv2.VideoWriter(self.output_path, cv2.VideoWriter_fourcc(*self.codec), self.fps,
+                                          (width, height))
+
+            if not self.writer.isOpened():
+                print('[WARNING]: Could not open video writer for {}, writing frames to {}'.format(self.output_path,
+                                                                                                   self.frame_dir))
+                self.backend = 'frames'
+
+        elif self.backend == 'ffmpeg':
+            command = ['ffmpeg', '-y', '-loglevel', 'error',
+                       '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', '{}x{}'.format(width, height), '-r', str(self.fps),
+                       '-i', '-', '-vcodec', self.codec, '-pix_fmt', 'yuv420p', self.output_path]
+
+            try:
+                self.writer = subprocess.Popen(command, stdin=subprocess.PIPE)
+            except OSError:
+                print('[WARNING]: Could not start ffmpeg for {}, writing frames to {}'.format(self.output_path,
+                                                                                              self.frame_dir))
+                self.backend = 'frames'
+
+        if self.backend == 'frames':
+            self.writer = None
+            if not os.path.isdir(self.frame_dir):
+                os.makedirs(self.frame_dir)
+
+    # Method: Used to write the next frame
+    def write(self, frame):
+        """
+        :param frame: Image
+        """
+        if self.frame_size is None:
+            self.frame_size = (frame.shape[1], frame.shape[0])
+
+        if self.frame_num == 0:
+            self.open()
+
+        if (frame.shape[1], frame.shape[0]) != tuple(self.frame_size):
+            frame = cv2.resize(frame, tuple(self.frame_size))
+
+        self.frame_num += 1
+
+        if self.backend == 'opencv':
+            self.writer.write(frame)
+        elif self.backend == 'ffmpeg':
+            self.writer.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+        else:
+            cv2.imwrite(os.path.join(self.frame_dir, 'frame{}.png'.format(self.frame_num)), frame)
+
+    # Method: Used to finish writing the video
+    def close(self):
+        if self.writer is None:
+            return
+
+        if self.backend == 'opencv':
+            self.writer.release()
+        elif self.backend == 'ffmpeg':
+            self.writer.stdin.close()
+            self.writer.wait()
+
+        self.writer = None
+
+    # Method: Used to open the sink in a 'with' statement
+    def __enter__(self):
+        return self
+
+    # Method: Used to close the sink at the end of a 'with' statement
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+if __name__ == '__main__':
+    # video_to_frames('C:/PythonProjects/VehicleDetectionAndTracking/front_left_vlc_2.mp4',
+    #                 'C:/PythonProjects/VehicleDetectionAndTracking/output/front_left_2_out/')
+
+    frames_to_video('C:/PythonProjects/VehicleDetectionAndTracking/output/front_both_1_out/',
+                    'C:/PythonProjects/VehicleDetectionAndTracking/videos/front_both_1_out.mp4', fps=30)
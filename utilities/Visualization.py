@@ -1,11 +1,10 @@
 import six
+import functools
 import collections
+import cv2
 import numpy as np
-import tensorflow as tf
 import PIL.Image as Image
 import PIL.ImageColor as ImageColor
-import PIL.ImageDraw as ImageDraw
-import PIL.ImageFont as ImageFont
 
 standard_colors = [
     'AliceBlue', 'Chartreuse', 'Aqua', 'Aquamarine', 'Azure', 'Beige', 'Bisque',
@@ -34,30 +33,54 @@ standard_colors = [
 ]
 
 
-# Method: Used to add a bounding box to an image (numpy array)
-def draw_bounding_box_on_image_array(image, ymin, xmin, ymax, xmax, point, color='red', thickness=4, display_str_list=(),
-                                     use_normalized_coordinates=True):
+# Font used for the box labels (a Hershey font drawn by OpenCV, so no font file is opened while drawing)
+label_font = cv2.FONT_HERSHEY_SIMPLEX
+label_font_scale = 0.75
+label_font_thickness = 2
+
+
+# Method: Used to get the RGB value of a color (cached, the same few colors are looked up for every box)
+@functools.lru_cache(maxsize=None)
+def get_rgb(color):
+    """
+    :param color: Color name (e.g. 'red') or RGB tuple
+    :return: RGB tuple
+    """
+    if isinstance(color, six.string_types):
+        return ImageColor.getrgb(color)
+
+    return tuple(int(c) for c in color)
+
+
+# Method: Used to measure a label (cached, since the same labels are drawn on every frame)
+@functools.lru_cache(maxsize=4096)
+def get_text_size(text, font_scale=label_font_scale, thickness=label_font_thickness):
+    """
+    :param text: Label
+    :param font_scale: Font scale
+    :param thickness: Font thickness
+    :return: Width, height and baseline of the label (pixels)
+    """
+    (width, height), baseline = cv2.getTextSize(text, label_font, font_scale, thickness)
+
+    return width, height, baseline
+
+
+# Method: Used to get an array OpenCV can draw on (the image itself unless it has to be converted)
+def get_drawable(image):
     """
     :param image: A numpy array with shape [height, width, 3]
-    :param ymin: ymin of bounding box
-    :param xmin: xmin of bounding box
-    :param ymax: ymax of bounding box
-    :param xmax: xmax of bounding box
-    :param color: Color to draw bounding box
-    :param thickness: Line thickness
-    :param display_str_list: List of strings to display in box (each to be shown on its own line)
-    :param use_normalized_coordinates: If True, treat coordinates ymin, xmin, ymax, xmax as relative to the image.
-        Otherwise treat coordinates as absolute
+    :return: uint8, C-contiguous array with the image
     """
-    image_pil = Image.fromarray(np.uint8(image)).convert('RGB')
-    draw_bounding_box_on_image(image_pil, ymin, xmin, ymax, xmax, point, color, thickness, display_str_list,
-                               use_normalized_coordinates)
-    np.copyto(image, np.array(image_pil))
+    if image.dtype == np.uint8 and image.flags['C_CONTIGUOUS'] and image.flags['WRITEABLE']:
+        return image
 
+    return np.ascontiguousarray(image, dtype=np.uint8)
 
-# Method: Used to add a bounding box to an image
-def draw_bounding_box_on_image(image, ymin, xmin, ymax, xmax, center, color='red', thickness=4, display_str_list=(),
-                               use_normalized_coordinates=True):
+
+# Method: Used to add a bounding box to an image (numpy array)
+def draw_bounding_box_on_image_array(image, ymin, xmin, ymax, xmax, point, color='red', thickness=4, display_str_list=(),
+                                     use_normalized_coordinates=True):
     """
     :param image: A numpy array with shape [height, width, 3]
     :param ymin: ymin of bounding box
@@ -70,38 +93,60 @@ def draw_bounding_box_on_image(image, ymin, xmin, ymax, xmax, center, color='red
     :param use_normalized_coordinates: If True, treat coordinates ymin, xmin, ymax, xmax as relative to the image.
         Otherwise treat coordinates as absolute
     """
-    draw = ImageDraw.Draw(image)
-    im_width, im_height = image.size
+    canvas = get_drawable(image)
+    im_height, im_width = canvas.shape[0:2]
+    rgb = get_rgb(color)
 
     if use_normalized_coordinates:
         (left, right, top, bottom) = (xmin * im_width, xmax * im_width, ymin * im_height, ymax * im_height)
     else:
         (left, right, top, bottom) = (xmin, xmax, ymin, ymax)
-    draw.line([(left, top), (left, bottom), (right, bottom), (right, top), (left, top)], width=thickness, fill=color)
-
-    try:
-        font = ImageFont.truetype('arial.ttf', 24)
-    except IOError:
-        font = ImageFont.load_default()
+    (left, right, top, bottom) = (int(round(left)), int(round(right)), int(round(top)), int(round(bottom)))
+    cv2.rectangle(canvas, (left, top), (right, bottom), rgb, thickness)
 
     # If the total height of the display strings added to the top of the bounding box exceeds the top of the image,
     # stack the strings below the bounding box instead of above.
-    display_str_heights = [font.getsize(ds)[1] for ds in display_str_list]
+    text_sizes = [get_text_size(ds) for ds in display_str_list]
     # Each display_str has a top and bottom margin of 0.05x.
-    total_display_str_height = (1 + 2 * 0.05) * sum(display_str_heights)
+    total_display_str_height = (1 + 2 * 0.05) * sum(h + b for _, h, b in text_sizes)
 
     if top > total_display_str_height:
         text_bottom = top
     else:
-        text_bottom = bottom + total_display_str_height
+        text_bottom = int(bottom + total_display_str_height)
 
     # Reverse list and print from bottom to top.
-    for display_str in display_str_list[::-1]:
-        text_width, text_height = font.getsize(display_str)
-        margin = np.ceil(0.05 * text_height)
-        draw.rectangle([(left, text_bottom - text_height - 2 * margin), (left + text_width, text_bottom)], fill=color)
-        draw.text((left + margin, text_bottom - text_height - margin), display_str, fill='black', font=font)
-        text_bottom -= text_height - 2 * margin
+    for display_str, (text_width, text_height, baseline) in zip(display_str_list[::-1], text_sizes[::-1]):
+        margin = int(np.ceil(0.05 * text_height))
+        label_top = text_bottom - text_height - baseline - 2 * margin
+        cv2.rectangle(canvas, (left, label_top), (left + text_width + 2 * margin, text_bottom), rgb, cv2.FILLED)
+        cv2.putText(canvas, display_str, (left + margin, text_bottom - baseline - margin), label_font,
+                    label_font_scale, (0, 0, 0), label_font_thickness, cv2.LINE_AA)
+        text_bottom = label_top
+
+    if canvas is not image:
+        np.copyto(image, canvas, casting='unsafe')
+
+
+# Method: Used to add a bounding box to an image
+def draw_bounding_box_on_image(image, ymin, xmin, ymax, xmax, center, color='red', thickness=4, display_str_list=(),
+                               use_normalized_coordinates=True):
+    """
+    :param image: A PIL.Image object
+    :param ymin: ymin of bounding box
+    :param xmin: xmin of bounding box
+    :param ymax: ymax of bounding box
+    :param xmax: xmax of bounding box
+    :param color: Color to draw bounding box
+    :param thickness: Line thickness
+    :param display_str_list: List of strings to display in box (each to be shown on its own line)
+    :param use_normalized_coordinates: If True, treat coordinates ymin, xmin, ymax, xmax as relative to the image.
+        Otherwise treat coordinates as absolute
+    """
+    image_array = np.array(image.convert('RGB'))
+    draw_bounding_box_on_image_array(image_array, ymin, xmin, ymax, xmax, center, color, thickness, display_str_list,
+                                     use_normalized_coordinates)
+    image.paste(Image.fromarray(image_array))
 
 
 # Method: Used to draw keypoints on an image (numpy array)
@@ -114,33 +159,39 @@ def draw_keypoints_on_image_array(image, keypoints, color='red', radius=2, use_n
     :param use_normalized_coordinates: If True, treat keypoint values as relative to the image.
         Otherwise treat them as absolute
     """
-    image_pil = Image.fromarray(np.uint8(image)).convert('RGB')
-    draw_keypoints_on_image(image_pil, keypoints, color, radius, use_normalized_coordinates)
-    np.copyto(image, np.array(image_pil))
+    keypoints = np.asarray(keypoints, dtype=float).reshape(-1, 2)
+    if keypoints.shape[0] == 0:
+        return
+
+    canvas = get_drawable(image)
+    im_height, im_width = canvas.shape[0:2]
+    rgb = get_rgb(color)
+
+    # Convert every keypoint to (x, y) pixel coordinates at once
+    points = keypoints[:, ::-1]
+    if use_normalized_coordinates:
+        points = points * (im_width, im_height)
+
+    for keypoint_x, keypoint_y in np.round(points).astype(int).tolist():
+        cv2.circle(canvas, (keypoint_x, keypoint_y), radius, rgb, cv2.FILLED)
+
+    if canvas is not image:
+        np.copyto(image, canvas, casting='unsafe')
 
 
 # Method: Used to draw keypoints on an image
 def draw_keypoints_on_image(image, keypoints, color='red', radius=2, use_normalized_coordinates=True):
     """
-    :param image: A numpy array with shape [height, width, 3]
+    :param image: A PIL.Image object
     :param keypoints: A numpy array with shape [num_keypoints, 2]
     :param color: Color to draw the keypoints with
     :param radius: Keypoint radius
     :param use_normalized_coordinates: If True, treat keypoint values as relative to the image.
         Otherwise treat them as absolute
     """
-    draw = ImageDraw.Draw(image)
-    im_width, im_height = image.size
-    keypoints_x = [k[1] for k in keypoints]
-    keypoints_y = [k[0] for k in keypoints]
-
-    if use_normalized_coordinates:
-        keypoints_x = tuple([im_width * x for x in keypoints_x])
-        keypoints_y = tuple([im_height * y for y in keypoints_y])
-
-    for keypoint_x, keypoint_y in zip(keypoints_x, keypoints_y):
-        draw.ellipse([(keypoint_x - radius, keypoint_y - radius), (keypoint_x + radius, keypoint_y + radius)],
-                     outline=color, fill=color)
+    image_array = np.array(image.convert('RGB'))
+    draw_keypoints_on_image_array(image_array, keypoints, color, radius, use_normalized_coordinates)
+    image.paste(Image.fromarray(image_array))
 
 
 # Method: Used to draw mask on an image (numpy array)
@@ -151,22 +202,37 @@ def draw_mask_on_image_array(image, mask, color='red', alpha=0.7):
     :param color: Color to draw the keypoints with
     :param alpha: Transparency value between 0 and 1
     """
+    draw_masks_on_image_array(image, mask[np.newaxis], [color], alpha)
+
+
+# Method: Used to blend several masks into an image (numpy array) in a single pass
+def draw_masks_on_image_array(image, masks, colors, alpha=0.7):
+    """
+    :param image: uint8 numpy array with shape (img_height, img_height, 3)
+    :param masks: uint8 numpy array of shape (N, img_height, img_height) with values between either 0 or 1
+    :param colors: List with the color of each mask
+    :param alpha: Transparency value between 0 and 1
+    """
     if image.dtype != np.uint8:
         raise ValueError('`image` not of type np.uint8')
 
-    if mask.dtype != np.uint8:
+    if masks.dtype != np.uint8:
         raise ValueError('`mask` not of type np.uint8')
 
-    if np.any(np.logical_and(mask != 1, mask != 0)):
+    if masks.size and masks.max() > 1:
         raise ValueError('`mask` elements should be in [0, 1]')
 
-    rgb = ImageColor.getrgb(color)
-    pil_image = Image.fromarray(image)
-    solid_color = np.expand_dims(np.ones_like(mask), axis=2) * np.reshape(list(rgb), [1, 1, 3])
-    pil_solid_color = Image.fromarray(np.uint8(solid_color)).convert('RGBA')
-    pil_mask = Image.fromarray(np.uint8(255.0 * alpha * mask)).convert('L')
-    pil_image = Image.composite(pil_solid_color, pil_image, pil_mask)
-    np.copyto(image, np.array(pil_image.convert('RGB')))
+    # Only the covered pixels are blended. Where masks overlap the last one is drawn on top, as if they were drawn one
+    # after the other (but every pixel is blended once)
+    covered = masks.any(axis=0)
+    if not covered.any():
+        return
+
+    top_mask = masks.shape[0] - 1 - np.argmax(masks[::-1, covered], axis=0)
+    rgb = np.array([get_rgb(color) for color in colors], dtype=np.float32)
+
+    blended = alpha * rgb[top_mask] + (1.0 - alpha) * image[covered]
+    image[covered] = np.round(blended).astype(np.uint8)
 
 
 # Method: Used to overlay labeled boxes on an image with formatted scores and label names
@@ -215,8 +281,13 @@ def visualize_boxes_and_labels_on_image_array(image, boxes, classes, scores, cat
                     class_name = 'N/A'
 
                 display_str = '{}: {}%'.format(class_name, int(100 * scores[i]))
-            box_to_display_str_map[box].append(display_str)
-            box_to_color_map[box] = standard_colors[classes[i] % len(standard_colors)]
+                box_to_display_str_map[box].append(display_str)
+                box_to_color_map[box] = standard_colors[classes[i] % len(standard_colors)]
+
+    # Blend all masks onto the image in one pass, then draw the boxes and keypoints on top
+    if instance_masks is not None and box_to_color_map:
+        draw_masks_on_image_array(image, np.stack([box_to_instance_masks_map[box] for box in box_to_color_map]),
+                                  list(box_to_color_map.values()))
 
     # Draw all boxes onto image.
     for box, color in box_to_color_map.items():
@@ -224,9 +295,6 @@ def visualize_boxes_and_labels_on_image_array(image, boxes, classes, scores, cat
 
         box_center = (np.average(box[1::2]), np.average(box[0::2]))
 
-        if instance_masks is not None:
-            draw_mask_on_image_array(image, box_to_instance_masks_map[box], color=color)
-
         draw_bounding_box_on_image_array(image, ymin, xmin, ymax, xmax, box_center, color=color, thickness=line_thickness,
                                          display_str_list=box_to_display_str_map[box],
                                          use_normalized_coordinates=use_normalized_coordinates)